@@ -2,7 +2,9 @@ import { onMount, createEffect } from "solid-js";
 import "./ConstellationCanvas.css";
 
 const starRadius = 8;
-const maxStars = 11; // Appropriate for ML model input size
+// Must not exceed the stars accepted by the served model (MAX_DRAWING_STARS for
+// histogram models, the trained size otherwise)
+const maxStars = Number(import.meta.env.VITE_MAX_STARS) || 11;
 
 /*
   Interface to draw constellations:
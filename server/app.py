@@ -1,11 +1,22 @@
+import atexit
+import json
 import os
-import numpy as np
-import pickle
-import math
-from flask import Flask, request, jsonify
+import time
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
 
+from augmentation import clean_templates
+from batching import PredictionBatcher
+from drawing_log import DrawingLog
+from featurizer import featurize_drawings, parse_drawing
+from forest_engine import top_k_classes
+from live_sessions import LiveSessionStore
+from metrics import Metrics, SamplingProfiler
+from model_registry import ModelRegistry
+from prediction_cache import PredictionCache, canonical_drawing_key
+from template_matcher import TemplateMatcher
+
 load_dotenv()
 
 app = Flask(__name__)
@@ -14,47 +25,549 @@ app = Flask(__name__)
 # Adjust the origin as needed for your frontend development server
 CORS(app, resources={r"/*": {"origins": os.environ["FRONTEND_ENDPOINT"]}})
 
-# Adjust based on your largest constellation.
-MAX_STARS_TRAINED = 11
-MAX_CONNECTIONS_TRAINED = 10
+# Upper bound on the number of drawings accepted by a single /predict_batch request
+MAX_BATCH_DRAWINGS = int(os.environ.get("MAX_BATCH_DRAWINGS", 10000))
+
+# Request bodies larger than MAX_REQUEST_BYTES are rejected with 413, whether they
+# declare a Content-Length or are sent chunked. Single-drawing endpoints (/predict,
+# live edits) use the tighter MAX_PREDICT_BYTES, so an oversized drawing never reaches
+# the JSON parser.
+MAX_REQUEST_BYTES = int(os.environ.get("MAX_REQUEST_BYTES", 16 * 1024 * 1024))
+MAX_PREDICT_BYTES = int(os.environ.get("MAX_PREDICT_BYTES", 64 * 1024))
+app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_BYTES
+
+# Largest drawing accepted by models trained on a fixed-size feature mode
+# ("histogram"). Models trained on the other modes accept at most the star and
+# connection counts in their manifest.
+MAX_DRAWING_STARS = int(os.environ.get("MAX_DRAWING_STARS", 64))
+MAX_DRAWING_CONNECTIONS = int(os.environ.get("MAX_DRAWING_CONNECTIONS", 128))
+
+# Prediction cache for /predict. Drawings are keyed on coordinates snapped to a grid of
+# PREDICTION_CACHE_GRID units, so near-identical drawings reuse one prediction.
+# Setting PREDICTION_CACHE_SIZE to 0 disables the cache.
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 4096))
+PREDICTION_CACHE_TTL = float(os.environ.get("PREDICTION_CACHE_TTL", 300))
+PREDICTION_CACHE_GRID = float(os.environ.get("PREDICTION_CACHE_GRID", 0.01))
+
+# Directory of the model artifact written by training_connections.export_model_artifact
+MODEL_ARTIFACT_DIR = os.environ.get("MODEL_ARTIFACT_DIR", "model")
+
+# Hot reload: every MODEL_WATCH_SECONDS (0 disables watching) each worker checks the
+# artifact's manifest and loads a new version in the background. A new version is
+# only activated if it predicts at least MODEL_SMOKE_MIN_ACCURACY of the canonical
+# templates correctly. ADMIN_TOKEN enables the /admin/model endpoints.
+MODEL_WATCH_SECONDS = float(os.environ.get("MODEL_WATCH_SECONDS", 0))
+MODEL_SMOKE_MIN_ACCURACY = float(os.environ.get("MODEL_SMOKE_MIN_ACCURACY", 0.8))
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+# Optional log of every /predict drawing and its forest prediction, used by
+# training_connections.py --retrain-from-log. Disabled unless DRAWING_LOG_DIR is set.
+DRAWING_LOG_DIR = os.environ.get("DRAWING_LOG_DIR")
+DRAWING_LOG_MAX_BYTES = int(os.environ.get("DRAWING_LOG_MAX_BYTES", 64 * 1024 * 1024))
+
+# Prediction engines: the trained forest, or the training-free nearest-template matcher
+# built from TEMPLATES_PATH. Requests can pick one with an "engine" field.
+PREDICT_ENGINES = ("forest", "template")
+PREDICT_ENGINE = os.environ.get("PREDICT_ENGINE", "forest")
+TEMPLATES_PATH = os.environ.get("TEMPLATES_PATH", "constellations.json")
+
+# Live-guess sessions (/live): how many may be open per worker, how long an idle
+# session is kept, and how often an idle event stream sends a keep-alive comment
+LIVE_SESSION_LIMIT = int(os.environ.get("LIVE_SESSION_LIMIT", 1000))
+LIVE_SESSION_IDLE_SECONDS = float(os.environ.get("LIVE_SESSION_IDLE_SECONDS", 600))
+LIVE_KEEPALIVE_SECONDS = 15
+
+# Request metrics served on /metrics. METRICS_ENABLED=0 turns every timer and counter
+# into a no-op. PROFILE_SAMPLING_HZ > 0 runs a sampling profiler over the timed stages
+# of each worker, served on /profile and written on exit to PROFILE_OUTPUT (if set)
+# with the worker's PID added, e.g. profile-1234.folded.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+PROFILE_SAMPLING_HZ = float(os.environ.get("PROFILE_SAMPLING_HZ", 0))
+PROFILE_OUTPUT = os.environ.get("PROFILE_OUTPUT")
+
+profiler = None
+if METRICS_ENABLED and PROFILE_SAMPLING_HZ > 0:
+    profiler = SamplingProfiler(PROFILE_SAMPLING_HZ)
+
+metrics = Metrics(enabled=METRICS_ENABLED, profiler=profiler)
+metrics.describe(
+    "constellation_requests_total", "counter", "HTTP requests by endpoint and status code."
+)
+metrics.describe(
+    "constellation_request_seconds", "histogram", "HTTP request duration by endpoint."
+)
+metrics.describe(
+    "constellation_stage_seconds",
+    "histogram",
+    "Duration of each stage of prediction requests.",
+)
+metrics.describe(
+    "constellation_model_load_seconds", "gauge", "Duration of the last model load."
+)
+metrics.describe(
+    "constellation_model_info", "gauge", "Version and feature mode of the active model."
+)
+metrics.describe(
+    "constellation_model_swaps_total",
+    "counter",
+    "Model versions activated by hot reloads and rollbacks.",
+)
+
+
+def load_smoke_set(templates_path):
+    """
+    Returns the canonical templates as (drawing_data, name) pairs, the smoke test
+    every model version must pass before it serves requests.
+    """
+    try:
+        with open(templates_path, "r") as f:
+            templates = clean_templates(json.load(f))
+    except Exception as e:
+        print(f"Model smoke test unavailable: {e}")
+        return []
+    return [
+        (
+            {"stars": template["stars"], "connections": template["connections"]},
+            template["name"],
+        )
+        for template in templates
+    ]
+
+
+def activate_model(bundle, old_bundle):
+    """Called by the model registry after every swap, before requests see the new model."""
+    # Cached probabilities belong to the old model. Keys also carry the model version,
+    # so entries written by requests still in flight on the old model are never served.
+    if prediction_cache is not None:
+        prediction_cache.clear()
+    metrics.set("constellation_model_load_seconds", bundle.load_seconds)
+    metrics.clear("constellation_model_info")
+    metrics.set(
+        "constellation_model_info",
+        1,
+        {"version": bundle.version, "feature_mode": bundle.feature_mode},
+    )
+    if old_bundle is not None:
+        metrics.inc("constellation_model_swaps_total")
+    action = "loaded successfully" if old_bundle is None else "activated"
+    print(f"Model {bundle.version} {action} ({bundle.feature_mode} features).")
+
+
+# The model artifact is memory-mapped read-only, so every worker process shares the
+# same physical pages and no pickle is ever loaded. Requests read
+# model_registry.active once and use that bundle throughout.
+prediction_cache = None
+model_registry = ModelRegistry(
+    load_smoke_set(TEMPLATES_PATH),
+    MODEL_SMOKE_MIN_ACCURACY,
+    on_swap=activate_model,
+    drawing_limits=(MAX_DRAWING_STARS, MAX_DRAWING_CONNECTIONS),
+)
+
+# Load the model when the module is imported
+try:
+    model_registry.reload(MODEL_ARTIFACT_DIR)
+except Exception as e:
+    print(f"Failed to load model from {MODEL_ARTIFACT_DIR}: {e}")
+    raise RuntimeError("Failed to load model and encoder. Aborting app startup.")
+
+if PREDICT_ENGINE not in PREDICT_ENGINES:
+    raise RuntimeError(
+        f"Unknown PREDICT_ENGINE '{PREDICT_ENGINE}'. Expected one of {PREDICT_ENGINES}"
+    )
+
+template_matcher = None
+try:
+    template_matcher = TemplateMatcher.from_file(TEMPLATES_PATH)
+except Exception as e:
+    print(f"Template matcher unavailable: {e}")
+if PREDICT_ENGINE == "template" and template_matcher is None:
+    raise RuntimeError("Failed to load the templates for PREDICT_ENGINE=template.")
+
+if PREDICTION_CACHE_SIZE > 0:
+    prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL)
+
+live_sessions = LiveSessionStore(LIVE_SESSION_LIMIT, LIVE_SESSION_IDLE_SECONDS)
+
+drawing_log = None
+if DRAWING_LOG_DIR:
+    drawing_log = DrawingLog(DRAWING_LOG_DIR, DRAWING_LOG_MAX_BYTES)
+    atexit.register(drawing_log.close)
+
+# Optional request coalescing for /predict. Concurrent requests within the window are
+# predicted together in one model call. Disabled unless PREDICT_BATCHING is set.
+prediction_batcher = None
+if os.environ.get("PREDICT_BATCHING", "").lower() in ("1", "true", "yes"):
+    prediction_batcher = PredictionBatcher(
+        lambda model_input: model_registry.active.model.predict_proba(model_input),
+        window_ms=float(os.environ.get("PREDICT_BATCH_WINDOW_MS", 2)),
+        max_batch_size=int(os.environ.get("PREDICT_BATCH_MAX_SIZE", 64)),
+    )
+    metrics.describe(
+        "constellation_batch_size", "histogram", "Rows per coalesced model call."
+    )
+    metrics.describe(
+        "constellation_batch_queue_depth",
+        "histogram",
+        "Rows waiting when a coalesced batch is dispatched.",
+    )
+    metrics.add_histogram("constellation_batch_size", prediction_batcher.batch_sizes)
+    metrics.add_histogram(
+        "constellation_batch_queue_depth", prediction_batcher.queue_depths
+    )
+
+
+metrics.describe(
+    "constellation_cache_entries", "gauge", "Predictions held in the prediction cache."
+)
+metrics.describe(
+    "constellation_cache_events_total",
+    "counter",
+    "Prediction cache hits, misses, evictions and expirations.",
+)
+metrics.describe(
+    "constellation_live_sessions_open", "gauge", "Open live-guess sessions."
+)
+metrics.describe(
+    "constellation_drawing_log_records_total",
+    "counter",
+    "Drawings written to, dropped from or rejected as invalid by the drawing log.",
+)
+
+
+def collect_component_metrics(registry):
+    """Copies the state of the prediction cache and the live session store."""
+    if prediction_cache is not None:
+        cache_stats = prediction_cache.stats()
+        registry.set("constellation_cache_entries", cache_stats["size"])
+        for event in ("hits", "misses", "evictions", "expirations"):
+            registry.set(
+                "constellation_cache_events_total", cache_stats[event], {"event": event}
+            )
+    registry.set("constellation_live_sessions_open", live_sessions.stats()["open"])
+    if drawing_log is not None:
+        log_stats = drawing_log.stats()
+        for result in ("written", "dropped", "invalid"):
+            registry.set(
+                "constellation_drawing_log_records_total",
+                log_stats[result],
+                {"result": result},
+            )
+
+
+metrics.add_collector(collect_component_metrics)
+
+
+def start_model_watcher():
+    """Starts this worker's model watcher if it is not running yet."""
+    model_registry.watch(MODEL_ARTIFACT_DIR, MODEL_WATCH_SECONDS)
+
+
+def start_profiler():
+    """Starts this worker's sampling profiler if it is enabled and not running yet."""
+    if profiler is not None and profiler.start() and PROFILE_OUTPUT:
+        root, extension = os.path.splitext(PROFILE_OUTPUT)
+        atexit.register(profiler.dump, f"{root}-{os.getpid()}{extension}")
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    # Started lazily so that the watcher and profiler threads run inside each forked
+    # worker
+    start_model_watcher()
+    start_profiler()
+
+
+@app.after_request
+def record_request_metrics(response):
+    # Streaming responses (live events) are counted when their headers are sent
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    metrics.inc(
+        "constellation_requests_total",
+        {"endpoint": endpoint, "method": request.method, "status": response.status_code},
+    )
+    start = g.get("request_start")
+    if start is not None:
+        metrics.observe(
+            "constellation_request_seconds",
+            time.perf_counter() - start,
+            {"endpoint": endpoint},
+        )
+    return response
+
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({"error": "Request body too large."}), 413
+
+
+def body_too_large(limit):
+    return {"error": f"Request body too large. Max allowed: {limit} bytes"}, 413
+
+
+def read_json_body(limit):
+    """
+    Reads and decodes a JSON request body of at most limit bytes.
+
+    A body declaring a larger Content-Length is rejected without being read. The limit
+    also applies to the bytes actually read, so chunked bodies, which declare no
+    length, cannot get past it either.
+
+    Returns:
+        tuple: (data, error) where data is the decoded body, or None if it is not
+               JSON, and error is a (body, status) tuple if the body is larger than
+               limit bytes, else None.
+    """
+    if request.content_length is not None and request.content_length > limit:
+        return None, body_too_large(limit)
+
+    chunks = []
+    size = 0
+    while size <= limit:
+        chunk = request.stream.read(limit + 1 - size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+    if size > limit:
+        return None, body_too_large(limit)
+
+    if not request.is_json:
+        return None, None
+    try:
+        return json.loads(b"".join(chunks)), None
+    except ValueError:
+        return None, None
+
+
+def check_engine(engine):
+    """
+    Returns an error (body, status) tuple if the requested engine cannot be used,
+    else None.
+    """
+    if engine not in PREDICT_ENGINES:
+        return (
+            {"error": f"Unknown engine '{engine}'. Expected one of {list(PREDICT_ENGINES)}"},
+            400,
+        )
+    if engine == "template" and template_matcher is None:
+        return {"error": "Template matcher not loaded."}, 500
+    return None
+
+
+def parse_top_k(data):
+    """
+    Reads the optional "top_k" request field.
+
+    Returns:
+        int: Number of ranked predictions to return, capped at the number of classes,
+             or None if the field is absent.
+
+    Raises:
+        ValueError: If top_k is not a positive integer.
+    """
+    top_k = data.get("top_k")
+    if top_k is None:
+        return None
+    if isinstance(top_k, bool) or not isinstance(top_k, int) or top_k < 1:
+        raise ValueError("'top_k' must be a positive integer")
+    return min(top_k, len(model_registry.active.encoder.classes_))
+
+
+def ranked_predictions(bundle, proba, top_k):
+    """
+    Decodes the top_k classes of every row of a predict_proba matrix.
+
+    Column indices map to encoded labels through the model's classes_ and then to
+    names through the encoder's classes_, both as single vectorized gathers.
+
+    Returns:
+        tuple: (names, ranked) where names holds the predicted name of every row and
+               ranked holds, per row, a list of {"constellation", "probability"}
+               dicts, best first.
+    """
+    columns, probabilities = top_k_classes(proba, top_k)
+    labels = bundle.encoder.classes_.take(bundle.model.classes_.take(columns))
+    ranked = [
+        [
+            {"constellation": name, "probability": probability}
+            for name, probability in zip(row_labels, row_probabilities)
+        ]
+        for row_labels, row_probabilities in zip(labels.tolist(), probabilities.tolist())
+    ]
+    return labels[:, 0].tolist(), ranked
+
+
+def prediction_response(bundle, proba, top_k):
+    """Builds the /predict response body from one row of class probabilities."""
+    names, ranked = ranked_predictions(bundle, proba[None, :], top_k or 1)
+    response = {"prediction": names[0], "model_version": bundle.version}
+    if top_k is not None:
+        response["top_k"] = ranked[0]
+    return response
+
+
+def handle_predict(data):
+    """
+    Runs /predict on a decoded JSON body (see predict_constellation for the format).
+    Shared by the Flask route and the ASGI app in asgi.py.
+
+    Returns:
+        tuple: (response body dict, HTTP status)
+    """
+
+    bundle = model_registry.active
+    if bundle is None:
+        return (
+            {"error": "Model or encoder not loaded. Please check backend setup."},
+            500,
+        )
+
+    # Any JSON value decodes, but only an object can be a drawing
+    if not isinstance(data, dict) or not data:
+        return {"error": "Invalid JSON input"}, 400
+
+    engine = data.get("engine", PREDICT_ENGINE)
+    error = check_engine(engine)
+    if error is not None:
+        return error
 
-# Global variables to hold the loaded model and encoder
-# These will be loaded once when the application starts
-loaded_model = None
-loaded_encoder = None
+    try:
+        with metrics.stage("/predict", "parse"):
+            top_k = parse_top_k(data)
+            drawing = parse_drawing(data, bundle.max_stars, bundle.max_connections)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    # Template matching is cheap enough that it is never cached or batched
+    if engine == "template":
+        with metrics.stage("/predict", "match"):
+            matches = template_matcher.rank(drawing, top_k)
+        return {"prediction": matches[0]["constellation"], "matches": matches}, 200
+
+    # Serve repeated drawings without featurizing or running the model. The cache
+    # holds class probabilities, so one entry answers requests for any top_k.
+    if prediction_cache is not None:
+        with metrics.stage("/predict", "cache"):
+            cache_key = (
+                bundle.version,
+                canonical_drawing_key(
+                    drawing, PREDICTION_CACHE_GRID, bundle.feature_mode
+                ),
+            )
+            cached_proba = prediction_cache.get(cache_key)
+        if cached_proba is not None:
+            with metrics.stage("/predict", "decode"):
+                response = prediction_response(bundle, cached_proba, top_k)
+            if drawing_log is not None:
+                drawing_log.append(drawing, response["prediction"], cached_proba.max())
+            return response, 200
 
+    # The model expects a 2D array
+    with metrics.stage("/predict", "featurize"):
+        model_input = featurize_drawings(
+            [drawing], bundle.max_stars, bundle.max_connections, mode=bundle.feature_mode
+        )
 
-def load_model_and_encoder():
-    """Loads the pre-trained model and label encoder into global variables."""
-    global loaded_model, loaded_encoder
     try:
-        model_path = "constellation_model.pkl"
-        encoder_path = "label_encoder.pkl"
-
-        if not os.path.exists(model_path):
-            print(f"Error: Model file not found at {model_path}")
-            return False
-        if not os.path.exists(encoder_path):
-            print(f"Error: Label encoder file not found at {encoder_path}")
-            return False
-
-        with open(model_path, "rb") as f:
-            loaded_model = pickle.load(f)
-        with open(encoder_path, "rb") as f:
-            loaded_encoder = pickle.load(f)
-
-        print("Model and Label Encoder loaded successfully.")
-        return True
+        # One predict_proba pass yields both the prediction and the ranked alternatives
+        with metrics.stage("/predict", "predict"):
+            if prediction_batcher is not None:
+                proba = prediction_batcher.predict(
+                    model_input[0], bundle.model.predict_proba
+                )
+            else:
+                proba = bundle.model.predict_proba(model_input)[0]
+
+        if prediction_cache is not None:
+            prediction_cache.put(cache_key, proba)
+
+        with metrics.stage("/predict", "decode"):
+            response = prediction_response(bundle, proba, top_k)
+        if drawing_log is not None:
+            drawing_log.append(drawing, response["prediction"], proba.max())
+        return response, 200
     except Exception as e:
-        print(f"Failed to load model or encoder: {e}")
-        loaded_model = None
-        loaded_encoder = None
-        return False
+        return {"error": f"Prediction failed: {e}"}, 500
 
 
-# Load model and encoder when module is imported
-if not load_model_and_encoder():
-    raise RuntimeError("Failed to load model and encoder. Aborting app startup.")
+def handle_predict_batch(data):
+    """
+    Runs /predict_batch on a decoded JSON body (see predict_constellation_batch for
+    the format). Shared by the Flask route and the ASGI app in asgi.py.
+
+    Returns:
+        tuple: (response body dict, HTTP status)
+    """
+
+    bundle = model_registry.active
+    if bundle is None:
+        return (
+            {"error": "Model or encoder not loaded. Please check backend setup."},
+            500,
+        )
+
+    if not isinstance(data, dict) or not data:
+        return {"error": "Invalid JSON input"}, 400
+
+    user_drawings = data.get("drawings")
+    if not isinstance(user_drawings, list) or not user_drawings:
+        return (
+            {"error": "Missing or invalid 'drawings' data (must be a non-empty list)"},
+            400,
+        )
+
+    engine = data.get("engine", PREDICT_ENGINE)
+    error = check_engine(engine)
+    if error is not None:
+        return error
+
+    try:
+        top_k = parse_top_k(data)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    if len(user_drawings) > MAX_BATCH_DRAWINGS:
+        return (
+            {"error": f"Too many drawings in batch. Max allowed: {MAX_BATCH_DRAWINGS}"},
+            400,
+        )
+
+    drawings = []
+    with metrics.stage("/predict_batch", "parse"):
+        for idx, user_drawing in enumerate(user_drawings):
+            try:
+                drawings.append(
+                    parse_drawing(user_drawing, bundle.max_stars, bundle.max_connections)
+                )
+            except ValueError as e:
+                return {"error": f"Drawing {idx}: {e}"}, 400
+
+    if engine == "template":
+        with metrics.stage("/predict_batch", "match"):
+            matches = [template_matcher.rank(drawing, top_k) for drawing in drawings]
+        return {
+            "predictions": [ranked[0]["constellation"] for ranked in matches],
+            "matches": matches,
+        }, 200
+
+    with metrics.stage("/predict_batch", "featurize"):
+        model_input = featurize_drawings(
+            drawings, bundle.max_stars, bundle.max_connections, mode=bundle.feature_mode
+        )
+
+    try:
+        with metrics.stage("/predict_batch", "predict"):
+            proba = bundle.model.predict_proba(model_input)
+        with metrics.stage("/predict_batch", "decode"):
+            names, ranked = ranked_predictions(bundle, proba, top_k or 1)
+        response = {"predictions": names, "model_version": bundle.version}
+        if top_k is not None:
+            response["top_k"] = ranked
+        return response, 200
+    except Exception as e:
+        return {"error": f"Prediction failed: {e}"}, 500
 
 
 @app.route("/predict", methods=["POST"])
@@ -69,113 +582,296 @@ def predict_constellation():
         ],
         "connections": [
             [0, 1]
-        ]
+        ],
+        "engine": "template",  // optional, defaults to PREDICT_ENGINE
+        "top_k": 3  // optional
     }
+
+    With top_k, the response also lists the top_k most likely constellations as
+    [{"constellation": name, "probability": p}, ...]. Probabilities are the forest's
+    mean per-tree class probabilities (the share of votes), not calibrated likelihoods.
+    The template engine instead returns "matches", templates ranked by distance
+    (the best top_k if given).
     """
+    with metrics.stage("/predict", "json"):
+        data, error = read_json_body(MAX_PREDICT_BYTES)
+    if error is not None:
+        body, status = error
+        return jsonify(body), status
+    body, status = handle_predict(data)
+    return jsonify(body), status
+
+
+@app.route("/predict_batch", methods=["POST"])
+def predict_constellation_batch():
+    """
+    Predicts many drawings in a single request with one model call.
+    Expected JSON input format:
+    {
+        "drawings": [
+            {"stars": [...], "connections": [...]},
+            {"stars": [...], "connections": [...]}
+        ],
+        "engine": "template",  // optional, defaults to PREDICT_ENGINE
+        "top_k": 3  // optional
+    }
+
+    Returns {"predictions": [...]} in the same order as the submitted drawings, plus
+    one ranked list per drawing under "top_k" if requested (see /predict). The
+    template engine also returns "matches", one ranked template list per drawing.
+    """
+    with metrics.stage("/predict_batch", "json"):
+        data, error = read_json_body(MAX_REQUEST_BYTES)
+    if error is not None:
+        body, status = error
+        return jsonify(body), status
+    body, status = handle_predict_batch(data)
+    return jsonify(body), status
 
-    if loaded_model is None or loaded_encoder is None:
-        return (
-            jsonify(
-                {"error": "Model or encoder not loaded. Please check backend setup."}
-            ),
-            500,
-        )
 
-    data = request.get_json()
-    if not data:
+@app.route("/live", methods=["POST"])
+def open_live_session():
+    """
+    Opens a live-guess session for a drawing in progress.
+    Optional JSON input: {"top_k": 3, "engine": "forest"}
+
+    Returns {"session": id} with status 201. The drawing is then built up through
+    POST /live/<id>/edits, and every edit's guess is pushed on GET /live/<id>/events.
+    """
+    data, error = read_json_body(MAX_PREDICT_BYTES)
+    if error is not None:
+        body, status = error
+        return jsonify(body), status
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
         return jsonify({"error": "Invalid JSON input"}), 400
 
-    user_stars = data.get("stars")
-    user_connections = data.get("connections")
+    engine = data.get("engine", PREDICT_ENGINE)
+    error = check_engine(engine)
+    if error is not None:
+        body, status = error
+        return jsonify(body), status
 
-    # Make sure stars and connections exist and are provided in the right format
+    try:
+        top_k = parse_top_k(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # The session keeps the model it was opened with, since its feature row is laid
+    # out for that model's dimensions
+    bundle = model_registry.active
+    session = live_sessions.create(
+        bundle.max_stars,
+        bundle.max_connections,
+        feature_mode=bundle.feature_mode,
+        top_k=top_k,
+        engine=engine,
+        model=bundle,
+    )
+    return jsonify({"session": session.id}), 201
 
-    if not isinstance(user_stars, list) or not user_stars:
-        return (
-            jsonify(
-                {"error": "Missing or invalid 'stars' data (must be a non-empty list)"}
-            ),
-            400,
-        )
 
-    if not isinstance(user_connections, list):
-        # Connections can be empty if user doesn't draw them
-        user_connections = []
+@app.route("/live/<session_id>/edits", methods=["POST"])
+def edit_live_session(session_id):
+    """
+    Applies drawing edits to a live session and guesses the constellation.
+    Expected JSON input format:
+    {
+        "edits": [
+            {"type": "add_star", "id": 2, "x": 0.4, "y": 0.7},
+            {"type": "add_connection", "from": 1, "to": 2}
+        ]
+    }
 
-    # --- 1. Prepare Star Coordinates ---
-    star_coords = []
-    star_map = {star["id"]: (star["x"], star["y"]) for star in user_stars}
-    for star in user_stars:
-        star_coords.append(star["x"])
-        star_coords.append(star["y"])
+    Only the features touched by the edits are updated before the single model call.
+    The guess, in the /predict response format plus the drawing's "version", is
+    returned and also pushed to the session's event stream.
+    """
+    session = live_sessions.get(session_id)
+    if session is None:
+        return jsonify({"error": "Unknown or expired live session"}), 404
+
+    data, error = read_json_body(MAX_PREDICT_BYTES)
+    if error is not None:
+        body, status = error
+        return jsonify(body), status
+    if not isinstance(data, dict) or not data:
+        return jsonify({"error": "Invalid JSON input"}), 400
+
+    try:
+        session.apply_edits(data.get("edits"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    version, drawing, model_input = session.snapshot()
+    try:
+        if session.engine == "template":
+            matches = template_matcher.rank(drawing, session.top_k)
+            guess = {"prediction": matches[0]["constellation"], "matches": matches}
+        else:
+            bundle = session.model
+            if prediction_batcher is not None:
+                proba = prediction_batcher.predict(
+                    model_input[0], bundle.model.predict_proba
+                )
+            else:
+                proba = bundle.model.predict_proba(model_input)[0]
+            guess = prediction_response(bundle, proba, session.top_k)
+    except Exception as e:
+        return jsonify({"error": f"Prediction failed: {e}"}), 500
+
+    guess["version"] = version
+    session.publish(version, guess)
+    return jsonify(guess), 200
 
-    # Pad star coordinates to match training input length
-    if len(star_coords) > MAX_STARS_TRAINED * 2:
-        return (
-            jsonify(
-                {"error": f"Too many stars drawn. Max allowed: {MAX_STARS_TRAINED}"}
-            ),
-            400,
-        )
 
-    padded_star_coords = star_coords + [0.0] * (
-        MAX_STARS_TRAINED * 2 - len(star_coords)
+@app.route("/live/<session_id>/events", methods=["GET"])
+def stream_live_session(session_id):
+    """
+    Streams the guesses of a live session as Server-Sent Events.
+
+    Each guess is sent as an "event: guess" message whose data is the JSON returned
+    by the edits endpoint. A client that reconnects with a Last-Event-ID header only
+    receives newer guesses, and one that falls behind skips to the latest guess.
+    """
+    session = live_sessions.get(session_id)
+    if session is None:
+        return jsonify({"error": "Unknown or expired live session"}), 404
+
+    try:
+        last_version = int(request.headers.get("Last-Event-ID", 0))
+    except ValueError:
+        last_version = 0
+
+    def events(version):
+        while not session.closed:
+            version, guess = session.wait_for_guess(version, LIVE_KEEPALIVE_SECONDS)
+            if guess is not None:
+                yield f"event: guess\nid: {version}\ndata: {json.dumps(guess)}\n\n"
+                continue
+            # A stream alone does not keep its session open: idle sessions are closed
+            # here even if no other request triggers expiry
+            live_sessions.expire()
+            if not session.closed:
+                yield ": keep-alive\n\n"
+
+    return Response(
+        events(last_version),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    # --- 2. Prepare Connection Lengths ---
-    connection_lengths = []
 
-    for conn_start_id, conn_end_id in user_connections:
-        # If those stars exist, compute distances between them
-        if conn_start_id in star_map and conn_end_id in star_map:
-            x1, y1 = star_map[conn_start_id]
-            x2, y2 = star_map[conn_end_id]
-            distance = math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
-            connection_lengths.append(distance)
-        else:
-            # Make sure connections only reference valid stars
-            return (
-                jsonify(
-                    {
-                        "error": f"Connections exceed limit. Max allowed: {MAX_CONNECTIONS_TRAINED}"
-                    }
+@app.route("/live/<session_id>", methods=["DELETE"])
+def close_live_session(session_id):
+    """Closes a live session and ends its event stream."""
+    if not live_sessions.close(session_id):
+        return jsonify({"error": "Unknown or expired live session"}), 404
+    return "", 204
+
+
+@app.route("/stats", methods=["GET"])
+def server_stats():
+    """Returns runtime statistics of optional serving components."""
+    return (
+        jsonify(
+            {
+                "batching": (
+                    prediction_batcher.stats() if prediction_batcher is not None else None
                 ),
-                400,
-            )
+                "cache": (
+                    prediction_cache.stats() if prediction_cache is not None else None
+                ),
+                "live_sessions": live_sessions.stats(),
+                "model": model_registry.stats(),
+                "drawing_log": drawing_log.stats() if drawing_log is not None else None,
+            }
+        ),
+        200,
+    )
 
-    # Pad connection lengths to match training input length
-    if len(connection_lengths) > MAX_CONNECTIONS_TRAINED:
+
+@app.route("/metrics", methods=["GET"])
+def server_metrics():
+    """Returns request, stage and component metrics in the Prometheus text format."""
+    if not metrics.enabled:
+        return jsonify({"error": "Metrics are disabled."}), 404
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/profile", methods=["GET"])
+def server_profile():
+    """Returns the sampling profiler's per-stage stacks in folded format."""
+    if profiler is None:
+        return jsonify({"error": "Profiler is disabled."}), 404
+    return Response(profiler.folded(), mimetype="text/plain")
+
+
+def check_admin_token():
+    """
+    Returns an error (body, status) tuple unless the request carries ADMIN_TOKEN as a
+    bearer token. The admin endpoints do not exist while ADMIN_TOKEN is unset.
+    """
+    if not ADMIN_TOKEN:
+        return {"error": "Not found"}, 404
+    if request.headers.get("Authorization") != f"Bearer {ADMIN_TOKEN}":
+        return {"error": "Unauthorized"}, 401
+    return None
+
+
+@app.route("/admin/model", methods=["GET"])
+def admin_model_status():
+    """Returns the active and previous model versions and the reload counters."""
+    error = check_admin_token()
+    if error is not None:
+        body, status = error
+        return jsonify(body), status
+    return jsonify(model_registry.stats()), 200
+
+
+@app.route("/admin/model/reload", methods=["POST"])
+def admin_model_reload():
+    """
+    Loads, smoke-tests and activates a model artifact in this worker while requests
+    keep being served by the current model.
+    Optional JSON input: {"artifact_dir": "model-v2"}, defaults to MODEL_ARTIFACT_DIR.
+    """
+    error = check_admin_token()
+    if error is not None:
+        body, status = error
+        return jsonify(body), status
+
+    data = request.get_json(silent=True) or {}
+    artifact_dir = data.get("artifact_dir", MODEL_ARTIFACT_DIR)
+    try:
+        bundle = model_registry.reload(artifact_dir)
+    except Exception as e:
         return (
             jsonify(
                 {
-                    "error": f"Too many connections drawn. Max allowed: {MAX_CONNECTIONS_TRAINED}"
+                    "error": f"Reload failed: {e}",
+                    "active": model_registry.active.version,
                 }
             ),
-            400,
+            422,
         )
-    
-    padded_connection_lengths = connection_lengths + [0.0] * (
-        MAX_CONNECTIONS_TRAINED - len(connection_lengths)
-    )
+    return jsonify(bundle.describe()), 200
 
-    # --- 3. Combine All Features and Reshape ---
-    combined_features = padded_star_coords + padded_connection_lengths
 
-    # The model expects a 2D array
-    model_input = np.array(combined_features).reshape(1, -1)
+@app.route("/admin/model/rollback", methods=["POST"])
+def admin_model_rollback():
+    """Reactivates the previously active model in this worker."""
+    error = check_admin_token()
+    if error is not None:
+        body, status = error
+        return jsonify(body), status
 
-    # --- 4. Make Prediction ---
     try:
-        numerical_prediction = loaded_model.predict(model_input)[0]
-
-        # --- 5. Decode Prediction ---
-        predicted_constellation_name = loaded_encoder.inverse_transform(
-            [numerical_prediction]
-        )[0]
-
-        return jsonify({"prediction": predicted_constellation_name}), 200
-    except Exception as e:
-        return jsonify({"error": f"Prediction failed: {e}"}), 500
+        bundle = model_registry.rollback()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify(bundle.describe()), 200
 
 
 if __name__ == "__main__":
@@ -0,0 +1,354 @@
+"""
+ASGI variant of the prediction API, for serving many idle or slow connections from a
+single process:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Connections are handled by the asyncio event loop, so a slow client only costs a
+coroutine. Request handling itself (parsing, featurization and inference) runs the
+same code as the Flask app (app.handle_predict / app.handle_predict_batch) on a
+bounded thread pool, which sheds load with 503 responses once it is saturated
+instead of queueing without limit.
+"""
+
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import app as api
+
+# Threads running request handlers, and how many more requests may wait for one.
+# Requests beyond both limits are rejected with 503 Service Unavailable.
+ASGI_INFERENCE_THREADS = int(os.environ.get("ASGI_INFERENCE_THREADS", 4))
+ASGI_INFERENCE_QUEUE = int(os.environ.get("ASGI_INFERENCE_QUEUE", 64))
+
+# Seconds clients are asked to wait before retrying a rejected request
+RETRY_AFTER_SECONDS = 1
+
+
+class PoolSaturated(Exception):
+    """Raised when the inference pool has no free thread and its queue is full."""
+
+
+class InferencePool:
+    """
+    Thread pool with a bounded backlog for blocking request handlers.
+
+    The counters are only touched from the event loop thread, so they need no lock.
+
+    Args:
+        max_threads (int): Number of worker threads.
+        max_queued (int): Number of requests allowed to wait for a free thread.
+    """
+
+    def __init__(self, max_threads=4, max_queued=64):
+        self.max_threads = max_threads
+        self.max_queued = max_queued
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_threads, thread_name_prefix="inference")
+
+    async def run(self, fn, *args):
+        """
+        Runs fn(*args) on the pool and returns its result.
+
+        Raises:
+            PoolSaturated: If max_threads + max_queued calls are already pending.
+        """
+        if self.pending >= self.max_threads + self.max_queued:
+            self.rejected += 1
+            raise PoolSaturated()
+
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, fn, *args
+            )
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    def stats(self):
+        return {
+            "max_threads": self.max_threads,
+            "max_queued": self.max_queued,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+inference_pool = InferencePool(ASGI_INFERENCE_THREADS, ASGI_INFERENCE_QUEUE)
+
+api.metrics.describe(
+    "constellation_inference_pool_pending",
+    "gauge",
+    "Requests running on or waiting for the inference pool.",
+)
+api.metrics.describe(
+    "constellation_inference_pool_completed", "counter", "Requests run on the inference pool."
+)
+api.metrics.describe(
+    "constellation_inference_pool_rejected",
+    "counter",
+    "Requests rejected because the inference pool was saturated.",
+)
+
+ROUTES = {
+    "/predict": api.handle_predict,
+    "/predict_batch": api.handle_predict_batch,
+}
+
+# Largest request body accepted by each route, as in the Flask app
+BODY_LIMITS = {
+    "/predict": api.MAX_PREDICT_BYTES,
+    "/predict_batch": api.MAX_REQUEST_BYTES,
+}
+
+
+class BodyTooLarge(Exception):
+    """Raised when a request body exceeds its route's limit."""
+
+
+class InvalidContentLength(Exception):
+    """Raised when the content-length header is not a non-negative integer."""
+
+
+def is_json(scope):
+    """Returns True if the request's content type is JSON, as Flask's request.is_json."""
+    content_type = dict(scope["headers"]).get(b"content-type", b"")
+    mimetype = content_type.split(b";", 1)[0].strip().lower()
+    return mimetype == b"application/json" or (
+        mimetype.startswith(b"application/") and mimetype.endswith(b"+json")
+    )
+
+
+def run_handler(path, handler, body, json_body):
+    """
+    Decodes a request body and runs a handler on it; called on the inference pool.
+    Bodies that are not sent as JSON are passed on as None, like in the Flask app.
+    """
+    with api.metrics.stage(path, "json"):
+        try:
+            data = json.loads(body) if json_body else None
+        except ValueError:
+            data = None
+    return handler(data)
+
+
+def record_request(path, method, status, start):
+    """Counts a finished request in the same metric families as the Flask app."""
+    api.metrics.inc(
+        "constellation_requests_total",
+        {"endpoint": path, "method": method, "status": status},
+    )
+    api.metrics.observe(
+        "constellation_request_seconds", time.perf_counter() - start, {"endpoint": path}
+    )
+
+
+def cors_headers(scope):
+    """Returns the CORS headers for a request, mirroring the Flask app's CORS setup."""
+    allowed_origin = os.environ.get("FRONTEND_ENDPOINT")
+    origin = dict(scope["headers"]).get(b"origin")
+    if origin is None or allowed_origin is None:
+        return []
+    if allowed_origin != "*" and origin.decode("latin-1") != allowed_origin:
+        return []
+    return [(b"access-control-allow-origin", origin), (b"vary", b"Origin")]
+
+
+async def read_body(scope, receive, limit):
+    """
+    Reads a request body of at most limit bytes. Returns None if the client
+    disconnected.
+
+    Raises:
+        BodyTooLarge: If the declared content-length or the bytes received so far
+            exceed limit. Oversized declared bodies are rejected without being read.
+        InvalidContentLength: If the content-length header is not a number.
+    """
+    content_length = dict(scope["headers"]).get(b"content-length")
+    if content_length is not None:
+        if not content_length.isdigit():
+            raise InvalidContentLength()
+        if int(content_length) > limit:
+            raise BodyTooLarge()
+
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > limit:
+            raise BodyTooLarge()
+        chunks.append(chunk)
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+async def send_text(send, status, text, headers=()):
+    payload = text.encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"text/plain; version=0.0.4; charset=utf-8"),
+                (b"content-length", str(len(payload)).encode()),
+                *headers,
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": payload})
+
+
+async def send_json(send, status, body, headers=()):
+    payload = json.dumps(body).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(payload)).encode()),
+                *headers,
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": payload})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            api.start_model_watcher()
+            api.start_profiler()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            inference_pool.shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """
+    ASGI entry point serving POST /predict, POST /predict_batch, GET /stats and
+    GET /metrics.
+    """
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    method = scope["method"]
+    path = scope["path"]
+    headers = cors_headers(scope)
+
+    if method == "OPTIONS":
+        # CORS preflight
+        requested_headers = dict(scope["headers"]).get(
+            b"access-control-request-headers", b""
+        )
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 204,
+                "headers": [
+                    *headers,
+                    (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+                    (b"access-control-allow-headers", requested_headers),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": b""})
+        return
+
+    if path == "/stats" and method == "GET":
+        stats = {
+            "inference_pool": inference_pool.stats(),
+            "batching": (
+                api.prediction_batcher.stats()
+                if api.prediction_batcher is not None
+                else None
+            ),
+            "cache": (
+                api.prediction_cache.stats() if api.prediction_cache is not None else None
+            ),
+            "model": api.model_registry.stats(),
+        }
+        await send_json(send, 200, stats, headers)
+        return
+
+    if path == "/metrics" and method == "GET":
+        if not api.metrics.enabled:
+            await send_json(send, 404, {"error": "Metrics are disabled."}, headers)
+            return
+        pool_stats = inference_pool.stats()
+        for key in ("pending", "completed", "rejected"):
+            api.metrics.set(f"constellation_inference_pool_{key}", pool_stats[key])
+        await send_text(send, 200, api.metrics.render(), headers)
+        return
+
+    handler = ROUTES.get(path)
+    if handler is None:
+        await send_json(send, 404, {"error": "Not found"}, headers)
+        return
+    if method != "POST":
+        await send_json(send, 405, {"error": "Method not allowed"}, headers)
+        return
+
+    start = time.perf_counter()
+    limit = BODY_LIMITS[path]
+    try:
+        body = await read_body(scope, receive, limit)
+    except BodyTooLarge:
+        record_request(path, method, 413, start)
+        await send_json(
+            send,
+            413,
+            {"error": f"Request body too large. Max allowed: {limit} bytes"},
+            headers,
+        )
+        return
+    except InvalidContentLength:
+        record_request(path, method, 400, start)
+        await send_json(send, 400, {"error": "Invalid Content-Length header"}, headers)
+        return
+    if body is None:
+        return
+
+    try:
+        response, status = await inference_pool.run(
+            run_handler, path, handler, body, is_json(scope)
+        )
+    except PoolSaturated:
+        record_request(path, method, 503, start)
+        await send_json(
+            send,
+            503,
+            {"error": "Server is busy. Please retry shortly."},
+            [*headers, (b"retry-after", str(RETRY_AFTER_SECONDS).encode())],
+        )
+        return
+    except Exception as e:
+        # The handlers turn prediction errors into responses themselves; this catches
+        # anything else so the client still gets JSON and the request is counted
+        print(f"Error handling {method} {path}: {e!r}")
+        record_request(path, method, 500, start)
+        await send_json(send, 500, {"error": "Internal server error"}, headers)
+        return
+
+    record_request(path, method, status, start)
+    await send_json(send, status, response, headers)
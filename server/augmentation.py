@@ -1,13 +1,20 @@
+import argparse
+import hashlib
 import json
 import random
-import copy
 import os
 import math
-import numpy as np  # Import numpy for more efficient array operations if needed, though math module is sufficient here
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
 
 
 def augment_star_pattern(
-    stars, jitter_amount=0.05, scale_range=(0.7, 1.3), rotation_degrees_range=(-30, 30)
+    stars,
+    jitter_amount=0.05,
+    scale_range=(0.7, 1.3),
+    rotation_degrees_range=(-30, 30),
+    rng=None,
 ):
     """
     Augments a single constellation's star pattern by applying scaling, rotation, and jitter.
@@ -20,12 +27,16 @@ def augment_star_pattern(
                              Widened from (0.9, 1.1) to (0.7, 1.3) for more size variation.
         rotation_degrees_range (tuple): A tuple (min_degrees, max_degrees) for random rotation.
                                         New parameter to introduce rotational variance.
+        rng (random.Random): Random generator to draw from. Pass a seeded generator for
+                             reproducible output; the global random module is used if None.
 
     Returns:
         list: A new list of dictionaries with augmented star coordinates.
     """
     if not stars:
         return []
+    if rng is None:
+        rng = random
 
     # Calculate the centroid (mean x, mean y) of the constellation
     xs = [star["x"] for star in stars]
@@ -35,8 +46,8 @@ def augment_star_pattern(
     mean_y = sum(ys) / len(ys)
 
     # Randomly select scale, jitter, and rotation values
-    scale = random.uniform(*scale_range)
-    rotation_degrees = random.uniform(*rotation_degrees_range)
+    scale = rng.uniform(*scale_range)
+    rotation_degrees = rng.uniform(*rotation_degrees_range)
     rotation_radians = math.radians(rotation_degrees)
 
     cos_theta = math.cos(rotation_radians)
@@ -58,8 +69,8 @@ def augment_star_pattern(
         rotated_y = scaled_x * sin_theta + scaled_y * cos_theta
 
         # Translate star back from origin and add jitter
-        final_x = rotated_x + mean_x + random.uniform(-jitter_amount, jitter_amount)
-        final_y = rotated_y + mean_y + random.uniform(-jitter_amount, jitter_amount)
+        final_x = rotated_x + mean_x + rng.uniform(-jitter_amount, jitter_amount)
+        final_y = rotated_y + mean_y + rng.uniform(-jitter_amount, jitter_amount)
 
         # Clamp coordinates to stay within [0, 1] bounds
         final_x = min(max(final_x, 0), 1)
@@ -70,52 +81,601 @@ def augment_star_pattern(
     return augmented_stars
 
 
+def augment_star_patterns(
+    stars,
+    num_augmentations,
+    rng=None,
+    jitter_amount=0.05,
+    scale_range=(0.7, 1.3),
+    rotation_degrees_range=(-30, 30),
+):
+    """
+    Vectorized version of augment_star_pattern that generates many augmentations at once.
+
+    Every augmentation draws its own scale and rotation, which are applied about the
+    constellation's centroid as a batch of 2x2 matrices. Jitter is then added to every
+    coordinate and the result is clamped to [0, 1], exactly like augment_star_pattern.
+
+    Args:
+        stars (list): A list of dictionaries, each representing a star with 'id', 'x', 'y'.
+        num_augmentations (int): Number of augmented copies to generate.
+        rng (np.random.Generator): Random generator to draw from. Pass a seeded generator
+                                   for reproducible output; a fresh one is created if None.
+        jitter_amount (float): The maximum random shift (in normalized units) for each star's x and y.
+        scale_range (tuple): A tuple (min_scale, max_scale) for random scaling.
+        rotation_degrees_range (tuple): A tuple (min_degrees, max_degrees) for random rotation.
+
+    Returns:
+        np.ndarray: Array of shape (num_augmentations, len(stars), 2) holding the x, y
+                    coordinates of every star in every augmentation, in input star order.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    coords = np.array([(star["x"], star["y"]) for star in stars], dtype=np.float64)
+    if len(coords) == 0:
+        return np.empty((num_augmentations, 0, 2))
+
+    centroid = coords.mean(axis=0)
+
+    scales = rng.uniform(*scale_range, size=num_augmentations)
+    rotation_radians = np.radians(rng.uniform(*rotation_degrees_range, size=num_augmentations))
+    cos_theta = np.cos(rotation_radians)
+    sin_theta = np.sin(rotation_radians)
+
+    # Scaled rotation matrix per augmentation, shape (num_augmentations, 2, 2)
+    transforms = scales[:, None, None] * np.stack(
+        [
+            np.stack([cos_theta, -sin_theta], axis=-1),
+            np.stack([sin_theta, cos_theta], axis=-1),
+        ],
+        axis=1,
+    )
+
+    # Coordinates are row vectors, so apply the transposed matrices: (n, 2) @ (K, 2, 2) -> (K, n, 2)
+    augmented = (coords - centroid) @ transforms.transpose(0, 2, 1) + centroid
+
+    augmented += rng.uniform(-jitter_amount, jitter_amount, size=augmented.shape)
+
+    # Clamp coordinates to stay within [0, 1] bounds
+    np.clip(augmented, 0, 1, out=augmented)
+
+    return augmented
+
+
+# Augmentation settings used to build the training set.
+# You can adjust these values based on how much variability you expect in user drawings
+AUGMENTATION_PARAMS = {
+    "jitter_amount": 0.08,  # Increased jitter (e.g., 8% of canvas size)
+    "scale_range": (0.6, 1.4),  # Wider scale range (e.g., 60% to 140% of original size)
+    "rotation_degrees_range": (-90, 90),  # Rotate up to +/- 90 degrees
+}
+
+# Number of augmentations generated per work unit. Fixed so that the random streams,
+# and therefore the output, do not depend on how many workers are used.
+AUGMENTATION_CHUNK_SIZE = 10000
+
+# Bumped whenever the layout of the binary dataset changes
+DATASET_FORMAT_VERSION = 1
+
+# Bumped whenever the same seed and parameters start producing different
+# augmentations, so that stale cached shards are no longer matched
+AUGMENTATION_CACHE_VERSION = 1
+
+
+def template_hash(constellation):
+    """
+    Returns a hex digest of a constellation's star coordinates, the only part of a
+    template its augmentations depend on. Renaming a constellation, reordering the
+    dataset or editing connections leaves it unchanged.
+    """
+    coords = [[star["x"], star["y"]] for star in constellation["stars"]]
+    return hashlib.sha256(json.dumps(coords).encode()).hexdigest()
+
+
+def _hash_json(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+def augmentation_shard_key(stars_hash, chunk_index, count, seed, params):
+    """Returns the cache key of one chunk of augmentations, see generate_augmentation_chunks."""
+    return _hash_json(
+        {
+            "version": AUGMENTATION_CACHE_VERSION,
+            "stars": stars_hash,
+            "chunk": chunk_index,
+            "count": count,
+            "seed": seed,
+            "params": params,
+        }
+    )
+
+
+def _augment_chunk(task):
+    """
+    Generates one chunk of augmentations for one constellation (runs in worker processes).
+
+    Every (constellation, chunk) pair gets its own independent random stream derived
+    from the run seed and the constellation's template hash, so the output is identical
+    for any number of workers and does not change when other constellations are added,
+    removed or edited.
+    """
+    constellation_index, chunk_index, stars, count, seed, params = task
+    stream = int(template_hash({"stars": stars})[:16], 16)
+    rng = np.random.default_rng(
+        np.random.SeedSequence(seed, spawn_key=(stream, chunk_index))
+    )
+    return (
+        constellation_index,
+        chunk_index,
+        augment_star_patterns(stars, count, rng=rng, **params),
+    )
+
+
+def augmentation_shard_paths(
+    data,
+    augmentations_per_constellation,
+    seed,
+    cache_dir,
+    chunk_size=AUGMENTATION_CHUNK_SIZE,
+    params=AUGMENTATION_PARAMS,
+):
+    """
+    Returns the cache path of every chunk of a run, see generate_augmentation_chunks.
+
+    Returns:
+        dict: {(constellation_index, chunk_index): (path, count)} where count is the
+              number of augmentations in the chunk.
+    """
+    paths = {}
+    for constellation_index, constellation in enumerate(data):
+        stars_hash = template_hash(constellation)
+        for chunk_index, chunk_start in enumerate(
+            range(0, augmentations_per_constellation, chunk_size)
+        ):
+            count = min(chunk_size, augmentations_per_constellation - chunk_start)
+            key = augmentation_shard_key(stars_hash, chunk_index, count, seed, params)
+            paths[constellation_index, chunk_index] = (
+                os.path.join(cache_dir, f"{key}.npy"),
+                count,
+            )
+    return paths
+
+
+def prune_augmentation_cache(
+    data,
+    augmentations_per_constellation,
+    seed,
+    cache_dir,
+    chunk_size=AUGMENTATION_CHUNK_SIZE,
+    params=AUGMENTATION_PARAMS,
+):
+    """
+    Deletes every cached chunk that the given run does not use, e.g. chunks of edited
+    templates or of other seeds, and leftovers of interrupted writes.
+
+    The cache is otherwise never cleaned up, so it grows with every template edit and
+    every new seed or augmentation count. Runs sharing the cache with other settings
+    (e.g. training with a different seed) have to regenerate their chunks afterwards.
+
+    Returns:
+        int: Number of files deleted.
+    """
+    if not os.path.isdir(cache_dir):
+        return 0
+    keep = {
+        os.path.basename(path)
+        for path, _ in augmentation_shard_paths(
+            data, augmentations_per_constellation, seed, cache_dir, chunk_size, params
+        ).values()
+    }
+    removed = 0
+    for name in os.listdir(cache_dir):
+        if name.endswith((".npy", ".npy.tmp")) and name not in keep:
+            os.remove(os.path.join(cache_dir, name))
+            removed += 1
+    return removed
+
+
+def _save_shard(path, coords):
+    # Written under a temporary name first, so a crash never leaves a truncated shard
+    with open(f"{path}.tmp", "wb") as f:
+        np.save(f, coords)
+    os.replace(f"{path}.tmp", path)
+
+
+def generate_augmentation_chunks(
+    data,
+    augmentations_per_constellation=500,
+    seed=None,
+    workers=1,
+    chunk_size=AUGMENTATION_CHUNK_SIZE,
+    params=AUGMENTATION_PARAMS,
+    cache_dir=None,
+):
+    """
+    Generates augmented star coordinates chunk by chunk, optionally in parallel.
+
+    The work is sharded by constellation and by chunks of chunk_size augmentations, and
+    the shards are spread across a process pool. Chunks are yielded as they complete,
+    so at most a few chunks are held in memory at a time.
+
+    With a cache_dir and a seed, every chunk is also stored there as
+    <augmentation_shard_key>.npy. The key covers the constellation's template hash,
+    the seed, the chunk and the augmentation parameters, so later runs load every
+    chunk whose inputs did not change and only generate the rest, e.g. the chunks of
+    constellations edited in constellations.json.
+
+    Args:
+        data (list): The original constellation dataset.
+        augmentations_per_constellation (int): Number of augmented samples per constellation.
+        seed (int): Seed of the run. None draws fresh entropy (printed so the run can be repeated).
+        workers (int): Number of worker processes. 1 runs everything in this process.
+        chunk_size (int): Number of augmentations per shard.
+        params (dict): Keyword arguments for augment_star_patterns.
+        cache_dir (str): Directory of cached chunks, or None to disable the cache. Runs
+            without a seed never match a cached chunk, so they do not write any.
+
+    Yields:
+        tuple: (constellation_index, chunk_index, coords) where coords has shape
+               (n, n_stars, 2) and chunk chunk_index covers augmentations
+               chunk_index * chunk_size onwards.
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+        print(f"No seed given, using seed {seed}")
+        cache_dir = None
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    tasks = []
+    cached = []
+    shard_paths = augmentation_shard_paths(
+        data, augmentations_per_constellation, seed, cache_dir or "", chunk_size, params
+    )
+    for (constellation_index, chunk_index), (path, count) in shard_paths.items():
+        if cache_dir is not None and os.path.exists(path):
+            cached.append((constellation_index, chunk_index, path))
+            continue
+        tasks.append(
+            (
+                constellation_index,
+                chunk_index,
+                data[constellation_index]["stars"],
+                count,
+                seed,
+                params,
+            )
+        )
+
+    if cached:
+        print(
+            f"Reusing {len(cached)} cached chunk(s) from {cache_dir}, "
+            f"generating {len(tasks)}"
+        )
+    for constellation_index, chunk_index, path in cached:
+        yield constellation_index, chunk_index, np.load(path)
+
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = as_completed([executor.submit(_augment_chunk, task) for task in tasks])
+        results = (future.result() for future in results)
+    else:
+        executor = None
+        results = map(_augment_chunk, tasks)
+
+    try:
+        for completed, (constellation_index, chunk_index, coords) in enumerate(
+            results, start=1
+        ):
+            print(f"[{completed}/{len(tasks)}] {data[constellation_index]['name']} chunk {chunk_index}")
+            if cache_dir is not None:
+                _save_shard(shard_paths[constellation_index, chunk_index][0], coords)
+            yield constellation_index, chunk_index, coords
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def generate_augmentations(
+    data,
+    augmentations_per_constellation=500,
+    seed=None,
+    workers=1,
+    chunk_size=AUGMENTATION_CHUNK_SIZE,
+    params=AUGMENTATION_PARAMS,
+    cache_dir=None,
+):
+    """
+    Generates augmented star coordinates for every constellation, optionally in parallel.
+
+    Takes the same arguments as generate_augmentation_chunks, but yields a constellation
+    only once all of its chunks are done.
+
+    Yields:
+        tuple: (constellation_index, coords) where coords has shape
+               (augmentations_per_constellation, n_stars, 2).
+    """
+    chunks_per_constellation = -(-augmentations_per_constellation // chunk_size)
+    pending_chunks = {idx: {} for idx in range(len(data))}
+
+    for constellation_index, chunk_index, coords in generate_augmentation_chunks(
+        data, augmentations_per_constellation, seed, workers, chunk_size, params, cache_dir
+    ):
+        chunks = pending_chunks[constellation_index]
+        chunks[chunk_index] = coords
+        if len(chunks) == chunks_per_constellation:
+            del pending_chunks[constellation_index]
+            yield constellation_index, np.concatenate(
+                [chunks[idx] for idx in range(len(chunks))]
+            )
+
+
+def clean_templates(data):
+    """
+    Drops template connections that reference star IDs the template does not have.
+
+    Such connections cannot be featurized (see featurizer.parse_drawing), so they are
+    removed once here, before any augmentation is generated.
+
+    Args:
+        data (list): The original constellation dataset.
+
+    Returns:
+        list: Copies of the constellations with only valid connections.
+    """
+    cleaned = []
+    for constellation in data:
+        star_ids = {star["id"] for star in constellation["stars"]}
+        connections = [
+            [start_id, end_id]
+            for start_id, end_id in constellation["connections"]
+            if start_id in star_ids and end_id in star_ids
+        ]
+        if len(connections) < len(constellation["connections"]):
+            print(
+                f"Warning: Dropping {len(constellation['connections']) - len(connections)} "
+                f"connection(s) to non-existent star IDs in {constellation['name']}."
+            )
+        cleaned.append({**constellation, "connections": connections})
+    return cleaned
+
+
+def connection_positions(constellation):
+    """
+    Converts a constellation's connections from star IDs to star positions.
+
+    Args:
+        constellation (dict): Constellation with "stars" and "connections", cleaned by
+                              clean_templates.
+
+    Returns:
+        np.ndarray: int16 array (n_connections, 2) of star positions.
+    """
+    star_positions = {
+        star["id"]: position for position, star in enumerate(constellation["stars"])
+    }
+    return np.array(
+        [
+            (star_positions[start_id], star_positions[end_id])
+            for start_id, end_id in constellation["connections"]
+        ],
+        dtype=np.int16,
+    ).reshape(-1, 2)
+
+
+def create_binary_dataset(data, augmentations_per_constellation, output_dir):
+    """
+    Lays out a binary columnar dataset in output_dir and returns its coordinate array.
+
+    The dataset consists of:
+        - coords.npy: float32 array (n_samples, max_stars, 2) of star coordinates, zero
+          padded past each constellation's star count. Created as a writable memory map
+          so augmentations can be written into it as they are generated.
+        - labels.npy: int16 array (n_samples,) indexing the manifest's constellation list.
+        - connections.npy: int16 array (n_constellations, max_connections, 2) holding each
+          constellation's connections as star positions, shared by all of its samples.
+          Padding is stored as -1.
+        - manifest.json: dimensions plus name, star/connection counts and row offset of
+          every constellation. Written by finalize_binary_dataset once coords is complete.
+
+    Samples are grouped by constellation, in the order of data.
+
+    Args:
+        data (list): The constellation dataset, cleaned by clean_templates.
+        augmentations_per_constellation (int): Number of samples per constellation.
+        output_dir (str): Directory to write the dataset to.
+
+    Returns:
+        tuple: (coords memmap, manifest dict)
+    """
+    max_stars = max(len(constellation["stars"]) for constellation in data)
+    max_connections = max(len(constellation["connections"]) for constellation in data)
+    num_samples = augmentations_per_constellation * len(data)
+
+    connections = np.full((len(data), max_connections, 2), -1, dtype=np.int16)
+    entries = []
+    for constellation_index, constellation in enumerate(data):
+        connections[
+            constellation_index, : len(constellation["connections"])
+        ] = connection_positions(constellation)
+
+        entries.append(
+            {
+                "name": constellation["name"],
+                "n_stars": len(constellation["stars"]),
+                "n_connections": len(constellation["connections"]),
+                "offset": constellation_index * augmentations_per_constellation,
+                "count": augmentations_per_constellation,
+            }
+        )
+
+    np.save(os.path.join(output_dir, "connections.npy"), connections)
+    np.save(
+        os.path.join(output_dir, "labels.npy"),
+        np.repeat(np.arange(len(data), dtype=np.int16), augmentations_per_constellation),
+    )
+    coords = np.lib.format.open_memmap(
+        os.path.join(output_dir, "coords.npy"),
+        mode="w+",
+        dtype=np.float32,
+        shape=(num_samples, max_stars, 2),
+    )
+
+    manifest = {
+        "format": "npy",
+        "format_version": DATASET_FORMAT_VERSION,
+        "num_samples": num_samples,
+        "max_stars": max_stars,
+        "max_connections": max_connections,
+        "constellations": entries,
+    }
+    return coords, manifest
+
+
+def finalize_binary_dataset(coords, manifest, output_dir):
+    """Flushes the coordinates of a binary dataset and writes its manifest."""
+    coords.flush()
+    with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def write_json_manifest(
+    data, augmentations_per_constellation, output_dir, augmentation_key=None
+):
+    """Writes the manifest.json describing a folder of augmented JSON files."""
+    manifest = {
+        "format": "json",
+        "format_version": DATASET_FORMAT_VERSION,
+        "augmentation_key": augmentation_key,
+        "num_samples": augmentations_per_constellation * len(data),
+        "max_stars": max(len(constellation["stars"]) for constellation in data),
+        "max_connections": max(
+            len(constellation["connections"]) for constellation in data
+        ),
+        "constellations": [
+            {
+                "name": constellation["name"],
+                "file": f"{constellation['name']}.json",
+                "count": augmentations_per_constellation,
+            }
+            for constellation in data
+        ],
+    }
+    with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
 def augment_and_save(
-    data, augmentations_per_constellation=500, output_dir="augmented_data"
+    data,
+    augmentations_per_constellation=500,
+    output_dir="augmented_data",
+    seed=None,
+    workers=1,
+    output_format="npy",
+    cache_dir=None,
+    prune_cache=False,
 ):
     """
-    Generates augmented constellation data and saves it to JSON files in the format 
-    constellation_name.json in the specified output directory.
+    Generates augmented constellation data and saves it in the specified output directory.
+
+    The default "npy" format writes a binary columnar dataset (see create_binary_dataset)
+    that the training script memory-maps directly. The legacy "json" format writes one
+    constellation_name.json file per constellation.
+
+    With a cache_dir and a seed, augmentations are cached per constellation chunk (see
+    generate_augmentation_chunks) and the dataset's manifest records a hash of every
+    input. A run whose inputs match the manifest already in output_dir returns without
+    writing anything.
 
     Args:
         data (list): The original constellation dataset.
         augmentations_per_constellation (int): Number of augmented samples to generate per constellation.
-        output_dir (str): The directory to save the augmented JSON files.
+        output_dir (str): The directory to save the augmented data to.
+        seed (int): Seed of the run. The same seed always produces the same files.
+        workers (int): Number of worker processes used to generate the augmentations.
+        output_format (str): "npy" for the binary dataset or "json" for JSON files.
+        cache_dir (str): Directory of cached augmentation chunks, or None.
+        prune_cache (bool): First delete the cached chunks this run does not use (see
+            prune_augmentation_cache).
     """
 
+    data = clean_templates(data)
+
+    if prune_cache and cache_dir is not None and seed is not None:
+        removed = prune_augmentation_cache(
+            data, augmentations_per_constellation, seed, cache_dir
+        )
+        print(f"Pruned {removed} unused chunk(s) from {cache_dir}")
+
+    augmentation_key = None
+    if cache_dir is not None and seed is not None:
+        augmentation_key = _hash_json(
+            {
+                "version": AUGMENTATION_CACHE_VERSION,
+                "format": output_format,
+                "format_version": DATASET_FORMAT_VERSION,
+                "templates": data,
+                "augmentations": augmentations_per_constellation,
+                "seed": seed,
+                "params": AUGMENTATION_PARAMS,
+            }
+        )
+
     # Create output directory if it does not exist already
     os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as f:
+            existing_key = json.load(f).get("augmentation_key")
+        if augmentation_key is not None and existing_key == augmentation_key:
+            print(f"{output_dir} is up to date ({augmentation_key[:12]}), nothing to do.")
+            return
+        # The manifest is written last, so removing it first marks the dataset as
+        # incomplete until this run finishes
+        os.remove(manifest_path)
     print(f"Saving augmented data to: {output_dir}")
+    print(
+        f"Generating {augmentations_per_constellation} augmentations for "
+        f"{len(data)} constellations with {workers} worker(s)..."
+    )
+
+    if output_format == "npy":
+        dataset_coords, manifest = create_binary_dataset(
+            data, augmentations_per_constellation, output_dir
+        )
+        manifest["augmentation_key"] = augmentation_key
 
     # Each constellation has a name and two lists of pairs of floats: stars and connections.
-    for constellation in data:
-        augmentations = []
+    for constellation_index, augmented_coords in generate_augmentations(
+        data,
+        augmentations_per_constellation,
+        seed=seed,
+        workers=workers,
+        cache_dir=cache_dir,
+    ):
+        constellation = data[constellation_index]
 
-        print(
-            f"Generating {augmentations_per_constellation} augmentations for {constellation['name']}..."
-        )
+        if output_format == "npy":
+            offset = constellation_index * augmentations_per_constellation
+            dataset_coords[
+                offset : offset + augmentations_per_constellation,
+                : len(constellation["stars"]),
+            ] = augmented_coords
+            continue
 
-        for i in range(augmentations_per_constellation):
-            # Call the augmented_star_pattern with new, more aggressive parameters
-            # You can adjust these values based on how much variability you expect in user drawings
-            new_stars = augment_star_pattern(
-                constellation["stars"],
-                jitter_amount=0.08,  # Increased jitter (e.g., 8% of canvas size)
-                scale_range=(
-                    0.6,
-                    1.4,
-                ),  # Wider scale range (e.g., 60% to 140% of original size)
-                rotation_degrees_range=(-90, 90),  # Rotate up to +/- 90 degrees
-            )
-            augmentations.append(
-                {
-                    "name": f"{constellation['name']}_aug{i+1}",
-                    "stars": new_stars,
-                    "connections": copy.deepcopy(
-                        constellation["connections"]
-                    ),  # Connections remain the same
-                }
-            )
+        star_ids = [star["id"] for star in constellation["stars"]]
+        augmentations = [
+            {
+                "name": f"{constellation['name']}_aug{i+1}",
+                "stars": [
+                    {"id": star_id, "x": x, "y": y}
+                    for star_id, (x, y) in zip(star_ids, coords)
+                ],
+                "connections": constellation["connections"],  # Connections remain the same
+            }
+            for i, coords in enumerate(augmented_coords.tolist())
+        ]
 
         # Save all augmentations for the current constellation in one file
         filename = os.path.join(output_dir, f"{constellation['name']}.json")
@@ -125,10 +685,65 @@ def augment_and_save(
 
         print(f"Saved {augmentations_per_constellation} augmentations to {filename}")
 
+    if output_format == "npy":
+        finalize_binary_dataset(dataset_coords, manifest, output_dir)
+        print(f"Saved {manifest['num_samples']} augmentations to {output_dir}")
+    else:
+        # Lets the training script learn the dimensions without scanning the JSON files
+        write_json_manifest(
+            data, augmentations_per_constellation, output_dir, augmentation_key
+        )
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate augmented constellation training data."
+    )
+    parser.add_argument(
+        "--input", default="constellations.json", help="Original constellation data"
+    )
+    parser.add_argument("--output-dir", default="augmented_data")
+    parser.add_argument(
+        "--augmentations",
+        type=int,
+        default=500,
+        help="Augmentations per constellation",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of worker processes",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed of the run. Fixed by default, so reruns are reproducible and hit the cache",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default="augmentation_cache",
+        help="Directory of cached augmentation chunks, reused across runs",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Regenerate everything without the cache"
+    )
+    parser.add_argument(
+        "--prune-cache",
+        action="store_true",
+        help="Delete cached chunks this run does not use, e.g. those of edited templates",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["npy", "json"],
+        default="npy",
+        help="Binary columnar dataset (npy) or one JSON file per constellation (json)",
+    )
+    args = parser.parse_args()
+
     # Load original dataset from file
-    original_data_file = "constellations.json"
+    original_data_file = args.input
 
     try:
         with open(original_data_file, "r") as f:
@@ -142,8 +757,17 @@ if __name__ == "__main__":
 
     # Generate and save augmented data if original data is loaded
     if original_data:
-        augment_and_save(original_data, augmentations_per_constellation=500)
-        
+        augment_and_save(
+            original_data,
+            augmentations_per_constellation=args.augmentations,
+            output_dir=args.output_dir,
+            seed=args.seed,
+            workers=args.workers,
+            output_format=args.format,
+            cache_dir=None if args.no_cache else args.cache_dir,
+            prune_cache=args.prune_cache,
+        )
+
         print("\nAugmentation complete. You can now run your training script.")
     else:
         print("Skipping augmentation as original data could not be loaded.")
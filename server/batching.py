@@ -0,0 +1,129 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from metrics import Histogram
+
+
+class PredictionBatcher:
+    """
+    Coalesces concurrent single-row prediction requests into batched model calls.
+
+    Callers submit one feature row each and block on the returned Future. A background
+    thread waits for the first queued row, keeps collecting rows until either the
+    batching window elapses or max_batch_size rows are gathered, then runs predict_fn
+    once on the stacked matrix and hands every caller its own result.
+
+    This only helps when a worker serves requests concurrently (e.g. gunicorn with
+    --threads or the gthread worker class); with sync workers every batch has size 1.
+
+    Rows may be submitted with their own predict function (e.g. the model version the
+    request started with). Rows with different functions are never stacked together,
+    so a model swap cannot mix feature layouts within one call.
+
+    Args:
+        predict_fn (callable): Takes a 2D feature matrix and returns one prediction per
+            row. Used for rows submitted without a predict function.
+        window_ms (float): How long to wait for more rows after the first one arrives.
+        max_batch_size (int): Maximum number of rows per model call.
+    """
+
+    BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+    QUEUE_DEPTH_BUCKETS = [0, 1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+    def __init__(self, predict_fn, window_ms=2.0, max_batch_size=64):
+        self.predict_fn = predict_fn
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+
+        self.batch_sizes = Histogram(self.BATCH_SIZE_BUCKETS)
+        self.queue_depths = Histogram(self.QUEUE_DEPTH_BUCKETS)
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, features, predict_fn=None):
+        """
+        Queues a single feature row for prediction.
+
+        Args:
+            features (np.ndarray): 1D feature vector.
+            predict_fn (callable): Predict function for this row instead of the
+                batcher's default.
+
+        Returns:
+            Future: Resolves to the prediction for this row.
+        """
+        # Started lazily so that the thread is created inside each forked worker
+        if self._thread is None:
+            self._start()
+
+        future = Future()
+        self._queue.put((features, predict_fn or self.predict_fn, future))
+        return future
+
+    def predict(self, features, predict_fn=None):
+        """Submits a feature row and blocks until its prediction is available."""
+        return self.submit(features, predict_fn).result()
+
+    def stats(self):
+        """Returns the current configuration, queue depth and histograms as a dict."""
+        return {
+            "window_ms": self.window * 1000.0,
+            "max_batch_size": self.max_batch_size,
+            "queue_depth": self._queue.qsize(),
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_depth_at_dispatch": self.queue_depths.snapshot(),
+        }
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="prediction-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def _collect_batch(self):
+        # Block until at least one row is available, then fill the batch within the window
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+
+            self.batch_sizes.observe(len(batch))
+            self.queue_depths.observe(self._queue.qsize())
+
+            # Almost always a single group; several only right after a model swap
+            groups = {}
+            for row, predict_fn, future in batch:
+                groups.setdefault(predict_fn, []).append((row, future))
+
+            for predict_fn, group in groups.items():
+                futures = [future for _, future in group]
+                try:
+                    predictions = predict_fn(np.vstack([row for row, _ in group]))
+                except Exception as e:
+                    for future in futures:
+                        future.set_exception(e)
+                    continue
+
+                for future, prediction in zip(futures, predictions):
+                    future.set_result(prediction)
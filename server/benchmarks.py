@@ -0,0 +1,806 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import pickle
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder
+
+from augmentation import (
+    AUGMENTATION_PARAMS,
+    augment_and_save,
+    augment_star_pattern,
+    augment_star_patterns,
+    clean_templates,
+    connection_positions,
+    generate_augmentations,
+)
+from featurizer import (
+    FEATURE_MODES,
+    feature_count,
+    featurize_coords,
+    featurize_drawings,
+    parse_drawing,
+)
+from forest_engine import FlatForest, load_model_artifact
+from model_registry import ModelBundle
+from template_matcher import TemplateMatcher
+from training_connections import (
+    flatten_forest,
+    load_augmented_data,
+    load_augmented_dataset,
+    load_generated_data,
+    load_training_data,
+    read_dataset_manifest,
+    train_constellation_model,
+)
+
+# Relative change beyond which compare_to_baseline reports a regression. Durations
+# that changed by less than REGRESSION_MIN_DELTA_MS are treated as timer noise.
+REGRESSION_TOLERANCE = 0.2
+REGRESSION_MIN_DELTA_MS = 1.0
+
+
+def time_call(fn, repeats):
+    """Calls fn repeatedly and returns the individual durations in milliseconds."""
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - start) * 1000.0)
+    return np.array(durations)
+
+
+def summarize(durations):
+    """Returns median/p90/p99 latency of an array of durations in milliseconds."""
+    return {
+        "p50_ms": float(np.percentile(durations, 50)),
+        "p90_ms": float(np.percentile(durations, 90)),
+        "p99_ms": float(np.percentile(durations, 99)),
+    }
+
+
+def load_held_out_set(data_folder):
+    """Rebuilds the held-out X_test used by train_constellation_model (same split and seed)."""
+    features, labels = load_training_data(data_folder)
+    encoded_labels = LabelEncoder().fit_transform(labels)
+    _, X_test, _, _ = train_test_split(
+        features,
+        encoded_labels,
+        test_size=0.2,
+        random_state=42,
+        stratify=encoded_labels,
+    )
+    return X_test
+
+
+def load_held_out_drawings(data_folder):
+    """
+    Returns the held-out rows of a binary dataset as drawings, in the same order as
+    load_held_out_set, along with their constellation names.
+
+    Splitting row indices with the same labels, seed and stratification selects exactly
+    the rows that train_constellation_model held out.
+    """
+    manifest = read_dataset_manifest(data_folder)
+    if manifest is None or manifest.get("format") != "npy":
+        raise ValueError(f"'{data_folder}' is not a binary dataset; run augmentation.py")
+
+    coords = np.load(f"{data_folder}/coords.npy", mmap_mode="r")
+    label_indices = np.load(f"{data_folder}/labels.npy")
+    connections = np.load(f"{data_folder}/connections.npy")
+    entries = manifest["constellations"]
+
+    names = np.array([entry["name"] for entry in entries])
+    encoded_labels = LabelEncoder().fit_transform(names[label_indices])
+    _, test_rows = train_test_split(
+        np.arange(len(label_indices)),
+        test_size=0.2,
+        random_state=42,
+        stratify=encoded_labels,
+    )
+
+    drawings = []
+    for row in test_rows:
+        entry = entries[label_indices[row]]
+        drawings.append(
+            (
+                coords[row, : entry["n_stars"]].tolist(),
+                connections[label_indices[row], : entry["n_connections"]].tolist(),
+            )
+        )
+    return drawings, names[label_indices[test_rows]]
+
+
+def shuffle_drawing_stars(drawings, seed):
+    """
+    Lists the stars of every drawing in a random order, with the connections renumbered
+    to match, like build_test_drawings(shuffle_stars=True) does for augmentations.
+    """
+    rng = np.random.default_rng(seed)
+    shuffled = []
+    for star_coords, connection_indices in drawings:
+        order = rng.permutation(len(star_coords))
+        new_position = np.argsort(order)
+        shuffled.append(
+            (
+                [star_coords[i] for i in order],
+                [
+                    (int(new_position[start]), int(new_position[end]))
+                    for start, end in connection_indices
+                ],
+            )
+        )
+    return shuffled
+
+
+def benchmark_forest_engine(
+    data_folder="augmented_data",
+    model_path="constellation_model.pkl",
+    artifact_dir="model",
+    repeats=200,
+):
+    """
+    Compares the sklearn forest against the flat NumPy engine on the held-out set.
+
+    Checks that both engines make identical predictions on X_test, then measures
+    single-row latency and whole-batch latency for each.
+    """
+    with open(model_path, "rb") as f:
+        model = pickle.load(f)
+    forest, _, _ = load_model_artifact(artifact_dir)
+    X_test = load_held_out_set(data_folder)
+
+    sklearn_predictions = model.predict(X_test)
+    flat_predictions = forest.predict(X_test)
+    mismatches = int((sklearn_predictions != flat_predictions).sum())
+    if mismatches:
+        raise AssertionError(
+            f"Flat forest disagrees with sklearn on {mismatches} of {len(X_test)} rows"
+        )
+    print(f"Predictions match on all {len(X_test)} held-out rows.")
+
+    single_row = X_test[:1]
+    results = {"rows": len(X_test)}
+    for name, engine in (("sklearn", model), ("flat", forest)):
+        single = summarize(time_call(lambda: engine.predict(single_row), repeats))
+        batch = summarize(time_call(lambda: engine.predict(X_test), max(repeats // 10, 5)))
+        results[name] = {"single_row": single, "batch": batch}
+        print(
+            f"{name:>8}: single row p50 {single['p50_ms']:.3f} ms, p99 {single['p99_ms']:.3f} ms | "
+            f"batch of {len(X_test)} p50 {batch['p50_ms']:.2f} ms "
+            f"({len(X_test) / batch['p50_ms'] * 1000.0:,.0f} rows/s)"
+        )
+
+    return results
+
+
+def benchmark_featurizer(
+    templates_path="constellations.json", augmentations=2000, repeats=200
+):
+    """
+    Checks that serving and training featurize drawings identically, then times both paths.
+
+    Augmentations of every template are featurized twice: as /predict JSON payloads
+    through parse_drawing + featurize_drawings (the server and JSON loader path), and as
+    arrays through featurize_coords (the binary dataset and on-the-fly training path).
+    The two feature matrices must be identical in every feature mode. Drawings with
+    connections to unknown stars must be rejected by parse_drawing.
+    """
+    with open(templates_path, "r") as f:
+        templates = clean_templates(json.load(f))
+    max_stars = max(len(template["stars"]) for template in templates)
+    max_connections = max(len(template["connections"]) for template in templates)
+
+    payloads = []
+    training_features = {mode: [] for mode in FEATURE_MODES}
+    for constellation_index, coords in generate_augmentations(
+        templates, augmentations, seed=0
+    ):
+        template = templates[constellation_index]
+        for mode in FEATURE_MODES:
+            training_features[mode].append(
+                featurize_coords(
+                    coords,
+                    connection_positions(template),
+                    max_stars,
+                    max_connections,
+                    mode=mode,
+                )
+            )
+        star_ids = [star["id"] for star in template["stars"]]
+        payloads.extend(
+            {
+                "stars": [
+                    {"id": star_id, "x": x, "y": y}
+                    for star_id, (x, y) in zip(star_ids, sample)
+                ],
+                "connections": template["connections"],
+            }
+            for sample in coords.tolist()
+        )
+
+    drawings = [parse_drawing(payload, max_stars, max_connections) for payload in payloads]
+    for mode in FEATURE_MODES:
+        serving_features = featurize_drawings(
+            drawings, max_stars, max_connections, mode=mode
+        )
+        if not np.array_equal(serving_features, np.concatenate(training_features[mode])):
+            raise AssertionError(f"Serving and training {mode} features differ")
+
+    invalid_payload = {**payloads[0], "connections": [[0, max_stars + 1]]}
+    try:
+        parse_drawing(invalid_payload, max_stars, max_connections)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("parse_drawing accepted a connection to an unknown star")
+    print(f"Serving and training features match on all {len(payloads)} drawings.")
+
+    single = summarize(
+        time_call(
+            lambda: featurize_drawings(
+                [parse_drawing(payloads[0], max_stars, max_connections)],
+                max_stars,
+                max_connections,
+            ),
+            repeats,
+        )
+    )
+    batch_repeats = max(repeats // 10, 5)
+    batch = summarize(
+        time_call(
+            lambda: featurize_drawings(drawings, max_stars, max_connections),
+            batch_repeats,
+        )
+    )
+    coords = np.random.default_rng(0).random((len(payloads), max_stars, 2))
+    arrays = summarize(
+        time_call(
+            lambda: featurize_coords(
+                coords, connection_positions(templates[0]), max_stars, max_connections
+            ),
+            batch_repeats,
+        )
+    )
+
+    print(
+        f"parse + featurize one drawing: p50 {single['p50_ms']:.3f} ms, p99 {single['p99_ms']:.3f} ms"
+    )
+    print(
+        f"featurize_drawings on {len(drawings)} drawings: p50 {batch['p50_ms']:.2f} ms "
+        f"({len(drawings) / batch['p50_ms'] * 1000.0:,.0f} rows/s)"
+    )
+    print(
+        f"featurize_coords on {len(coords)} drawings: p50 {arrays['p50_ms']:.2f} ms "
+        f"({len(coords) / arrays['p50_ms'] * 1000.0:,.0f} rows/s)"
+    )
+
+    return {
+        "rows": len(drawings),
+        "single_drawing": single,
+        "featurize_drawings": batch,
+        "featurize_coords": arrays,
+    }
+
+
+def build_test_drawings(templates, augmentations, seed, shuffle_stars=False):
+    """
+    Generates test augmentations of every template as (coords, connections, label) triples.
+
+    With shuffle_stars, the stars of each constellation are listed in a random order
+    (and its connections renumbered to match), like a user who draws the stars in a
+    different order than the template.
+    """
+    rng = np.random.default_rng(seed)
+    test_drawings = []
+    for constellation_index, coords in generate_augmentations(
+        templates, augmentations, seed=seed
+    ):
+        template = templates[constellation_index]
+        connections = connection_positions(template)
+        if shuffle_stars:
+            order = rng.permutation(coords.shape[1])
+            coords = coords[:, order]
+            connections = np.argsort(order)[connections]
+        test_drawings.append((coords, connections, template["name"]))
+    return test_drawings
+
+
+def featurize_test_drawings(test_drawings, max_stars, max_connections, mode):
+    features = np.concatenate(
+        [
+            featurize_coords(
+                coords, connections, max_stars, max_connections, dtype=np.float32, mode=mode
+            )
+            for coords, connections, _ in test_drawings
+        ]
+    )
+    labels = np.concatenate(
+        [np.full(len(coords), name) for coords, _, name in test_drawings]
+    )
+    return features, labels
+
+
+def benchmark_feature_modes(
+    templates_path="constellations.json", augmentations=500, repeats=200
+):
+    """
+    Trains one forest per feature mode on the same in-memory augmentations and compares
+    them on fresh test drawings, with the stars in template order and shuffled.
+
+    Reports accuracy, single-row latency of the flat engine, and the size of the
+    flattened forest (what export_model_artifact writes) for each mode.
+    """
+    with open(templates_path, "r") as f:
+        templates = clean_templates(json.load(f))
+    test_sets = {
+        "template_order": build_test_drawings(templates, augmentations // 4, seed=1),
+        "shuffled_order": build_test_drawings(
+            templates, augmentations // 4, seed=1, shuffle_stars=True
+        ),
+    }
+
+    results = {}
+    for mode in FEATURE_MODES:
+        features, labels, max_stars, max_connections = load_generated_data(
+            templates, augmentations, seed=0, return_dimensions=True, feature_mode=mode
+        )
+        label_encoder = LabelEncoder()
+        model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
+        start = time.perf_counter()
+        model.fit(features, label_encoder.fit_transform(labels))
+        fit_seconds = time.perf_counter() - start
+
+        arrays = flatten_forest(model)
+        forest = FlatForest(
+            **arrays,
+            max_depth=max(estimator.tree_.max_depth for estimator in model.estimators_),
+        )
+
+        accuracy = {}
+        for name, test_drawings in test_sets.items():
+            X_test, y_test = featurize_test_drawings(
+                test_drawings, max_stars, max_connections, mode
+            )
+            predictions = label_encoder.inverse_transform(forest.predict(X_test))
+            accuracy[name] = float((predictions == y_test).mean())
+
+        single = summarize(time_call(lambda: forest.predict(X_test[:1]), repeats))
+        size_bytes = sum(array.nbytes for array in arrays.values())
+        results[mode] = {
+            "n_features": features.shape[1],
+            "fit_seconds": fit_seconds,
+            "accuracy": accuracy,
+            "single_row": single,
+            "nodes": len(arrays["feature"]),
+            "size_bytes": size_bytes,
+        }
+        print(
+            f"{mode:>9}: {features.shape[1]} features | accuracy "
+            f"{accuracy['template_order']:.4f} (shuffled stars {accuracy['shuffled_order']:.4f}) | "
+            f"single row p50 {single['p50_ms']:.3f} ms | "
+            f"{len(arrays['feature']):,} nodes, {size_bytes / 1e6:.1f} MB | fit {fit_seconds:.1f} s"
+        )
+
+    return results
+
+
+def benchmark_drawing_sizes(star_counts=(8, 16, 32, 64), repeats=200):
+    """
+    Shows how each feature mode grows with the largest drawing a model accepts.
+
+    For every star count, a random drawing with that many stars and twice as many
+    connections is parsed and featurized as /predict does, with the model dimensions
+    set to the drawing's size. Reports the feature row length and single-drawing latency.
+    """
+    rng = np.random.default_rng(0)
+    results = {}
+    for mode in FEATURE_MODES:
+        results[mode] = {}
+        for num_stars in star_counts:
+            num_connections = 2 * num_stars
+            payload = {
+                "stars": [
+                    {"id": i, "x": x, "y": y}
+                    for i, (x, y) in enumerate(rng.random((num_stars, 2)).tolist())
+                ],
+                "connections": rng.integers(0, num_stars, (num_connections, 2)).tolist(),
+            }
+            single = summarize(
+                time_call(
+                    lambda: featurize_drawings(
+                        [parse_drawing(payload, num_stars, num_connections)],
+                        num_stars,
+                        num_connections,
+                        mode=mode,
+                    ),
+                    repeats,
+                )
+            )
+            n_features = feature_count(num_stars, num_connections, mode)
+            results[mode][num_stars] = {"n_features": n_features, "single_drawing": single}
+            print(
+                f"{mode:>9} | {num_stars:>3} stars, {num_connections:>3} connections: "
+                f"{n_features:>4} features | parse + featurize p50 {single['p50_ms']:.3f} ms"
+            )
+    return results
+
+
+def benchmark_template_matcher(
+    data_folder="augmented_data",
+    templates_path="constellations.json",
+    artifact_dir="model",
+    repeats=200,
+):
+    """
+    Compares the nearest-template matcher with the served forest on the held-out set.
+
+    Reports accuracy against the true constellation, with the stars in template order
+    and shuffled, how often the two engines agree, single-drawing latency (including
+    featurization for the forest), and the startup time and memory footprint of each
+    engine.
+    """
+    start = time.perf_counter()
+    forest, decoder, manifest = load_model_artifact(artifact_dir)
+    forest_startup = time.perf_counter() - start
+    start = time.perf_counter()
+    matcher = TemplateMatcher.from_file(templates_path)
+    matcher_startup = time.perf_counter() - start
+
+    drawings, y_test = load_held_out_drawings(data_folder)
+    shuffled_drawings = shuffle_drawing_stars(drawings, seed=1)
+    max_stars = manifest["max_stars"]
+    max_connections = manifest["max_connections"]
+    mode = manifest.get("feature_mode", "raw")
+
+    def forest_predict(batch):
+        features = featurize_drawings(batch, max_stars, max_connections, mode=mode)
+        return decoder.inverse_transform(forest.predict(features))
+
+    forest_predictions = forest_predict(drawings)
+    matcher_predictions = matcher.predict(drawings)
+
+    forest_bytes = sum(
+        getattr(forest, name).nbytes
+        for name in ("feature", "threshold", "children", "leaf_index", "leaf_value", "roots")
+    )
+    matcher_bytes = sum(
+        array.nbytes
+        for array in (matcher.edge_lengths, matcher.degrees, matcher.num_connections)
+    ) + sum(
+        indices.nbytes + shapes.nbytes for indices, shapes in matcher.shape_groups.values()
+    )
+
+    results = {
+        "rows": len(drawings),
+        "agreement": float((forest_predictions == matcher_predictions).mean()),
+    }
+    print(f"Held-out drawings: {len(drawings)}")
+    for name, predictions, predict, startup, size_bytes in (
+        ("forest", forest_predictions, forest_predict, forest_startup, forest_bytes),
+        ("template", matcher_predictions, matcher.predict, matcher_startup, matcher_bytes),
+    ):
+        single = summarize(time_call(lambda: predict(drawings[:1]), repeats))
+        accuracy = {
+            "template_order": float((predictions == y_test).mean()),
+            "shuffled_order": float((predict(shuffled_drawings) == y_test).mean()),
+        }
+        results[name] = {
+            "accuracy": accuracy,
+            "single_drawing": single,
+            "startup_ms": startup * 1000.0,
+            "size_bytes": size_bytes,
+        }
+        print(
+            f"{name:>8}: accuracy {accuracy['template_order']:.4f} "
+            f"(shuffled stars {accuracy['shuffled_order']:.4f}) | single drawing p50 "
+            f"{single['p50_ms']:.3f} ms, p99 {single['p99_ms']:.3f} ms | "
+            f"startup {startup * 1000.0:.1f} ms | {size_bytes / 1024:,.1f} KiB"
+        )
+    print(f"Engines agree on {results['agreement']:.2%} of drawings.")
+
+    return results
+
+
+def drawing_payloads(templates, augmentations, seed):
+    """Builds /predict JSON payloads from augmentations of every template."""
+    payloads = []
+    for constellation_index, coords in generate_augmentations(
+        templates, augmentations, seed=seed
+    ):
+        template = templates[constellation_index]
+        star_ids = [star["id"] for star in template["stars"]]
+        payloads.extend(
+            {
+                "stars": [
+                    {"id": star_id, "x": x, "y": y} for star_id, (x, y) in zip(star_ids, sample)
+                ],
+                "connections": template["connections"],
+            }
+            for sample in coords.tolist()
+        )
+    return payloads
+
+
+def timed(fn, repeats=1):
+    """
+    Calls fn repeatedly, without its console output, and returns the median duration
+    in seconds.
+    """
+    durations = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            durations.append(time.perf_counter() - start)
+    return float(np.median(durations))
+
+
+def run_suite(
+    templates_path="constellations.json", augmentations=200, repeats=200, seed=0
+):
+    """
+    Runs the end-to-end benchmark suite offline and returns the results as a dict.
+
+    Measures:
+        - cold start: a fresh `import app` in a subprocess (the model registry loads
+          and smoke-tests the active artifact), and ModelBundle.load on its own
+        - /predict latency through the Flask test client, with and without the cache
+        - /predict_batch latency for 100 and 1000 drawings
+        - augment_star_pattern and augment_star_patterns throughput
+        - augment_and_save in the npy and json formats, and after editing one
+          template with a warm augmentation cache
+        - load_augmented_dataset and load_augmented_data on those datasets
+        - train_constellation_model fit time
+
+    All randomness is seeded, and everything is written to a temporary directory.
+
+    Returns:
+        dict: {"meta": run metadata, "metrics": flat {name: value} dict}. Names ending
+              in _ms or _s are durations (lower is better), names ending in _per_s
+              are throughputs (higher is better).
+    """
+    with open(templates_path, "r") as f:
+        templates = clean_templates(json.load(f))
+    metrics = {}
+
+    # Cold start: process start to a loaded model, then the model load on its own
+    os.environ.setdefault("FRONTEND_ENDPOINT", "http://localhost:5173")
+    cold_starts = []
+    for _ in range(3):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", "import app"],
+            check=True,
+            capture_output=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        cold_starts.append(time.perf_counter() - start)
+    metrics["cold_start.import_app_s"] = float(np.median(cold_starts))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as api
+
+        load_times = time_call(
+            lambda: ModelBundle.load(api.MODEL_ARTIFACT_DIR), max(repeats // 10, 5)
+        )
+    metrics["cold_start.load_model_ms"] = float(np.median(load_times))
+
+    # /predict and /predict_batch through the Flask test client
+    client = api.app.test_client()
+    payloads = drawing_payloads(templates, max(repeats // len(templates), 1) + 100, seed)
+    random.Random(seed).shuffle(payloads)
+    cache = api.prediction_cache
+    api.prediction_cache = None
+    try:
+        requests = iter(payloads)
+        single = time_call(lambda: client.post("/predict", json=next(requests)), repeats)
+    finally:
+        api.prediction_cache = cache
+    for name, value in summarize(single).items():
+        metrics[f"predict.single.{name}"] = value
+
+    if cache is not None:
+        cache.clear()
+        client.post("/predict", json=payloads[0])
+        cached = time_call(lambda: client.post("/predict", json=payloads[0]), repeats)
+        metrics["predict.cached.p50_ms"] = float(np.percentile(cached, 50))
+
+    for batch_size in (100, 1000):
+        body = {"drawings": payloads[:batch_size]}
+        batch = time_call(
+            lambda: client.post("/predict_batch", json=body), max(repeats // 20, 5)
+        )
+        p50 = float(np.percentile(batch, 50))
+        metrics[f"predict_batch.{batch_size}.p50_ms"] = p50
+        metrics[f"predict_batch.{batch_size}.rows_per_s"] = batch_size / p50 * 1000.0
+
+    # Augmentation throughput, per sample and vectorized
+    stars = templates[0]["stars"]
+    rng = random.Random(seed)
+    num_samples = 2000
+    duration = timed(
+        lambda: [
+            augment_star_pattern(stars, rng=rng, **AUGMENTATION_PARAMS)
+            for _ in range(num_samples)
+        ],
+        repeats=3,
+    )
+    metrics["augment.pattern.samples_per_s"] = num_samples / duration
+    num_samples = 100000
+    duration = timed(
+        lambda: augment_star_patterns(
+            stars, num_samples, np.random.default_rng(seed), **AUGMENTATION_PARAMS
+        ),
+        repeats=3,
+    )
+    metrics["augment.patterns.samples_per_s"] = num_samples / duration
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Dataset generation and loading in both formats
+        for output_format, loader in (
+            ("npy", load_augmented_dataset),
+            ("json", load_augmented_data),
+        ):
+            folder = os.path.join(tmp, output_format)
+            metrics[f"augment_and_save.{output_format}_s"] = timed(
+                lambda: augment_and_save(
+                    templates, augmentations, folder, seed=seed, output_format=output_format
+                ),
+                repeats=3,
+            )
+            metrics[f"load.{output_format}_s"] = timed(lambda: loader(folder), repeats=3)
+
+        # Regenerating the dataset after editing one template, with a warm cache
+        cache_dir = os.path.join(tmp, "cache")
+        cached_folder = os.path.join(tmp, "cached")
+        timed(
+            lambda: augment_and_save(
+                templates, augmentations, cached_folder, seed=seed, cache_dir=cache_dir
+            )
+        )
+        edited = [dict(template) for template in templates]
+        edited[0]["stars"] = [
+            {**star, "x": star["x"] * 0.99} for star in templates[0]["stars"]
+        ]
+        metrics["augment_and_save.cached_edit_s"] = timed(
+            lambda: augment_and_save(
+                edited, augmentations, cached_folder, seed=seed, cache_dir=cache_dir
+            )
+        )
+
+        # Fit time on the generated dataset
+        features, labels, max_stars, max_connections = load_augmented_dataset(
+            os.path.join(tmp, "npy"), return_dimensions=True
+        )
+        metrics["fit.train_s"] = timed(
+            lambda: train_constellation_model(
+                features,
+                labels,
+                os.path.join(tmp, "model.pkl"),
+                os.path.join(tmp, "encoder.pkl"),
+                os.path.join(tmp, "model"),
+                max_stars,
+                max_connections,
+            )
+        )
+
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        revision = ""
+
+    meta = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": revision,
+        "model_version": api.model_registry.active.version,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "sklearn": sklearn.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "augmentations": augmentations,
+        "repeats": repeats,
+        "seed": seed,
+    }
+    return {"meta": meta, "metrics": metrics}
+
+
+def compare_to_baseline(
+    results,
+    baseline,
+    tolerance=REGRESSION_TOLERANCE,
+    min_delta_ms=REGRESSION_MIN_DELTA_MS,
+):
+    """
+    Prints every metric next to its baseline value and flags regressions.
+
+    A duration (name ending in _ms or _s) regresses when it grows by more than
+    tolerance and by more than min_delta_ms, a throughput (name ending in _per_s)
+    when it shrinks by more than tolerance. Metrics missing from either run are skipped.
+
+    Returns:
+        list: Names of the regressed metrics.
+    """
+    regressions = []
+    print(f"{'metric':<40} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, value in results["metrics"].items():
+        base = baseline["metrics"].get(name)
+        if base is None or base == 0:
+            continue
+        change = value / base - 1.0
+        if name.endswith("_per_s"):
+            # A throughput drop mirrors a duration increase of the same tolerance
+            regressed = base / value - 1.0 > tolerance
+        else:
+            delta_ms = (value - base) * (1.0 if name.endswith("_ms") else 1000.0)
+            regressed = change > tolerance and delta_ms > min_delta_ms
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{name:<40} {base:>12.4g} {value:>12.4g} {change:>+8.1%}"
+            f"{'  REGRESSION' if regressed else ''}"
+        )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ConstelGuessr performance benchmarks")
+    parser.add_argument(
+        "benchmark",
+        choices=["forest", "featurizer", "features", "sizes", "matcher", "suite"],
+        help="Benchmark to run",
+    )
+    parser.add_argument("--data-folder", default="augmented_data")
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument(
+        "--augmentations",
+        type=int,
+        default=500,
+        help="Training augmentations per constellation (features and suite benchmarks)",
+    )
+    parser.add_argument("--output", help="Write the suite results to this JSON file")
+    parser.add_argument("--baseline", help="Suite results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args()
+
+    if args.benchmark == "forest":
+        benchmark_forest_engine(args.data_folder, repeats=args.repeats)
+    elif args.benchmark == "featurizer":
+        benchmark_featurizer(repeats=args.repeats)
+    elif args.benchmark == "features":
+        benchmark_feature_modes(augmentations=args.augmentations, repeats=args.repeats)
+    elif args.benchmark == "sizes":
+        benchmark_drawing_sizes(repeats=args.repeats)
+    elif args.benchmark == "matcher":
+        benchmark_template_matcher(args.data_folder, repeats=args.repeats)
+    elif args.benchmark == "suite":
+        results = run_suite(augmentations=args.augmentations, repeats=args.repeats)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"Results written to {args.output}")
+        if args.baseline:
+            with open(args.baseline, "r") as f:
+                baseline = json.load(f)
+            regressions = compare_to_baseline(results, baseline, args.tolerance)
+            if regressions:
+                print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+                sys.exit(1)
+        else:
+            print(json.dumps(results, indent=2))
@@ -0,0 +1,291 @@
+import glob
+import itertools
+import json
+import os
+import struct
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# Every segment file starts with this header
+SEGMENT_MAGIC = b"CDLG\x01"
+
+# Per-record header: timestamp, confidence of the prediction, star count, connection
+# count and byte length of the UTF-8 label. It is followed by the float32 star
+# coordinates, the uint16 connection star positions and the label.
+RECORD_HEADER = struct.Struct("<dfHHB")
+
+# Name of the file, inside the log directory, recording how much of each segment
+# retraining has already consumed
+CONSUMED_OFFSETS_FILE = "consumed.json"
+
+
+def encode_record(drawing, label, confidence, timestamp):
+    """
+    Encodes one logged prediction as a binary record.
+
+    Args:
+        drawing (tuple): (star_coords, connection_indices) from featurizer.parse_drawing.
+        label (str): Predicted constellation name.
+        confidence (float): Probability of the predicted constellation.
+        timestamp (float): Unix time of the prediction.
+
+    Returns:
+        bytes: The record.
+    """
+    star_coords, connection_indices = drawing
+    label_bytes = label.encode("utf-8")[:255]
+    num_stars = len(star_coords)
+    num_connections = len(connection_indices)
+    return b"".join(
+        (
+            RECORD_HEADER.pack(
+                timestamp, confidence, num_stars, num_connections, len(label_bytes)
+            ),
+            struct.pack(f"<{2 * num_stars}f", *itertools.chain.from_iterable(star_coords)),
+            struct.pack(
+                f"<{2 * num_connections}H",
+                *itertools.chain.from_iterable(connection_indices),
+            ),
+            label_bytes,
+        )
+    )
+
+
+def decode_records(buffer, offset=0):
+    """
+    Decodes the complete records of a segment, starting at a byte offset.
+
+    A record cut short at the end of the buffer, e.g. one still being written, is left
+    for the next read.
+
+    Args:
+        buffer (bytes): Segment contents.
+        offset (int): Offset of the first record to decode.
+
+    Returns:
+        tuple: (records, end_offset) where records is a list of
+               (drawing, label, confidence, timestamp) tuples and end_offset is the
+               offset just after the last complete record.
+    """
+    records = []
+    header_size = RECORD_HEADER.size
+    while offset + header_size <= len(buffer):
+        timestamp, confidence, num_stars, num_connections, label_length = (
+            RECORD_HEADER.unpack_from(buffer, offset)
+        )
+        coords_end = offset + header_size + num_stars * 8
+        connections_end = coords_end + num_connections * 4
+        record_end = connections_end + label_length
+        if record_end > len(buffer):
+            break
+
+        coords = np.frombuffer(buffer, "<f4", num_stars * 2, offset + header_size)
+        connections = np.frombuffer(buffer, "<u2", num_connections * 2, coords_end)
+        drawing = (
+            coords.reshape(-1, 2).astype(np.float64).tolist(),
+            connections.reshape(-1, 2).tolist(),
+        )
+        label = buffer[connections_end:record_end].decode("utf-8")
+        records.append((drawing, label, confidence, timestamp))
+        offset = record_end
+    return records, offset
+
+
+class DrawingLog:
+    """
+    Append-only binary log of served drawings and their predicted labels.
+
+    append() only adds the drawing to an in-memory deque, so request threads never
+    take a lock, encode, write or wait for the disk. A background thread wakes up every
+    flush_seconds, drains the deque and writes all pending records to the current
+    segment file at once. When max_queued records are pending, new drawings are dropped
+    and counted instead of slowing down requests. Records that cannot be encoded (e.g.
+    coordinates outside the float32 range) are skipped and counted as invalid, and a
+    failed write drops its records and starts a new segment, so the writer thread
+    keeps running either way.
+
+    Each process writes its own segments, named after its start time and PID, so
+    several workers can share one directory. A segment is closed and a new one started
+    once it reaches max_bytes.
+
+    Args:
+        directory (str): Directory holding the segment files.
+        max_bytes (int): Size at which a segment is rotated.
+        flush_seconds (float): Longest time a record stays in the write buffer.
+        max_queued (int): Records that may wait for the writer thread.
+    """
+
+    def __init__(
+        self, directory, max_bytes=64 * 1024 * 1024, flush_seconds=1.0, max_queued=10000
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.flush_seconds = flush_seconds
+
+        self.written = 0
+        self.dropped = 0
+        self.invalid = 0
+        self.segments = 0
+
+        self.max_queued = max_queued
+        self._pending = deque()
+        self._file = None
+        self._file_bytes = 0
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._closing = threading.Event()
+
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, drawing, label, confidence):
+        """Queues one prediction for logging. Never blocks."""
+        # Started lazily so that the thread is created inside each forked worker
+        if self._thread is None:
+            self._start()
+        if len(self._pending) >= self.max_queued:
+            self.dropped += 1
+            return
+        self._pending.append((drawing, label, float(confidence), time.time()))
+
+    def stats(self):
+        return {
+            "directory": self.directory,
+            "written": self.written,
+            "dropped": self.dropped,
+            "invalid": self.invalid,
+            "queued": len(self._pending),
+            "segments": self.segments,
+            "writer_alive": self._thread is not None and self._thread.is_alive(),
+        }
+
+    def close(self):
+        """Writes everything still queued and closes the current segment."""
+        if self._thread is not None:
+            self._closing.set()
+            self._thread.join()
+            self._thread = None
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="drawing-log", daemon=True
+                )
+                self._thread.start()
+
+    def _open_segment(self):
+        if self._file is not None:
+            file, self._file = self._file, None
+            file.close()
+        path = os.path.join(
+            self.directory, f"drawings-{time.time_ns()}-{os.getpid()}.bin"
+        )
+        self._file = open(path, "ab", buffering=1024 * 1024)
+        self._file.write(SEGMENT_MAGIC)
+        self._file_bytes = len(SEGMENT_MAGIC)
+        self.segments += 1
+
+    def _write_pending(self):
+        while self._pending:
+            if self._file is None or self._file_bytes >= self.max_bytes:
+                try:
+                    self._open_segment()
+                except OSError as e:
+                    # Nothing can be written until a segment opens; retry next flush
+                    print(f"Drawing log could not open a segment: {e}")
+                    return
+            # Fill the current segment up to max_bytes in a single write
+            records = []
+            size = 0
+            while self._pending and self._file_bytes + size < self.max_bytes:
+                try:
+                    record = encode_record(*self._pending.popleft())
+                except (struct.error, OverflowError, ValueError, TypeError):
+                    self.invalid += 1
+                    continue
+                records.append(record)
+                size += len(record)
+            try:
+                self._file.write(b"".join(records))
+            except OSError as e:
+                self._abandon_segment(e, len(records))
+                continue
+            self._file_bytes += size
+            self.written += len(records)
+        if self._file is not None:
+            try:
+                self._file.flush()
+            except OSError as e:
+                # Records still in the file buffer are lost with the segment
+                self._abandon_segment(e, 0)
+
+    def _abandon_segment(self, error, num_records):
+        """Drops a segment that failed to write; the next write starts a new one."""
+        print(f"Drawing log write failed, dropping {num_records} record(s): {error}")
+        self.dropped += num_records
+        try:
+            self._file.close()
+        except OSError:
+            pass
+        self._file = None
+
+    def _run(self):
+        while not self._closing.wait(self.flush_seconds):
+            self._write_pending()
+        self._write_pending()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_drawing_log(directory, offsets=None):
+    """
+    Reads the records logged since the given per-segment offsets.
+
+    Segments are only ever appended to, so passing the offsets returned by the previous
+    call reads just the new records, however large the log has grown.
+
+    Args:
+        directory (str): Directory written by DrawingLog.
+        offsets (dict): Byte offset already consumed in each segment, by file name.
+
+    Returns:
+        tuple: (records, new_offsets), records as returned by decode_records.
+
+    Raises:
+        ValueError: If a file in the directory is not a drawing log segment.
+    """
+    offsets = dict(offsets or {})
+    records = []
+    for path in sorted(glob.glob(os.path.join(directory, "drawings-*.bin"))):
+        name = os.path.basename(path)
+        start = max(offsets.get(name, 0), len(SEGMENT_MAGIC))
+        with open(path, "rb") as f:
+            if f.read(len(SEGMENT_MAGIC)) != SEGMENT_MAGIC:
+                raise ValueError(f"{path} is not a drawing log segment")
+            # Consumed records are skipped without being read
+            f.seek(start)
+            buffer = f.read()
+        segment_records, end = decode_records(buffer)
+        offsets[name] = start + end
+        records.extend(segment_records)
+    return records, offsets
+
+
+def read_consumed_offsets(directory):
+    """Returns the segment offsets recorded by the last retraining, or {}."""
+    path = os.path.join(directory, CONSUMED_OFFSETS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def write_consumed_offsets(directory, offsets):
+    path = os.path.join(directory, CONSUMED_OFFSETS_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(offsets, f, indent=2)
+    os.replace(f"{path}.tmp", path)
@@ -0,0 +1,489 @@
+"""
+Feature extraction shared by the server (app.py) and the training pipeline
+(training_connections.py), so the model sees exactly the same features in both.
+
+A feature vector holds the drawing's star coordinates (x0, y0, x1, y1, ...) padded
+with zeros to max_stars * 2 values, followed by the Euclidean length of every
+connection, in drawing order, padded with zeros to max_connections values.
+
+The "invariant" mode (see invariant_features) describes the drawing's shape instead,
+independently of its position, size, rotation and the order the stars were drawn in.
+The "histogram" mode describes the same shape with histograms instead of padded
+sequences, so its length does not depend on max_stars or max_connections at all.
+
+Connections must reference existing stars. parse_drawing rejects a drawing that
+breaks this rule, and template connections are cleaned up once by
+augmentation.clean_templates, so no code path pads a bad connection with 0.0.
+"""
+
+import math
+
+import numpy as np
+
+FEATURE_MODES = ("raw", "invariant", "histogram")
+
+# Modes whose feature vector has the same length for any max_stars/max_connections,
+# so models trained on them accept drawings of any size
+FIXED_SIZE_MODES = ("histogram",)
+
+# Number of angular harmonics and edge-length histogram bins used by the invariant mode
+ANGULAR_HARMONICS = 4
+EDGE_LENGTH_BINS = np.linspace(0.0, 4.0, 9)
+
+# Normalized star radius and star degree bins of the histogram mode. Values past the
+# last edge land in the last bin.
+RADIUS_BINS = np.linspace(0.0, 3.0, 7)
+DEGREE_BINS = np.arange(0, 7)
+
+
+def check_feature_mode(mode):
+    """Raises ValueError if mode is not one of FEATURE_MODES."""
+    if mode not in FEATURE_MODES:
+        raise ValueError(f"Unknown feature mode '{mode}'. Expected one of {FEATURE_MODES}")
+
+
+def feature_segments(max_stars, max_connections, mode="raw"):
+    """
+    Returns the lengths of the consecutive segments of a feature vector. Padding is
+    always at the end of a segment.
+    """
+    if mode == "raw":
+        return [max_stars * 2, max_connections]
+    if mode == "invariant":
+        return [
+            3,  # radial moments
+            ANGULAR_HARMONICS,
+            max_stars,  # sorted radii
+            max_connections,  # sorted edge lengths
+            len(EDGE_LENGTH_BINS) - 1,  # edge length histogram
+            max_stars,  # degree sequence
+            2,  # star and connection counts
+        ]
+    if mode == "histogram":
+        return [
+            3,  # radial moments
+            ANGULAR_HARMONICS,
+            len(RADIUS_BINS) - 1,  # star radius histogram
+            len(EDGE_LENGTH_BINS) - 1,  # edge length histogram
+            len(DEGREE_BINS) - 1,  # degree histogram
+            2,  # star and connection counts
+        ]
+    check_feature_mode(mode)
+
+
+def feature_count(max_stars, max_connections, mode="raw"):
+    """Returns the length of a feature vector for the given padding and mode."""
+    return sum(feature_segments(max_stars, max_connections, mode))
+
+
+def repad_features(features, dimensions, new_dimensions, mode="raw"):
+    """
+    Re-pads a feature matrix built for (max_stars, max_connections) = dimensions to the
+    larger new_dimensions, as if it had been featurized with them in the first place.
+    """
+    old_segments = feature_segments(*dimensions, mode)
+    new_segments = feature_segments(*new_dimensions, mode)
+
+    padded = np.zeros((len(features), sum(new_segments)), dtype=features.dtype)
+    old_start = new_start = 0
+    for old_length, new_length in zip(old_segments, new_segments):
+        padded[:, new_start : new_start + old_length] = features[
+            :, old_start : old_start + old_length
+        ]
+        old_start += old_length
+        new_start += new_length
+    return padded
+
+
+def is_star_id(value):
+    """Returns True if value can be a star ID: a string or number, but not a bool."""
+    return not isinstance(value, bool) and isinstance(value, (int, float, str))
+
+
+def parse_star(star):
+    """
+    Validates one star record of a drawing payload.
+
+    Args:
+        star (dict): Star in the /predict JSON format, e.g. {"id": 0, "x": 0.1, "y": 0.8}.
+
+    Returns:
+        tuple: (star_id, x, y) with x and y as floats.
+
+    Raises:
+        ValueError: If the star is not an object, its ID is not a string or number, or
+            a coordinate is missing or not a finite number.
+    """
+    if not isinstance(star, dict):
+        raise ValueError("Each star must be an object with 'id', 'x' and 'y'")
+    if "id" not in star or "x" not in star or "y" not in star:
+        raise ValueError("Each star needs 'id', 'x' and 'y'")
+
+    star_id = star["id"]
+    if not is_star_id(star_id):
+        raise ValueError(f"Invalid star id {star_id!r} (must be a string or number)")
+
+    coords = []
+    for axis in ("x", "y"):
+        value = star[axis]
+        if (
+            isinstance(value, bool)
+            or not isinstance(value, (int, float))
+            or not math.isfinite(value)
+        ):
+            raise ValueError(
+                f"Star {star_id!r} has an invalid '{axis}' (must be a finite number)"
+            )
+        coords.append(float(value))
+    return star_id, coords[0], coords[1]
+
+
+def parse_drawing(data, max_stars, max_connections):
+    """
+    Validates a single drawing payload and converts it into positional form.
+
+    Star IDs are resolved to their position in the "stars" list so that connections
+    can be looked up by index during featurization.
+
+    Args:
+        data (dict): Drawing in the /predict JSON format ("stars" and "connections").
+        max_stars (int): Maximum number of stars the model accepts.
+        max_connections (int): Maximum number of connections the model accepts.
+
+    Returns:
+        tuple: (star_coords, connection_indices) where star_coords is a list of (x, y)
+            tuples and connection_indices is a list of (start_index, end_index) tuples.
+
+    Raises:
+        ValueError: If the drawing is malformed or exceeds the trained input size.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Invalid JSON input")
+
+    user_stars = data.get("stars")
+    user_connections = data.get("connections")
+
+    # Make sure stars and connections exist and are provided in the right format
+
+    if not isinstance(user_stars, list) or not user_stars:
+        raise ValueError("Missing or invalid 'stars' data (must be a non-empty list)")
+
+    if not isinstance(user_connections, list):
+        # Connections can be empty if user doesn't draw them
+        user_connections = []
+
+    if len(user_stars) > max_stars:
+        raise ValueError(f"Too many stars drawn. Max allowed: {max_stars}")
+    if len(user_connections) > max_connections:
+        raise ValueError(f"Too many connections drawn. Max allowed: {max_connections}")
+
+    star_coords = []
+    star_index = {}
+    for star in user_stars:
+        star_id, x, y = parse_star(star)
+        if star_id in star_index:
+            raise ValueError(f"Duplicate star id {star_id!r}")
+        star_index[star_id] = len(star_coords)
+        star_coords.append((x, y))
+
+    connection_indices = []
+    for connection in user_connections:
+        if not isinstance(connection, (list, tuple)) or len(connection) != 2:
+            raise ValueError(
+                f"Invalid connection {connection!r} (must be a pair of star ids)"
+            )
+        # Make sure connections only reference valid stars. IDs that cannot be
+        # star IDs (e.g. lists, or bools, which would match 0 and 1) are unknown too.
+        for star_id in connection:
+            if not is_star_id(star_id) or star_id not in star_index:
+                raise ValueError(f"Connection references unknown star id {star_id!r}")
+        connection_indices.append((star_index[connection[0]], star_index[connection[1]]))
+
+    return star_coords, connection_indices
+
+
+def connection_lengths(coords, connections):
+    """
+    Returns the Euclidean length of every connection.
+
+    Args:
+        coords (np.ndarray): (n_stars, 2) float64 star coordinates.
+        connections (np.ndarray): (n_connections, 2) star positions into coords.
+    """
+    deltas = coords[connections[:, 1]] - coords[connections[:, 0]]
+    return np.sqrt(deltas[:, 0] ** 2 + deltas[:, 1] ** 2)
+
+
+def featurize_drawings(
+    drawings, max_stars, max_connections, dtype=np.float64, mode="raw"
+):
+    """
+    Builds the feature matrix for a batch of parsed drawings in one vectorized pass.
+
+    Drawings may have different numbers of stars and connections: all stars are
+    flattened into one array and scattered into their rows, and all connection
+    lengths are computed at once.
+
+    Args:
+        drawings (list): Parsed drawings as returned by parse_drawing.
+        max_stars (int): Number of stars the coordinates are padded to.
+        max_connections (int): Number of connections the lengths are padded to.
+        dtype: dtype of the returned matrix.
+        mode (str): One of FEATURE_MODES.
+
+    Returns:
+        np.ndarray: Feature matrix of shape (len(drawings), feature_count(...)).
+    """
+    check_feature_mode(mode)
+    if mode in FIXED_SIZE_MODES:
+        # The features do not depend on the padding, so each drawing is padded only to
+        # its own size. Drawings of equal size are featurized together, which also
+        # keeps every row bit-identical to featurize_coords on the same drawing.
+        groups = {}
+        for index, (stars, connections) in enumerate(drawings):
+            groups.setdefault((len(stars), len(connections)), []).append(index)
+        if len(groups) > 1:
+            features = np.empty((len(drawings), feature_count(1, 0, mode)), dtype=dtype)
+            for (num_stars, num_connections), indices in groups.items():
+                features[indices] = featurize_drawings(
+                    [drawings[index] for index in indices],
+                    num_stars,
+                    num_connections,
+                    dtype=dtype,
+                    mode=mode,
+                )
+            return features
+        max_stars, max_connections = next(iter(groups), (1, 0))
+    if mode != "raw":
+        return invariant_features(
+            *_pad_drawings(drawings, max_stars, max_connections), dtype=dtype, mode=mode
+        )
+    num_drawings = len(drawings)
+    features = np.zeros((num_drawings, max_stars * 2 + max_connections), dtype=dtype)
+    if num_drawings == 0:
+        return features
+
+    star_counts = np.fromiter(
+        (len(stars) for stars, _ in drawings), dtype=np.intp, count=num_drawings
+    )
+    connection_counts = np.fromiter(
+        (len(connections) for _, connections in drawings),
+        dtype=np.intp,
+        count=num_drawings,
+    )
+
+    # Flatten every star of every drawing into one (total_stars, 2) array
+    coords = np.array(
+        [coord for stars, _ in drawings for coord in stars], dtype=np.float64
+    ).reshape(-1, 2)
+
+    # Row of each star and its position inside its own drawing
+    star_offsets = np.cumsum(star_counts) - star_counts
+    star_rows = np.repeat(np.arange(num_drawings), star_counts)
+    star_positions = np.arange(len(coords)) - np.repeat(star_offsets, star_counts)
+
+    features[star_rows, 2 * star_positions] = coords[:, 0]
+    features[star_rows, 2 * star_positions + 1] = coords[:, 1]
+
+    if connection_counts.sum() > 0:
+        # Shift per-drawing star indices into the flattened coordinate array
+        connections = np.array(
+            [pair for _, pairs in drawings for pair in pairs], dtype=np.intp
+        ).reshape(-1, 2)
+        connections += np.repeat(star_offsets, connection_counts)[:, None]
+
+        lengths = connection_lengths(coords, connections)
+
+        connection_offsets = np.cumsum(connection_counts) - connection_counts
+        connection_rows = np.repeat(np.arange(num_drawings), connection_counts)
+        connection_positions = np.arange(len(connections)) - np.repeat(
+            connection_offsets, connection_counts
+        )
+
+        features[connection_rows, max_stars * 2 + connection_positions] = lengths
+
+    return features
+
+
+def featurize_coords(
+    coords, connections, max_stars, max_connections, dtype=np.float64, mode="raw"
+):
+    """
+    Builds the feature matrix for many drawings that share one star layout, such as
+    the augmentations of a single constellation.
+
+    Produces the same features as featurize_drawings, but works directly on arrays:
+    coordinates are reshaped in place and connection lengths are computed for all
+    drawings with one gather.
+
+    Args:
+        coords (np.ndarray): (n_drawings, n_stars, 2) star coordinates, n_stars <= max_stars.
+        connections (np.ndarray): (n_connections, 2) star positions shared by all drawings.
+        max_stars (int): Number of stars the coordinates are padded to.
+        max_connections (int): Number of connections the lengths are padded to.
+        dtype: dtype of the returned matrix.
+        mode (str): One of FEATURE_MODES.
+
+    Returns:
+        np.ndarray: Feature matrix of shape (n_drawings, feature_count(...)).
+    """
+    check_feature_mode(mode)
+    num_drawings, num_stars, _ = coords.shape
+    coords = np.asarray(coords, dtype=np.float64)
+    connections = np.asarray(connections, dtype=np.intp).reshape(-1, 2)
+
+    if mode in FIXED_SIZE_MODES:
+        max_stars = num_stars
+        max_connections = len(connections)
+    if mode != "raw":
+        padded_coords = np.zeros((num_drawings, max_stars, 2))
+        padded_coords[:, :num_stars] = coords
+        star_mask = np.zeros((num_drawings, max_stars), dtype=bool)
+        star_mask[:, :num_stars] = True
+        padded_connections = np.zeros((num_drawings, max_connections, 2), dtype=np.intp)
+        padded_connections[:, : len(connections)] = connections
+        connection_mask = np.zeros((num_drawings, max_connections), dtype=bool)
+        connection_mask[:, : len(connections)] = True
+        return invariant_features(
+            padded_coords,
+            star_mask,
+            padded_connections,
+            connection_mask,
+            dtype=dtype,
+            mode=mode,
+        )
+    features = np.zeros((num_drawings, max_stars * 2 + max_connections), dtype=dtype)
+
+    # Flattened (x, y) star coordinates; the remaining padding stays zero
+    features[:, : num_stars * 2] = coords.reshape(num_drawings, -1)
+
+    deltas = coords[:, connections[:, 1]] - coords[:, connections[:, 0]]
+    features[:, max_stars * 2 : max_stars * 2 + len(connections)] = np.sqrt(
+        deltas[..., 0] ** 2 + deltas[..., 1] ** 2
+    )
+
+    return features
+
+
+def _pad_drawings(drawings, max_stars, max_connections):
+    """Converts parsed drawings into padded arrays plus masks for invariant_features."""
+    num_drawings = len(drawings)
+    coords = np.zeros((num_drawings, max_stars, 2))
+    star_mask = np.zeros((num_drawings, max_stars), dtype=bool)
+    connections = np.zeros((num_drawings, max_connections, 2), dtype=np.intp)
+    connection_mask = np.zeros((num_drawings, max_connections), dtype=bool)
+
+    for row, (stars, pairs) in enumerate(drawings):
+        coords[row, : len(stars)] = stars
+        star_mask[row, : len(stars)] = True
+        if pairs:
+            connections[row, : len(pairs)] = pairs
+            connection_mask[row, : len(pairs)] = True
+
+    return coords, star_mask, connections, connection_mask
+
+
+def _masked_histogram(values, mask, bins):
+    """Counts the masked values of every row into bins; outliers land in the edge bins."""
+    num_rows, num_bins = len(values), len(bins) - 1
+    bin_index = np.searchsorted(bins, values, side="right") - 1
+    np.clip(bin_index, 0, num_bins - 1, out=bin_index)
+    # One bincount over (row, bin) pairs instead of a scatter-add per row
+    bin_index += np.arange(num_rows)[:, None] * num_bins
+    return np.bincount(
+        bin_index.ravel(), weights=mask.ravel(), minlength=num_rows * num_bins
+    ).reshape(num_rows, num_bins)
+
+
+def invariant_features(
+    coords, star_mask, connections, connection_mask, dtype=np.float64, mode="invariant"
+):
+    """
+    Computes shape features that do not change when a drawing is moved, scaled, rotated
+    or its stars are drawn in a different order.
+
+    Distances are measured from the centroid and divided by the mean star distance
+    from it, which removes translation and scale. Per drawing the features are:
+        - radial moments: mean of r^2, r^3 and r^4 over the normalized star radii r
+        - angular moments: magnitude of the radius-weighted k-th circular harmonic of
+          the star angles around the centroid, for k = 1..ANGULAR_HARMONICS
+        - the normalized star radii, sorted in descending order and zero padded
+        - the normalized connection lengths, sorted in descending order and zero padded
+        - a histogram of the normalized connection lengths over EDGE_LENGTH_BINS
+        - the degree sequence of the connection graph, sorted in descending order
+        - the number of stars and the number of connections
+
+    In the "histogram" mode the sorted radii and degree sequence are replaced by
+    histograms over RADIUS_BINS and DEGREE_BINS and the sorted connection lengths are
+    left out, so the row length no longer depends on max_stars or max_connections.
+
+    Args:
+        coords (np.ndarray): (n_drawings, max_stars, 2) star coordinates.
+        star_mask (np.ndarray): (n_drawings, max_stars) True where a star exists.
+        connections (np.ndarray): (n_drawings, max_connections, 2) star positions.
+        connection_mask (np.ndarray): (n_drawings, max_connections) True where a connection exists.
+        dtype: dtype of the returned matrix.
+        mode (str): "invariant" or "histogram".
+
+    Returns:
+        np.ndarray: Feature matrix of shape (n_drawings, feature_count(..., mode)).
+    """
+    num_drawings, max_stars, _ = coords.shape
+    star_weights = star_mask.astype(np.float64)
+    num_stars = np.maximum(star_weights.sum(axis=1), 1.0)
+
+    # Centroid-relative polar coordinates, normalized by the mean radius
+    centroid = (coords * star_weights[..., None]).sum(axis=1) / num_stars[:, None]
+    relative = coords - centroid[:, None, :]
+    radii = np.hypot(relative[..., 0], relative[..., 1]) * star_weights
+    scale = radii.sum(axis=1) / num_stars
+    scale[scale == 0.0] = 1.0
+    radii /= scale[:, None]
+    angles = np.arctan2(relative[..., 1], relative[..., 0])
+
+    radial_moments = np.stack(
+        [(radii**power).sum(axis=1) / num_stars for power in (2, 3, 4)], axis=1
+    )
+    harmonics = np.arange(1, ANGULAR_HARMONICS + 1)
+    phases = np.exp(1j * angles[:, :, None] * harmonics)
+    angular_moments = np.abs((radii[:, :, None] * phases).sum(axis=1)) / num_stars[:, None]
+
+    # Connection lengths in units of the mean radius
+    rows = np.arange(num_drawings)[:, None]
+    deltas = coords[rows, connections[..., 1]] - coords[rows, connections[..., 0]]
+    edge_lengths = np.hypot(deltas[..., 0], deltas[..., 1]) / scale[:, None]
+    edge_lengths *= connection_mask
+
+    # Histogram over real connections only
+    edge_histogram = _masked_histogram(edge_lengths, connection_mask, EDGE_LENGTH_BINS)
+
+    # Both endpoints of every real connection, counted per (drawing, star) in one pass
+    endpoints = connections + rows[..., None] * max_stars
+    degrees = np.bincount(
+        endpoints.ravel(),
+        weights=np.repeat(connection_mask.ravel(), 2),
+        minlength=num_drawings * max_stars,
+    ).reshape(num_drawings, max_stars)
+
+    counts = np.stack([star_weights.sum(axis=1), connection_mask.sum(axis=1)], axis=1)
+
+    if mode == "histogram":
+        segments = [
+            radial_moments,
+            angular_moments,
+            _masked_histogram(radii, star_mask, RADIUS_BINS),
+            edge_histogram,
+            _masked_histogram(degrees, star_mask, DEGREE_BINS),
+            counts,
+        ]
+    else:
+        segments = [
+            radial_moments,
+            angular_moments,
+            -np.sort(-radii, axis=1),
+            -np.sort(-edge_lengths, axis=1),
+            edge_histogram,
+            -np.sort(-degrees, axis=1),
+            counts,
+        ]
+    return np.concatenate(segments, axis=1).astype(dtype, copy=False)
@@ -0,0 +1,196 @@
+import json
+import os
+
+import numpy as np
+
+# Bumped whenever the layout of the model artifact directory changes
+ARTIFACT_FORMAT_VERSION = 1
+
+# File in an artifact directory naming the subdirectory of the current version
+ARTIFACT_POINTER_FILE = "CURRENT"
+
+
+class FlatForest:
+    """
+    Pure-NumPy inference engine for a random forest flattened by flatten_forest
+    (see training_connections.py).
+
+    All trees are stored in shared contiguous arrays indexed by a global node ID:
+        - feature: feature index tested at each node (0 for leaves)
+        - threshold: float32 split threshold at each node; rows go left when x <= threshold
+        - children: (n_nodes, 2) global node IDs of the left and right child. Leaves
+          point to themselves so a finished traversal simply stays in place.
+        - leaf_index: row of leaf_value holding the leaf's class distribution (-1 for internal nodes)
+        - leaf_value: per-leaf class probabilities, one row per leaf
+        - roots: global node ID of each tree's root
+        - classes: class label for each probability column
+
+    Like sklearn, predictions average the per-tree class probabilities (soft voting)
+    and return the class with the highest mean probability, so results match
+    RandomForestClassifier.predict.
+    """
+
+    ARRAY_NAMES = (
+        "feature",
+        "threshold",
+        "children",
+        "leaf_index",
+        "leaf_value",
+        "roots",
+        "classes",
+    )
+
+    def __init__(
+        self,
+        feature,
+        threshold,
+        children,
+        leaf_index,
+        leaf_value,
+        roots,
+        classes,
+        max_depth,
+    ):
+        # Index arrays are used as intp so gathers need no conversion. Arrays that are
+        # already intp (as exported) are kept as-is, which preserves memory-mapping.
+        self.feature = feature.astype(np.intp, copy=False)
+        self.threshold = threshold
+        self.children = children.astype(np.intp, copy=False).reshape(-1)
+        self.leaf_index = leaf_index.astype(np.intp, copy=False)
+        self.leaf_value = leaf_value
+        self.roots = roots.astype(np.intp, copy=False)
+        self.classes_ = classes
+        self.max_depth = int(max_depth)
+
+    @classmethod
+    def load(cls, artifact_dir, max_depth, mmap_mode="r"):
+        """
+        Loads the forest arrays of a model artifact directory.
+
+        Args:
+            artifact_dir (str): Directory written by export_model_artifact.
+            max_depth (int): Depth of the deepest tree, from the manifest.
+            mmap_mode (str): Passed to np.load. The default "r" memory-maps the arrays
+                read-only so that every worker process shares one physical copy.
+        """
+        arrays = {
+            name: np.load(os.path.join(artifact_dir, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in cls.ARRAY_NAMES
+        }
+        return cls(**arrays, max_depth=max_depth)
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    def apply(self, X):
+        """
+        Returns the global leaf node ID reached by every row in every tree.
+
+        Args:
+            X (np.ndarray): Feature matrix of shape (n_samples, n_features).
+
+        Returns:
+            np.ndarray: Array of shape (n_trees, n_samples).
+        """
+        # sklearn evaluates trees on float32 inputs, so cast the same way to get identical splits
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        num_rows, num_features = X.shape
+        flat_X = X.ravel()
+        row_offsets = (np.arange(num_rows) * num_features)[None, :]
+
+        nodes = np.repeat(self.roots[:, None], num_rows, axis=1)
+        for _ in range(self.max_depth):
+            go_right = ~(flat_X[row_offsets + self.feature[nodes]] <= self.threshold[nodes])
+            nodes = self.children[2 * nodes + go_right]
+
+        return nodes
+
+    def predict_proba(self, X):
+        """Returns mean class probabilities over all trees, shape (n_samples, n_classes)."""
+        leaves = self.apply(X)
+        proba = self.leaf_value[self.leaf_index[leaves]].sum(axis=0)
+        return proba / self.n_estimators
+
+    def predict(self, X):
+        """Returns the predicted class label of each row."""
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+
+def top_k_classes(proba, k):
+    """
+    Returns the k most probable columns of every row of a class probability matrix.
+
+    Ties keep column order, so the first column always agrees with the argmax used by
+    FlatForest.predict.
+
+    Args:
+        proba (np.ndarray): (n_samples, n_classes) matrix from predict_proba.
+        k (int): Number of columns to keep per row.
+
+    Returns:
+        tuple: (column_indices, probabilities), each of shape (n_samples, k), best first.
+    """
+    columns = np.argsort(-proba, axis=1, kind="stable")[:, :k]
+    return columns, np.take_along_axis(proba, columns, axis=1)
+
+
+class LabelDecoder:
+    """
+    Maps encoded class indices back to constellation names, mirroring the parts of
+    sklearn's LabelEncoder used for serving.
+    """
+
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes)
+
+    def inverse_transform(self, encoded_labels):
+        return self.classes_.take(np.asarray(encoded_labels, dtype=np.intp))
+
+
+def resolve_artifact_dir(artifact_dir):
+    """
+    Returns the directory holding the current version of a model artifact.
+
+    export_model_artifact writes every version to its own <artifact_dir>/<version>/
+    subdirectory and then atomically replaces the ARTIFACT_POINTER_FILE naming it.
+    Directories without a pointer file (older exports, or a version directory itself)
+    hold the artifact directly.
+    """
+    try:
+        with open(os.path.join(artifact_dir, ARTIFACT_POINTER_FILE), "r") as f:
+            version_dir = f.read().strip()
+    except FileNotFoundError:
+        return artifact_dir
+    return os.path.join(artifact_dir, version_dir)
+
+
+def load_model_artifact(artifact_dir, mmap_mode="r"):
+    """
+    Loads a model artifact directory written by export_model_artifact.
+
+    The pointer file is read once, so the manifest and the arrays always come from the
+    same version even while a new one is being exported.
+
+    Args:
+        artifact_dir (str): Artifact directory, see resolve_artifact_dir.
+        mmap_mode (str): Passed to np.load; None reads the arrays into private memory.
+
+    Returns:
+        tuple: (FlatForest, LabelDecoder, manifest dict)
+
+    Raises:
+        ValueError: If the artifact was written in an unsupported format version.
+    """
+    artifact_dir = resolve_artifact_dir(artifact_dir)
+    with open(os.path.join(artifact_dir, "manifest.json"), "r") as f:
+        manifest = json.load(f)
+
+    if manifest.get("format_version") != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported model artifact format {manifest.get('format_version')} "
+            f"(expected {ARTIFACT_FORMAT_VERSION})"
+        )
+
+    forest = FlatForest.load(artifact_dir, manifest["max_depth"], mmap_mode=mmap_mode)
+    return forest, LabelDecoder(manifest["classes"]), manifest
@@ -0,0 +1,280 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+from featurizer import (
+    connection_lengths,
+    feature_count,
+    featurize_drawings,
+    is_star_id,
+    parse_star,
+)
+
+
+class LiveSession:
+    """
+    Drawing state of one live-guess session, built up from add-star and add-connection
+    edits, with the model's feature row kept up to date as the drawing grows.
+
+    In the raw feature mode an edit only writes the features it changes: a new star
+    fills its two coordinate slots and a new connection fills its length slot, so no
+    edit re-parses or re-featurizes the whole drawing. The invariant and histogram
+    modes normalize over all stars, so there every edit recomputes the (small) row.
+
+    Guesses are published with latest-value semantics: a listener that falls behind
+    skips straight to the newest guess instead of replaying stale ones.
+
+    Args:
+        max_stars (int): Maximum number of stars the model accepts.
+        max_connections (int): Maximum number of connections the model accepts.
+        feature_mode (str): Feature layout the model was trained on.
+        top_k (int): Number of ranked alternatives to include in each guess, or None.
+        engine (str): Prediction engine used for this session's guesses.
+        model (object): Model the session's guesses are made with. It is kept for the
+            session's lifetime, because the feature row is laid out for it.
+    """
+
+    def __init__(
+        self,
+        max_stars,
+        max_connections,
+        feature_mode="raw",
+        top_k=None,
+        engine="forest",
+        model=None,
+    ):
+        self.id = uuid.uuid4().hex
+        self.max_stars = max_stars
+        self.max_connections = max_connections
+        self.feature_mode = feature_mode
+        self.top_k = top_k
+        self.engine = engine
+        self.model = model
+
+        self.star_coords = []
+        self.star_index = {}
+        self.connection_indices = []
+        self._coords = np.zeros((max_stars, 2))
+        self._features = np.zeros(feature_count(max_stars, max_connections, feature_mode))
+
+        self.edit_version = 0
+        self.guess = None
+        self.guess_version = 0
+        self.closed = False
+        self.last_active = time.monotonic()
+
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    @property
+    def drawing(self):
+        """The drawing in positional form, as returned by featurizer.parse_drawing."""
+        return self.star_coords, self.connection_indices
+
+    def apply_edits(self, edits):
+        """
+        Applies a list of edits to the drawing, all or nothing.
+
+        Supported edits:
+            {"type": "add_star", "id": 3, "x": 0.4, "y": 0.7}
+            {"type": "add_connection", "from": 1, "to": 3}
+
+        Args:
+            edits (list): Edits in the order they were made.
+
+        Raises:
+            ValueError: If an edit is malformed, references an unknown star, reuses a
+                star ID or exceeds the trained input size. No edit is applied then.
+        """
+        if not isinstance(edits, list) or not edits:
+            raise ValueError("Missing or invalid 'edits' data (must be a non-empty list)")
+
+        with self._lock:
+            # Validate against a scratch copy so a bad edit leaves the session untouched
+            star_index = dict(self.star_index)
+            num_connections = len(self.connection_indices)
+            new_stars = []
+            new_connections = []
+
+            for edit in edits:
+                if not isinstance(edit, dict):
+                    raise ValueError("Each edit must be an object")
+
+                if edit.get("type") == "add_star":
+                    # Same checks as a /predict star, so bad IDs or coordinates are
+                    # rejected as ValueError rather than failing in the dict or float()
+                    star_id, x, y = parse_star(edit)
+                    if star_id in star_index:
+                        raise ValueError(f"Star {star_id!r} already exists")
+                    if len(star_index) >= self.max_stars:
+                        raise ValueError(
+                            f"Too many stars drawn. Max allowed: {self.max_stars}"
+                        )
+                    star_index[star_id] = len(star_index)
+                    new_stars.append((x, y))
+
+                elif edit.get("type") == "add_connection":
+                    start_id, end_id = edit.get("from"), edit.get("to")
+                    for star_id in (start_id, end_id):
+                        # Unhashable IDs (e.g. lists) must not reach the dict lookup,
+                        # and bools would silently match stars 0 and 1
+                        if not is_star_id(star_id) or star_id not in star_index:
+                            raise ValueError("Connections must reference existing stars")
+                    if num_connections >= self.max_connections:
+                        raise ValueError(
+                            f"Too many connections drawn. Max allowed: {self.max_connections}"
+                        )
+                    num_connections += 1
+                    new_connections.append((star_index[start_id], star_index[end_id]))
+
+                else:
+                    raise ValueError(f"Unknown edit type '{edit.get('type')}'")
+
+            first_star = len(self.star_coords)
+            first_connection = len(self.connection_indices)
+            self.star_index = star_index
+            self.star_coords.extend(new_stars)
+            self.connection_indices.extend(new_connections)
+            self.edit_version += 1
+            self.last_active = time.monotonic()
+
+            if new_stars:
+                self._coords[first_star : len(self.star_coords)] = new_stars
+            if self.feature_mode == "raw":
+                self._update_raw_features(first_star, first_connection)
+
+    def _update_raw_features(self, first_star, first_connection):
+        # Only the slots of the new stars and connections change
+        num_stars = len(self.star_coords)
+        self._features[2 * first_star : 2 * num_stars] = self._coords[
+            first_star:num_stars
+        ].ravel()
+        new_connections = self.connection_indices[first_connection:]
+        if new_connections:
+            offset = self.max_stars * 2 + first_connection
+            self._features[offset : offset + len(new_connections)] = connection_lengths(
+                self._coords, np.array(new_connections, dtype=np.intp)
+            )
+
+    def snapshot(self):
+        """
+        Returns the current edit version, a copy of the drawing and its feature row
+        of shape (1, n_features), taken consistently under the session lock.
+        """
+        with self._lock:
+            drawing = (list(self.star_coords), list(self.connection_indices))
+            if self.feature_mode == "raw":
+                features = self._features[None, :].copy()
+            else:
+                features = featurize_drawings(
+                    [drawing], self.max_stars, self.max_connections, mode=self.feature_mode
+                )
+            return self.edit_version, drawing, features
+
+    def publish(self, edit_version, guess):
+        """
+        Stores the guess made for edit_version and wakes up every listener. Guesses for
+        older versions, e.g. from a slower concurrent request, are dropped.
+        """
+        with self._changed:
+            if edit_version <= self.guess_version:
+                return
+            self.guess = guess
+            self.guess_version = edit_version
+            self._changed.notify_all()
+
+    def wait_for_guess(self, last_version, timeout):
+        """
+        Blocks until a guess newer than last_version exists, the session is closed, or
+        the timeout elapses.
+
+        Returns:
+            tuple: (guess_version, guess), or (last_version, None) on timeout or close.
+        """
+        with self._changed:
+            self._changed.wait_for(
+                lambda: self.guess_version > last_version or self.closed, timeout
+            )
+            if self.guess_version > last_version:
+                return self.guess_version, self.guess
+            return last_version, None
+
+    def close(self):
+        with self._changed:
+            self.closed = True
+            self._changed.notify_all()
+
+
+class LiveSessionStore:
+    """
+    Thread-safe registry of live sessions with a size bound and an idle timeout.
+
+    Sessions live in the memory of one worker process, so deployments with several
+    workers need sticky routing for /live requests.
+
+    Args:
+        max_sessions (int): Maximum number of open sessions. The least recently active
+            session is closed when a new one would exceed it.
+        idle_seconds (float): Sessions not looked up or edited for this long are closed.
+            Expiry runs on every create and get, and through expire() for callers
+            that wait on a session, such as event streams.
+    """
+
+    def __init__(self, max_sessions=1000, idle_seconds=600.0):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, *args, **kwargs):
+        """Opens a new LiveSession with the given arguments and returns it."""
+        session = LiveSession(*args, **kwargs)
+        with self._lock:
+            self._expire()
+            self._sessions[session.id] = session
+            while len(self._sessions) > self.max_sessions:
+                _, evicted = self._sessions.popitem(last=False)
+                evicted.close()
+        return session
+
+    def get(self, session_id):
+        """Returns the open session with this ID and marks it active, or None."""
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_active = time.monotonic()
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def close(self, session_id):
+        """Closes and forgets a session. Returns False if it did not exist."""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_sessions": self.max_sessions,
+                "idle_seconds": self.idle_seconds,
+                "open": len(self._sessions),
+            }
+
+    def expire(self):
+        """Closes every session that has been idle for longer than idle_seconds."""
+        with self._lock:
+            self._expire()
+
+    def _expire(self):
+        now = time.monotonic()
+        for session_id, session in list(self._sessions.items()):
+            if now - session.last_active > self.idle_seconds:
+                del self._sessions[session_id]
+                session.close()
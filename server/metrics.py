@@ -0,0 +1,295 @@
+import bisect
+import contextlib
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Upper bounds in seconds of the stage and request latency histogram buckets
+LATENCY_BUCKETS = [
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+]
+
+# Returned by Metrics.stage when metrics are disabled, so a timed block costs nothing
+NULL_STAGE = contextlib.nullcontext()
+
+
+class Histogram:
+    """
+    Minimal fixed-bucket histogram, compatible with Prometheus' cumulative bucket layout.
+
+    Args:
+        bounds (list): Sorted upper bounds of the buckets. An implicit +Inf bucket is added.
+    """
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        idx = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.total += value
+            self.count += 1
+
+    def snapshot(self):
+        """Returns the histogram as a dict with cumulative bucket counts."""
+        with self._lock:
+            cumulative = []
+            running = 0
+            for bound, count in zip(self.bounds + ["+Inf"], self.counts):
+                running += count
+                cumulative.append([bound, running])
+            return {"buckets": cumulative, "sum": self.total, "count": self.count}
+
+
+class StageTimer:
+    """Context manager that records the duration of a block in a histogram."""
+
+    __slots__ = ("histogram", "profiler", "name", "start")
+
+    def __init__(self, histogram, profiler, name):
+        self.histogram = histogram
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        if self.profiler is not None:
+            self.profiler.enter(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+        if self.profiler is not None:
+            self.profiler.exit()
+        return False
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for the timed stages of request handling.
+
+    A background thread wakes up hz times per second and records the Python stack of
+    every thread that is inside a Metrics.stage block, prefixed with the stage name.
+    The counts are kept in the folded format read by flamegraph.pl and speedscope
+    ("stage;module:function;... count" per line), so each stage gets its own flame.
+
+    Args:
+        hz (float): Sampling frequency.
+    """
+
+    def __init__(self, hz=100.0):
+        self.interval = 1.0 / hz
+        self.samples = Counter()
+        self._active = {}
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def enter(self, name):
+        self._active[threading.get_ident()] = name
+
+    def exit(self):
+        self._active.pop(threading.get_ident(), None)
+
+    def start(self):
+        """
+        Starts this process's sampling thread if it is not running yet. Cheap enough
+        to call on every request, so that each forked worker starts its own thread.
+
+        Returns:
+            bool: True if the thread was started by this call.
+        """
+        if self._pid == os.getpid():
+            return False
+        with self._lock:
+            if self._pid == os.getpid():
+                return False
+            self._pid = os.getpid()
+            # Samples inherited from the parent process belong to the parent
+            self.samples.clear()
+        threading.Thread(target=self._run, name="sampling-profiler", daemon=True).start()
+        return True
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            for thread_id, name in list(self._active.items()):
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+                    frame = frame.f_back
+                key = ";".join([name, *reversed(stack)])
+                with self._lock:
+                    self.samples[key] += 1
+
+    def folded(self):
+        """Returns the collected samples in folded stack format."""
+        with self._lock:
+            return "".join(
+                f"{stack} {count}\n" for stack, count in self.samples.most_common()
+            )
+
+    def dump(self, path):
+        """Writes the folded samples to path, e.g. for flamegraph.pl."""
+        with open(path, "w") as f:
+            f.write(self.folded())
+
+
+class Metrics:
+    """
+    Registry of counters, gauges and histograms, rendered in the Prometheus text format.
+
+    Metric families are identified by name; each sample carries a dict of labels.
+    Collectors registered with add_collector run before every render, to copy the
+    state of other components (e.g. the prediction cache) into gauges.
+
+    Args:
+        enabled (bool): When False, stage() returns NULL_STAGE and inc()/observe()
+            return immediately, so instrumented code runs at full speed.
+        profiler (SamplingProfiler): Optional profiler fed by the stage timers.
+    """
+
+    def __init__(self, enabled=True, profiler=None):
+        self.enabled = enabled
+        self.profiler = profiler
+        self._help = {}
+        self._types = {}
+        self._values = {}
+        self._histograms = {}
+        # Stage histograms by (endpoint, stage), skipping label sorting on the hot path
+        self._stage_histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def describe(self, name, metric_type, help_text):
+        """Registers the type ("counter", "gauge" or "histogram") and help of a family."""
+        self._types[name] = metric_type
+        self._help[name] = help_text
+
+    def inc(self, name, labels=None, amount=1):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, name, value, labels=None):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._values[(name, _label_key(labels))] = value
+
+    def clear(self, name):
+        """Drops every sample of a counter or gauge family, e.g. a replaced info label set."""
+        with self._lock:
+            for key in [key for key in self._values if key[0] == name]:
+                del self._values[key]
+
+    def histogram(self, name, labels=None, bounds=LATENCY_BUCKETS):
+        """Returns the histogram of a family for the given labels, creating it on first use."""
+        key = (name, _label_key(labels))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(bounds))
+        return histogram
+
+    def add_histogram(self, name, histogram, labels=None):
+        """Exposes a histogram owned by another component (e.g. the batcher) under name."""
+        with self._lock:
+            self._histograms[(name, _label_key(labels))] = histogram
+
+    def observe(self, name, value, labels=None):
+        if not self.enabled:
+            return
+        self.histogram(name, labels).observe(value)
+
+    def stage(self, endpoint, stage):
+        """
+        Returns a context manager timing one stage of a request into the
+        constellation_stage_seconds histogram.
+        """
+        if not self.enabled:
+            return NULL_STAGE
+        histogram = self._stage_histograms.get((endpoint, stage))
+        if histogram is None:
+            histogram = self.histogram(
+                "constellation_stage_seconds", {"endpoint": endpoint, "stage": stage}
+            )
+            self._stage_histograms[(endpoint, stage)] = histogram
+        return StageTimer(histogram, self.profiler, stage)
+
+    def add_collector(self, collector):
+        """Registers collector(metrics), called before every render."""
+        self._collectors.append(collector)
+
+    def render(self):
+        """Returns all metrics in the Prometheus text exposition format."""
+        for collector in self._collectors:
+            collector(self)
+
+        with self._lock:
+            values = sorted(self._values.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+
+        lines = []
+        described = set()
+
+        def header(name):
+            if name not in described and name in self._types:
+                described.add(name)
+                lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {self._types[name]}")
+
+        for (name, labels), value in values:
+            header(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for (name, labels), histogram in histograms:
+            header(name)
+            snapshot = histogram.snapshot()
+            for bound, count in snapshot["buckets"]:
+                bucket_labels = labels + (("le", str(bound)),)
+                lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {snapshot['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {snapshot['count']}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
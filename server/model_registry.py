@@ -0,0 +1,260 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from featurizer import FIXED_SIZE_MODES, featurize_drawings, parse_drawing
+from forest_engine import load_model_artifact, resolve_artifact_dir
+
+
+class ModelValidationError(ValueError):
+    """Raised when a model artifact fails its smoke test and is not activated."""
+
+
+class ModelBundle:
+    """
+    Everything needed to serve one model version.
+
+    A bundle is never modified after it is loaded. Request handlers read the active
+    bundle once and use it throughout, so a swap never mixes the dimensions, feature
+    mode or classes of two models within one request.
+
+    Args:
+        model (FlatForest): Forest engine of the artifact.
+        encoder (LabelDecoder): Maps class indices to constellation names.
+        manifest (dict): The artifact's manifest.json.
+        artifact_dir (str): Directory the artifact was loaded from.
+        load_seconds (float): How long loading the artifact took.
+        drawing_limits (tuple): (max_stars, max_connections) accepted by models
+            trained on a fixed-size feature mode, whose inputs do not depend on the
+            dimensions they were trained with. Ignored for the other modes.
+    """
+
+    def __init__(
+        self, model, encoder, manifest, artifact_dir, load_seconds, drawing_limits=None
+    ):
+        self.model = model
+        self.encoder = encoder
+        self.manifest = manifest
+        self.artifact_dir = artifact_dir
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+
+        self.version = manifest["version"]
+        self.max_stars = manifest["max_stars"]
+        self.max_connections = manifest["max_connections"]
+        # Artifacts exported before feature modes existed were trained on raw features
+        self.feature_mode = manifest.get("feature_mode", "raw")
+        if self.feature_mode in FIXED_SIZE_MODES and drawing_limits is not None:
+            self.max_stars, self.max_connections = drawing_limits
+
+    @classmethod
+    def load(cls, artifact_dir, drawing_limits=None):
+        """Loads and memory-maps the artifact in artifact_dir."""
+        start = time.perf_counter()
+        model, encoder, manifest = load_model_artifact(artifact_dir)
+        return cls(
+            model,
+            encoder,
+            manifest,
+            artifact_dir,
+            time.perf_counter() - start,
+            drawing_limits=drawing_limits,
+        )
+
+    def describe(self):
+        return {
+            "version": self.version,
+            "artifact_dir": self.artifact_dir,
+            "feature_mode": self.feature_mode,
+            "max_stars": self.max_stars,
+            "max_connections": self.max_connections,
+            "n_estimators": self.model.n_estimators,
+            "loaded_at": self.loaded_at,
+            "load_seconds": self.load_seconds,
+        }
+
+
+def smoke_test_accuracy(bundle, smoke_set):
+    """
+    Predicts every drawing of a smoke-test set with a bundle.
+
+    Args:
+        bundle (ModelBundle): Model to test.
+        smoke_set (list): (drawing_data, expected_name) pairs, where drawing_data is
+            in the /predict request format.
+
+    Returns:
+        float: Share of drawings predicted as expected. Drawings the model cannot
+               accept (e.g. more stars than it was trained on) count as misses.
+    """
+    drawings = []
+    expected = []
+    for data, name in smoke_set:
+        try:
+            drawings.append(parse_drawing(data, bundle.max_stars, bundle.max_connections))
+            expected.append(name)
+        except ValueError:
+            continue
+    if not drawings:
+        return 0.0
+
+    model_input = featurize_drawings(
+        drawings, bundle.max_stars, bundle.max_connections, mode=bundle.feature_mode
+    )
+    predicted = bundle.encoder.inverse_transform(bundle.model.predict(model_input))
+    return float(np.sum(predicted == np.array(expected))) / len(smoke_set)
+
+
+class ModelRegistry:
+    """
+    Holds the active model bundle and the previous one, and swaps between them.
+
+    New versions are loaded and smoke-tested while the active bundle keeps serving,
+    then activated with a single reference assignment. The previously active bundle
+    stays loaded so that rollback() is instant.
+
+    Args:
+        smoke_set (list): (drawing_data, expected_name) pairs every new version must
+            predict before it is activated, see smoke_test_accuracy.
+        min_accuracy (float): Smoke-test accuracy a new version needs.
+        on_swap (callable): Called as on_swap(new_bundle, old_bundle) after every swap.
+        drawing_limits (tuple): Passed to every ModelBundle, see there.
+    """
+
+    def __init__(self, smoke_set=(), min_accuracy=0.8, on_swap=None, drawing_limits=None):
+        self.smoke_set = list(smoke_set)
+        self.min_accuracy = min_accuracy
+        self.on_swap = on_swap
+        self.drawing_limits = drawing_limits
+
+        self.active = None
+        self.previous = None
+        self.reloads = 0
+        self.failed_reloads = 0
+        self.rollbacks = 0
+        self.last_error = None
+
+        # Serializes reloads and rollbacks; requests never take it
+        self._lock = threading.Lock()
+        self._watch_pid = None
+        self._skipped_version = None
+
+    def load(self, artifact_dir):
+        """
+        Loads and smoke-tests the artifact in artifact_dir without activating it.
+
+        Raises:
+            ModelValidationError: If the smoke-test accuracy is below min_accuracy.
+            Exception: Any error raised while loading the artifact.
+        """
+        bundle = ModelBundle.load(artifact_dir, self.drawing_limits)
+        if self.smoke_set:
+            accuracy = smoke_test_accuracy(bundle, self.smoke_set)
+            if accuracy < self.min_accuracy:
+                raise ModelValidationError(
+                    f"Model {bundle.version} scored {accuracy:.2f} on the smoke test "
+                    f"(needs {self.min_accuracy:.2f})"
+                )
+        return bundle
+
+    def reload(self, artifact_dir):
+        """
+        Loads, validates and activates the artifact in artifact_dir.
+
+        Returns:
+            ModelBundle: The newly active bundle.
+
+        Raises:
+            Exception: If loading or validation fails. The active bundle is kept then.
+        """
+        with self._lock:
+            try:
+                bundle = self.load(artifact_dir)
+            except Exception as e:
+                self.failed_reloads += 1
+                self.last_error = str(e)
+                raise
+            self.reloads += 1
+            self.last_error = None
+            self._swap(bundle)
+            return bundle
+
+    def rollback(self):
+        """
+        Reactivates the previous bundle; the active one becomes the previous.
+
+        Raises:
+            ValueError: If there is no previous bundle.
+        """
+        with self._lock:
+            if self.previous is None:
+                raise ValueError("No previous model version to roll back to")
+            # Keep the watcher from re-activating the version that was rolled back
+            self._skipped_version = self.active.version
+            self.rollbacks += 1
+            self._swap(self.previous)
+            return self.active
+
+    def _swap(self, bundle):
+        old = self.active
+        self.previous = old
+        self.active = bundle
+        if self.on_swap is not None:
+            self.on_swap(bundle, old)
+
+    def watch(self, artifact_dir, interval):
+        """
+        Starts a thread that reloads artifact_dir whenever the version its manifest.json
+        names changes (see forest_engine.resolve_artifact_dir). Does nothing if interval <= 0 or this process already
+        watches; the check is cheap, so it can run lazily on every request so the
+        thread is started inside each forked worker.
+        """
+        if interval <= 0 or self._watch_pid == os.getpid():
+            return
+        self._watch_pid = os.getpid()
+        threading.Thread(
+            target=self._watch,
+            args=(artifact_dir, interval),
+            name="model-watcher",
+            daemon=True,
+        ).start()
+
+    def _watch(self, artifact_dir, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                manifest_path = os.path.join(
+                    resolve_artifact_dir(artifact_dir), "manifest.json"
+                )
+                with open(manifest_path, "r") as f:
+                    version = json.load(f)["version"]
+            except (OSError, ValueError, KeyError):
+                # Missing or half-written manifest; look again on the next tick
+                continue
+
+            # Versions that failed validation or were rolled back are not loaded again
+            # until the manifest changes
+            if version in (self.active.version, self._skipped_version):
+                continue
+            try:
+                bundle = self.reload(artifact_dir)
+                print(f"Model {bundle.version} hot-reloaded from {artifact_dir}.")
+            except Exception as e:
+                self._skipped_version = version
+                print(
+                    f"Hot reload of model {version} failed, "
+                    f"keeping {self.active.version}: {e}"
+                )
+
+    def stats(self):
+        return {
+            "active": self.active.describe() if self.active is not None else None,
+            "previous": self.previous.describe() if self.previous is not None else None,
+            "reloads": self.reloads,
+            "failed_reloads": self.failed_reloads,
+            "rollbacks": self.rollbacks,
+            "last_error": self.last_error,
+        }
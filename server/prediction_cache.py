@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+def canonical_drawing_key(drawing, grid_size, feature_mode="raw"):
+    """
+    Builds a hashable cache key for a parsed drawing (see featurizer.parse_drawing).
+
+    Star coordinates are snapped to a grid of the given cell size, so drawings that
+    differ by less than a cell share a key. Star order is always kept. Connections are
+    treated as undirected, since a connection's length does not depend on its
+    direction. Raw features list connection lengths in drawing order, so in the "raw"
+    mode the key keeps that order. The other feature modes do not depend on it, so
+    there the connections are sorted and drawings that only differ in the order
+    their lines were drawn share a key.
+
+    Args:
+        drawing (tuple): (star_coords, connection_indices) as returned by parse_drawing.
+        grid_size (float): Size of a grid cell in normalized canvas units.
+        feature_mode (str): Feature mode of the model the key is used for.
+
+    Returns:
+        tuple: The canonical key.
+    """
+    star_coords, connection_indices = drawing
+    stars = tuple(
+        (round(x / grid_size), round(y / grid_size)) for x, y in star_coords
+    )
+    connections = [(min(start, end), max(start, end)) for start, end in connection_indices]
+    if feature_mode != "raw":
+        connections.sort()
+    return stars, tuple(connections)
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache with a size bound and a per-entry time to live.
+
+    Args:
+        max_size (int): Maximum number of entries. The least recently used entry is
+            evicted when a new one would exceed it.
+        ttl_seconds (float): How long an entry stays valid after it was stored.
+    """
+
+    def __init__(self, max_size=4096, ttl_seconds=300.0):
+        self.max_size = max_size
+        self.ttl = ttl_seconds
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the cached value for key, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Stores value under key, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Returns the configuration, current size and hit/miss/eviction counters."""
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,265 @@
+import json
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from augmentation import clean_templates
+
+# Weight of the edge-graph distance relative to the Procrustes shape distance
+EDGE_DISTANCE_WEIGHT = 0.5
+
+# Starting rotations tried when pairing template stars with drawing stars, and the
+# number of times each pairing is refined after re-fitting the rotation
+ALIGNMENT_ROTATIONS = 8
+ALIGNMENT_REFINEMENTS = 1
+
+
+def normalize_shape(coords):
+    """
+    Centers star coordinates on their centroid and scales them to unit Frobenius norm,
+    which removes translation and scale before alignment.
+
+    Args:
+        coords (np.ndarray): (n_stars, 2) star coordinates.
+
+    Returns:
+        np.ndarray: The normalized (n_stars, 2) coordinates.
+    """
+    centered = coords - coords.mean(axis=0)
+    norm = np.linalg.norm(centered)
+    return centered / norm if norm > 0.0 else centered
+
+
+def graph_descriptor(shape, connections, max_stars, max_connections):
+    """
+    Describes the connection graph of a normalized shape independently of star order.
+
+    Args:
+        shape (np.ndarray): (n_stars, 2) coordinates from normalize_shape.
+        connections (np.ndarray): (n_connections, 2) star positions.
+        max_stars (int): Length the degree sequence is zero padded to.
+        max_connections (int): Length the edge lengths are zero padded to.
+
+    Returns:
+        tuple: (edge_lengths, degrees), the connection lengths and the star degrees,
+               each sorted in descending order and zero padded.
+    """
+    connections = np.asarray(connections, dtype=np.intp).reshape(-1, 2)
+
+    edge_lengths = np.zeros(max_connections)
+    lengths = np.linalg.norm(shape[connections[:, 1]] - shape[connections[:, 0]], axis=1)
+    edge_lengths[: len(lengths)] = -np.sort(-lengths)
+
+    degrees = np.zeros(max_stars)
+    star_degrees = np.bincount(connections.ravel(), minlength=len(shape))
+    degrees[: len(star_degrees)] = -np.sort(-star_degrees)
+
+    return edge_lengths, degrees
+
+
+def rotation_fit(template_shape, shape):
+    """
+    Fits the rotation that best maps a normalized template onto a normalized drawing
+    of the same size, with stars paired by position.
+
+    For 2x2 cross-covariances the best rotation-only fit has a closed form, so no SVD
+    is needed. Both arguments may carry leading batch dimensions.
+
+    Returns:
+        tuple: (fit, angle) where the Procrustes residual is 1 - fit^2 and angle is
+               the rotation, in radians, that achieves it.
+    """
+    cov = np.einsum("...si,...sj->...ij", template_shape, shape)
+    cos_part = cov[..., 0, 0] + cov[..., 1, 1]
+    sin_part = cov[..., 1, 0] - cov[..., 0, 1]
+    return np.hypot(cos_part, sin_part), np.arctan2(-sin_part, cos_part)
+
+
+def rotate(shapes, angles):
+    """
+    Rotates shapes by angles, broadcasting shapes of shape (..., n_stars, 2) against
+    angles of shape (...), and returns the rotated (..., n_stars, 2) coordinates.
+    """
+    cos, sin = np.cos(angles)[..., None], np.sin(angles)[..., None]
+    x, y = shapes[..., 0], shapes[..., 1]
+    return np.stack([cos * x - sin * y, sin * x + cos * y], axis=-1)
+
+
+def aligned_fits(template_shapes, shape):
+    """
+    Returns the Procrustes fit of each template to a drawing of the same size over
+    star pairings as well as rotations, so the result does not depend on the order in
+    which the stars were drawn.
+
+    Every template is rotated by ALIGNMENT_ROTATIONS evenly spaced angles. At each one,
+    its stars are paired with the drawing's by a minimum-cost (Hungarian) assignment
+    on squared distances, and the rotation is re-fitted to that pairing. The best
+    pairing is then refined ALIGNMENT_REFINEMENTS times from its fitted rotation.
+
+    Args:
+        template_shapes (np.ndarray): (n_templates, n_stars, 2) normalized templates.
+        shape (np.ndarray): (n_stars, 2) normalized drawing.
+
+    Returns:
+        np.ndarray: (n_templates,) fits; the Procrustes residual is 1 - fit^2.
+    """
+    def pairing_fits(rotated):
+        # rotated: (n_templates, n_angles, n_stars, 2) template copies
+        costs = ((rotated[..., :, None, :] - shape) ** 2).sum(axis=-1)
+        pairings = np.array(
+            [linear_sum_assignment(cost)[1] for cost in costs.reshape(-1, *costs.shape[2:])]
+        ).reshape(costs.shape[:3])
+        return rotation_fit(template_shapes[:, None], shape[pairings])
+
+    angles = np.arange(ALIGNMENT_ROTATIONS) * (2.0 * np.pi / ALIGNMENT_ROTATIONS)
+    fits, fitted_angles = pairing_fits(rotate(template_shapes[:, None], angles))
+    best = np.argmax(fits, axis=1)
+    rows = np.arange(len(template_shapes))
+    fit, angle = fits[rows, best], fitted_angles[rows, best]
+    for _ in range(ALIGNMENT_REFINEMENTS):
+        refined_fit, refined_angle = pairing_fits(
+            rotate(template_shapes[:, None], angle[:, None])
+        )
+        improved = refined_fit[:, 0] > fit
+        if not improved.any():
+            break
+        fit = np.where(improved, refined_fit[:, 0], fit)
+        angle = np.where(improved, refined_angle[:, 0], angle)
+    return fit
+
+
+class TemplateMatcher:
+    """
+    Training-free prediction engine that ranks the canonical constellation templates
+    by their distance to a drawing.
+
+    The distance to a template is the sum of two terms:
+        - shape distance: for templates with as many stars as the drawing, the
+          Procrustes residual 1 - s^2 left after optimally rotating and scaling the
+          normalized template onto the normalized drawing, where s is the sum of the
+          singular values of their 2x2 cross-covariance (reflections are not allowed,
+          so a mirrored drawing does not match). Stars are paired by the assignment
+          that fits best (see aligned_fits), so the star order does not matter.
+          Templates with a different star count get the maximum distance of 1.
+        - edge distance: EDGE_DISTANCE_WEIGHT times the L1 distance between the sorted
+          connection lengths plus the L1 distance between the sorted degree sequences
+          divided by twice the number of connections, which does not depend on star order.
+
+    Template descriptors are computed once. The edge distance to all templates takes a
+    handful of vectorized NumPy operations, and only templates with the drawing's star
+    count need a pairing search.
+
+    Args:
+        templates (list): Constellation templates in the constellations.json format.
+        edge_weight (float): Weight of the edge distance.
+    """
+
+    def __init__(self, templates, edge_weight=EDGE_DISTANCE_WEIGHT):
+        templates = clean_templates(templates)
+        self.edge_weight = edge_weight
+        self.names = np.array([template["name"] for template in templates])
+        self.max_stars = max(len(template["stars"]) for template in templates)
+        self.max_connections = max(len(template["connections"]) for template in templates)
+
+        shapes = []
+        edge_lengths = []
+        degrees = []
+        for template in templates:
+            positions = {star["id"]: idx for idx, star in enumerate(template["stars"])}
+            shape = normalize_shape(
+                np.array([[star["x"], star["y"]] for star in template["stars"]])
+            )
+            connections = [
+                [positions[start], positions[end]] for start, end in template["connections"]
+            ]
+            template_edges, template_degrees = graph_descriptor(
+                shape, connections, self.max_stars, self.max_connections
+            )
+            shapes.append(shape)
+            edge_lengths.append(template_edges)
+            degrees.append(template_degrees)
+
+        self.edge_lengths = np.array(edge_lengths)
+        self.degrees = np.array(degrees)
+        self.num_connections = np.array(
+            [len(template["connections"]) for template in templates]
+        )
+
+        # Templates grouped by star count, so each group is aligned in a single batch
+        self.shape_groups = {}
+        for num_stars in sorted({len(shape) for shape in shapes}):
+            indices = np.array(
+                [idx for idx, shape in enumerate(shapes) if len(shape) == num_stars]
+            )
+            self.shape_groups[num_stars] = (indices, np.stack([shapes[i] for i in indices]))
+
+    @classmethod
+    def from_file(cls, templates_path="constellations.json", **kwargs):
+        """Builds a matcher from a constellations.json file."""
+        with open(templates_path, "r") as f:
+            return cls(json.load(f), **kwargs)
+
+    def distances(self, drawing):
+        """
+        Returns the distance from a drawing to every template.
+
+        Args:
+            drawing (tuple): (star_coords, connection_indices) as returned by
+                featurizer.parse_drawing.
+
+        Returns:
+            np.ndarray: One distance per template, in the order of self.names.
+        """
+        star_coords, connection_indices = drawing
+        if not star_coords:
+            return np.full(len(self.names), np.inf)
+
+        shape = normalize_shape(np.asarray(star_coords, dtype=np.float64))
+        max_stars = max(self.max_stars, len(star_coords))
+        max_connections = max(self.max_connections, len(connection_indices))
+        edge_lengths, degrees = graph_descriptor(
+            shape, connection_indices, max_stars, max_connections
+        )
+
+        # Shape distance; only templates with the same number of stars can be aligned
+        shape_distance = np.ones(len(self.names))
+        group = self.shape_groups.get(len(star_coords))
+        if group is not None:
+            indices, template_shapes = group
+            shape_distance[indices] = 1.0 - aligned_fits(template_shapes, shape) ** 2
+
+        # Edge distance; template descriptors are padded if the drawing is larger
+        template_edges = np.pad(
+            self.edge_lengths, ((0, 0), (0, max_connections - self.max_connections))
+        )
+        template_degrees = np.pad(self.degrees, ((0, 0), (0, max_stars - self.max_stars)))
+        num_connections = np.maximum(self.num_connections, len(connection_indices))
+        edge_distance = np.abs(template_edges - edge_lengths).sum(axis=1) + np.abs(
+            template_degrees - degrees
+        ).sum(axis=1) / (2.0 * np.maximum(num_connections, 1))
+
+        return shape_distance + self.edge_weight * edge_distance
+
+    def rank(self, drawing, top_k=None):
+        """
+        Ranks the templates from best to worst match for a drawing.
+
+        Args:
+            drawing (tuple): (star_coords, connection_indices) from featurizer.parse_drawing.
+            top_k (int): Number of matches to return; all templates if None.
+
+        Returns:
+            list: [{"constellation": name, "distance": distance}, ...], best match first.
+        """
+        distances = self.distances(drawing)
+        order = np.argsort(distances, kind="stable")[:top_k]
+        return [
+            {"constellation": str(self.names[idx]), "distance": float(distances[idx])}
+            for idx in order
+        ]
+
+    def predict(self, drawings):
+        """Returns the name of the best matching template for each drawing."""
+        return np.array(
+            [self.names[np.argmin(self.distances(drawing))] for drawing in drawings]
+        )
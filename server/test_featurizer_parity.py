@@ -0,0 +1,161 @@
+"""
+Parity tests: training and serving must featurize drawings identically, and the flat
+forest engine must predict exactly like the scikit-learn forest it was exported from.
+
+    cd server && python -m pytest -q
+"""
+
+import json
+import math
+import os
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder
+
+from augmentation import clean_templates, connection_positions, generate_augmentations
+from featurizer import (
+    FEATURE_MODES,
+    feature_count,
+    featurize_coords,
+    featurize_drawings,
+    parse_drawing,
+)
+from forest_engine import load_model_artifact
+from training_connections import export_model_artifact, load_generated_data
+
+TEMPLATES_PATH = os.path.join(os.path.dirname(__file__), "constellations.json")
+
+
+@pytest.fixture(scope="module")
+def templates():
+    with open(TEMPLATES_PATH, "r") as f:
+        return clean_templates(json.load(f))
+
+
+@pytest.fixture(scope="module")
+def dimensions(templates):
+    return (
+        max(len(template["stars"]) for template in templates),
+        max(len(template["connections"]) for template in templates),
+    )
+
+
+def to_payload(template, coords):
+    """Turns one augmentation into a /predict request body."""
+    return {
+        "stars": [
+            {"id": star["id"], "x": x, "y": y}
+            for star, (x, y) in zip(template["stars"], coords)
+        ],
+        "connections": template["connections"],
+    }
+
+
+def reference_raw_features(drawing, max_stars, max_connections):
+    """Straightforward per-drawing implementation of the raw feature layout."""
+    star_coords, connection_indices = drawing
+    row = [0.0] * (2 * max_stars + max_connections)
+    for position, (x, y) in enumerate(star_coords):
+        row[2 * position] = x
+        row[2 * position + 1] = y
+    for position, (start, end) in enumerate(connection_indices):
+        (x0, y0), (x1, y1) = star_coords[start], star_coords[end]
+        row[2 * max_stars + position] = math.hypot(x1 - x0, y1 - y0)
+    return row
+
+
+@pytest.mark.parametrize("mode", FEATURE_MODES)
+def test_serving_matches_training_features(templates, dimensions, mode):
+    max_stars, max_connections = dimensions
+    payloads = []
+    training_features = []
+    for constellation_index, coords in generate_augmentations(templates, 20, seed=0):
+        template = templates[constellation_index]
+        training_features.append(
+            featurize_coords(
+                coords, connection_positions(template), *dimensions, mode=mode
+            )
+        )
+        payloads.extend(to_payload(template, sample) for sample in coords.tolist())
+
+    drawings = [parse_drawing(payload, *dimensions) for payload in payloads]
+    serving_features = featurize_drawings(drawings, *dimensions, mode=mode)
+
+    assert serving_features.shape == (
+        len(payloads),
+        feature_count(max_stars, max_connections, mode),
+    )
+    np.testing.assert_array_equal(serving_features, np.concatenate(training_features))
+
+    # A single drawing, as /predict featurizes it, gives the same row as the batch
+    np.testing.assert_array_equal(
+        featurize_drawings(drawings[-1:], *dimensions, mode=mode), serving_features[-1:]
+    )
+
+
+def test_raw_features_match_reference(templates, dimensions):
+    drawings = [
+        parse_drawing(to_payload(template, coords), *dimensions)
+        for constellation_index, samples in generate_augmentations(templates, 5, seed=1)
+        for template in [templates[constellation_index]]
+        for coords in samples.tolist()
+    ]
+    expected = [reference_raw_features(drawing, *dimensions) for drawing in drawings]
+    np.testing.assert_allclose(
+        featurize_drawings(drawings, *dimensions), expected, rtol=0, atol=1e-12
+    )
+
+
+@pytest.mark.parametrize("mode", ["invariant", "histogram"])
+def test_invariant_modes_ignore_star_order(templates, dimensions, mode):
+    template = templates[2]
+    coords = [(star["x"], star["y"]) for star in template["stars"]]
+    drawing = parse_drawing(to_payload(template, coords), *dimensions)
+    star_coords, connection_indices = drawing
+    order = np.random.default_rng(0).permutation(len(star_coords))
+    new_position = np.argsort(order)
+    shuffled = (
+        [star_coords[i] for i in order],
+        [(new_position[start], new_position[end]) for start, end in connection_indices],
+    )
+    np.testing.assert_allclose(
+        featurize_drawings([shuffled], *dimensions, mode=mode),
+        featurize_drawings([drawing], *dimensions, mode=mode),
+        atol=1e-12,
+    )
+
+
+def test_unknown_feature_mode_is_rejected(dimensions):
+    drawing = ([(0.1, 0.2), (0.3, 0.4)], [(0, 1)])
+    with pytest.raises(ValueError):
+        featurize_drawings([drawing], *dimensions, mode="bogus")
+    with pytest.raises(ValueError):
+        featurize_coords(np.zeros((1, 2, 2)), [(0, 1)], *dimensions, mode="bogus")
+
+
+@pytest.mark.parametrize("mode", FEATURE_MODES)
+def test_flat_forest_matches_sklearn(templates, tmp_path, mode):
+    features, labels, max_stars, max_connections = load_generated_data(
+        templates, 40, seed=0, return_dimensions=True, feature_mode=mode
+    )
+    label_encoder = LabelEncoder()
+    model = RandomForestClassifier(n_estimators=15, random_state=0)
+    model.fit(features, label_encoder.fit_transform(labels))
+
+    # Through the exported, memory-mapped artifact, exactly as the server loads it
+    export_model_artifact(
+        model, label_encoder, max_stars, max_connections, str(tmp_path), mode
+    )
+    forest, encoder, manifest = load_model_artifact(str(tmp_path))
+    assert manifest["feature_mode"] == mode
+
+    test_features, _ = load_generated_data(templates, 10, seed=1, feature_mode=mode)
+    np.testing.assert_allclose(
+        forest.predict_proba(test_features), model.predict_proba(test_features), atol=1e-12
+    )
+    np.testing.assert_array_equal(
+        encoder.inverse_transform(forest.predict(test_features)),
+        label_encoder.inverse_transform(model.predict(test_features)),
+    )
@@ -1,3 +1,4 @@
+import argparse
 import os
 import json
 import numpy as np
@@ -6,51 +7,240 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import accuracy_score, classification_report
 import pickle
-import math
+import hashlib
+import shutil
+import itertools
+import time
+from datetime import datetime, timezone
 
+from augmentation import (
+    AUGMENTATION_CHUNK_SIZE,
+    clean_templates,
+    connection_positions,
+    generate_augmentation_chunks,
+)
+from featurizer import (
+    FEATURE_MODES,
+    FIXED_SIZE_MODES,
+    feature_count,
+    featurize_coords,
+    featurize_drawings,
+    parse_drawing,
+    repad_features,
+)
+from drawing_log import read_consumed_offsets, read_drawing_log, write_consumed_offsets
+from forest_engine import (
+    ARTIFACT_FORMAT_VERSION,
+    ARTIFACT_POINTER_FILE,
+    FlatForest,
+    resolve_artifact_dir,
+)
 
-def load_augmented_data(data_folder="augmented_data"):
+
+def read_dataset_manifest(data_folder):
+    """Returns the parsed manifest.json of an augmented data folder, or None if it has none."""
+    manifest_path = os.path.join(data_folder, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+
+def _read_json_file(filepath):
+    """Parses one augmented JSON file, returning an empty list if it cannot be read."""
+    filename = os.path.basename(filepath)
+    try:
+        with open(filepath, "r") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        print(f"Warning: Could not decode JSON from {filename}. Skipping.")
+    except Exception as e:
+        print(f"An error occurred while reading {filename}: {e}. Skipping.")
+    return []
+
+
+def _parse_samples(constellations_data, max_stars, max_connections):
+    """
+    Parses augmented JSON samples with featurizer.parse_drawing, the same validation the
+    server applies. Samples it rejects are skipped with a warning.
+    """
+    drawings = []
+    for constellation in constellations_data:
+        # Ensure required fields exist
+        if "stars" not in constellation or "name" not in constellation:
+            continue
+        try:
+            drawings.append(parse_drawing(constellation, max_stars, max_connections))
+        except ValueError as e:
+            print(f"Warning: Skipping {constellation['name']}: {e}")
+    return drawings
+
+
+def iter_augmented_data(
+    data_folder="augmented_data",
+    chunk_size=10000,
+    max_stars=None,
+    max_connections=None,
+    feature_mode="raw",
+):
+    """
+    Streams augmented JSON data as fixed-size chunks of features, reading every file once.
+
+    The padding dimensions are taken from the folder's manifest.json (written by
+    augmentation.augment_and_save) or from max_stars/max_connections, so no scan over
+    the data is needed. Chunks can be fed to an out-of-core learner, or copied into a
+    preallocated matrix as load_augmented_data does.
+
+    Args:
+        data_folder (str): Folder containing constellation_name.json files.
+        chunk_size (int): Number of samples per yielded chunk. The last chunk may be smaller.
+        max_stars (int): Star padding, if the folder has no manifest.
+        max_connections (int): Connection padding, if the folder has no manifest.
+        feature_mode (str): Feature layout, see featurizer.FEATURE_MODES.
+
+    Yields:
+        tuple: (features, labels) with features a float32 array of shape
+               (n, feature_count(max_stars, max_connections, feature_mode)) and labels
+               an array of n names.
+
+    Raises:
+        ValueError: If the dimensions are neither in a manifest nor given explicitly.
+    """
+    manifest = read_dataset_manifest(data_folder)
+    if manifest is not None:
+        max_stars = manifest["max_stars"]
+        max_connections = manifest["max_connections"]
+    if max_stars is None or max_connections is None:
+        raise ValueError(
+            f"'{data_folder}' has no manifest.json; pass max_stars and max_connections."
+        )
+
+    drawings = []
+    labels = []
+
+    for filename in sorted(os.listdir(data_folder)):
+        if not filename.endswith(".json") or filename == "manifest.json":
+            continue
+
+        # Extract base constellation name from filename
+        base_constellation_name = filename.replace(".json", "").split("_aug")[0]
+
+        file_drawings = _parse_samples(
+            _read_json_file(os.path.join(data_folder, filename)),
+            max_stars,
+            max_connections,
+        )
+        drawings.extend(file_drawings)
+        labels.extend([base_constellation_name] * len(file_drawings))
+
+        while len(drawings) >= chunk_size:
+            yield featurize_drawings(
+                drawings[:chunk_size],
+                max_stars,
+                max_connections,
+                dtype=np.float32,
+                mode=feature_mode,
+            ), np.array(labels[:chunk_size])
+            del drawings[:chunk_size], labels[:chunk_size]
+
+    if drawings:
+        yield featurize_drawings(
+            drawings, max_stars, max_connections, dtype=np.float32, mode=feature_mode
+        ), np.array(labels)
+
+
+def load_augmented_data(
+    data_folder="augmented_data", return_dimensions=False, feature_mode="raw"
+):
     """
     Loads and preprocesses augmented constellation data from JSON files in the format
     constellation_name.json in the data_folder
 
     Each JSON contains constellations with stars and connections. The function:
-    - Scans all files to find max number of stars and connections
-    - Pads all input data to consistent size
-    - Extracts features: flattened coordinates + connection distances
-    - Returns feature matrix and label array
-    """
-
-    all_features = []  # List to store feature vectors for all constellations
-    all_labels = []  # List to store labels (constellation names)
-    max_stars = 0  # Tracks the maximum number of stars in any constellation
-    max_connections = 0  # Tracks the maximum number of connections in any constellation
-
-    # First pass: Determine max number of stars and connections across all files
-    print(f"Scanning '{data_folder}' to determine max stars and connections...")
-
-    for filename in os.listdir(data_folder):
-        if filename.endswith(".json"):
-            filepath = os.path.join(data_folder, filename)
-
-            # Try opening json file
-            try:
-                with open(filepath, "r") as f:
-                    constellations_data = json.load(f)
-                    # Keep up dating max values as we iterate through the constellations
-                    for constellation in constellations_data:
-                        if "stars" in constellation:
-                            max_stars = max(max_stars, len(constellation["stars"]))
-                        if "connections" in constellation:
-                            max_connections = max(
-                                max_connections, len(constellation["connections"])
-                            )
-            except json.JSONDecodeError:
-                print(f"Warning: Could not decode JSON from {filename}. Skipping.")
-            except Exception as e:
-                print(f"An error occurred while reading {filename}: {e}. Skipping.")
+    - Reads the padding dimensions and sample count from the folder's manifest.json
+    - Streams every file once, writing features straight into a preallocated float32 matrix
+    - Extracts features: flattened coordinates + connection distances, or the
+      order-independent encoding when feature_mode is "invariant"
+    - Returns feature matrix and label array, followed by max stars and max connections
+      when return_dimensions is True
+
+    Folders written before manifests existed are still supported: each file is then
+    featurized on its own and padded to the overall maximum at the end.
+    """
+    manifest = read_dataset_manifest(data_folder)
+    if manifest is None:
+        return _load_augmented_data_without_manifest(
+            data_folder, return_dimensions, feature_mode
+        )
+
+    max_stars = manifest["max_stars"]
+    max_connections = manifest["max_connections"]
 
     # These values are accordingly updated on the frontend to prevent user from creating too many stars
+    print(
+        f"Loading {manifest['num_samples']} samples from '{data_folder}' "
+        f"({max_stars} stars, {max_connections} connections)..."
+    )
+
+    all_features = np.empty(
+        (manifest["num_samples"], feature_count(max_stars, max_connections, feature_mode)),
+        dtype=np.float32,
+    )
+    all_labels = []
+
+    num_loaded = 0
+    for features, labels in iter_augmented_data(data_folder, feature_mode=feature_mode):
+        # Guard against files that were appended to after the manifest was written
+        if num_loaded + len(labels) > len(all_features):
+            raise ValueError(f"'{data_folder}' holds more samples than its manifest lists")
+        all_features[num_loaded : num_loaded + len(labels)] = features
+        all_labels.append(labels)
+        num_loaded += len(labels)
+
+    all_features = all_features[:num_loaded]
+    all_labels = np.concatenate(all_labels) if all_labels else np.array([])
+
+    if return_dimensions:
+        return all_features, all_labels, max_stars, max_connections
+    return all_features, all_labels
+
+
+def _load_augmented_data_without_manifest(data_folder, return_dimensions, feature_mode):
+    """Single-pass fallback of load_augmented_data for folders without a manifest.json."""
+    file_features = []
+    file_labels = []
+    max_stars = 0
+    max_connections = 0
+
+    print(f"Loading data from '{data_folder}' and preparing features...")
+    for filename in sorted(os.listdir(data_folder)):
+        if not filename.endswith(".json"):
+            continue
+
+        base_constellation_name = filename.replace(".json", "").split("_aug")[0]
+        constellations_data = [
+            constellation
+            for constellation in _read_json_file(os.path.join(data_folder, filename))
+            if "stars" in constellation and "name" in constellation
+        ]
+        if not constellations_data:
+            continue
+
+        # Featurize the file with its own padding; it is re-padded once the maxima are known
+        file_stars = max(len(c["stars"]) for c in constellations_data)
+        file_connections = max(len(c.get("connections", [])) for c in constellations_data)
+        drawings = _parse_samples(constellations_data, file_stars, file_connections)
+        if not drawings:
+            continue
+        features = featurize_drawings(
+            drawings, file_stars, file_connections, dtype=np.float32, mode=feature_mode
+        )
+
+        file_features.append((features, (file_stars, file_connections)))
+        file_labels.append(np.full(len(features), base_constellation_name))
+        max_stars = max(max_stars, file_stars)
+        max_connections = max(max_connections, file_connections)
+
     print(
         f"Maximum stars found: {max_stars}. Star coordinates will be padded to {max_stars * 2} features."
     )
@@ -58,85 +248,526 @@ def load_augmented_data(data_folder="augmented_data"):
         f"Maximum connections found: {max_connections}. Connection lengths will be padded to {max_connections} features."
     )
 
-    # Second pass: Load data and construct feature vectors
-    print(f"Loading data from '{data_folder}' and preparing features...")
-    for filename in os.listdir(data_folder):
-        if filename.endswith(".json"):
-            filepath = os.path.join(data_folder, filename)
-            try:
-                with open(filepath, "r") as f:
-                    constellations_data = json.load(f)
-
-                    # Extract base constellation name from filename
-                    base_constellation_name = filename.replace(".json", "").split(
-                        "_aug"
-                    )[0]
-
-                    for constellation in constellations_data:
-                        # Ensure required fields exist
-                        if "stars" in constellation and "name" in constellation:
-                            star_coords = []  # List to store x, y coordinates of stars
-
-                            # Map star IDs to coordinates for easy lookup
-                            star_map = {
-                                star["id"]: (star["x"], star["y"])
-                                for star in constellation["stars"]
-                            }
-
-                            for star in constellation["stars"]:
-                                star_coords.append(star["x"])
-                                star_coords.append(star["y"])
-
-                            # Pad star coordinates to fixed length
-                            padded_star_coords = star_coords + [0.0] * (
-                                max_stars * 2 - len(star_coords)
-                            )
-
-                            connection_lengths = (
-                                []
-                            )  # List to store connection distances
-
-                            if "connections" in constellation:
-                                for conn_start_id, conn_end_id in constellation[
-                                    "connections"
-                                ]:
-                                    if (
-                                        conn_start_id in star_map
-                                        and conn_end_id in star_map
-                                    ):
-                                        x1, y1 = star_map[conn_start_id]
-                                        x2, y2 = star_map[conn_end_id]
-
-                                        # Calculate Euclidean distance between connected stars
-                                        distance = math.sqrt(
-                                            (x2 - x1) ** 2 + (y2 - y1) ** 2
-                                        )
-                                        connection_lengths.append(distance)
-                                    else:
-                                        print(
-                                            f"Warning: Connection refers to non-existent star ID in {constellation['name']}."
-                                        )
-                                        connection_lengths.append(0.0)
-
-                            # Pad connection lengths to fixed length
-                            padded_connection_lengths = connection_lengths + [0.0] * (
-                                max_connections - len(connection_lengths)
-                            )
-
-                            # Combine star coordinates and connection lengths into one feature vector
-                            combined_features = (
-                                padded_star_coords + padded_connection_lengths
-                            )
-
-                            all_features.append(combined_features)
-                            all_labels.append(base_constellation_name)
-            except json.JSONDecodeError:
-                print(f"Warning: Could not decode JSON from {filename}. Skipping.")
-            except Exception as e:
-                print(f"An error occurred while reading {filename}: {e}. Skipping.")
-
-    # Convert lists to numpy arrays for model training
-    return np.array(all_features), np.array(all_labels)
+    num_samples = sum(len(features) for features, _ in file_features)
+    all_features = np.zeros(
+        (num_samples, feature_count(max_stars, max_connections, feature_mode)),
+        dtype=np.float32,
+    )
+    row = 0
+    for features, file_dimensions in file_features:
+        all_features[row : row + len(features)] = repad_features(
+            features, file_dimensions, (max_stars, max_connections), feature_mode
+        )
+        row += len(features)
+
+    all_labels = np.concatenate(file_labels) if file_labels else np.array([])
+
+    if return_dimensions:
+        return all_features, all_labels, max_stars, max_connections
+    return all_features, all_labels
+
+
+def load_augmented_dataset(
+    data_folder="augmented_data", return_dimensions=False, feature_mode="raw"
+):
+    """
+    Loads a binary augmented dataset written by augmentation.augment_and_save and
+    builds the same features as load_augmented_data.
+
+    The coordinate and label arrays are memory-mapped, and features are computed one
+    constellation at a time with vectorized NumPy operations, using the connection
+    table shared by all samples of that constellation.
+
+    Returns feature matrix and label array, followed by max stars and max connections
+    when return_dimensions is True.
+    """
+    manifest = read_dataset_manifest(data_folder)
+
+    coords = np.load(os.path.join(data_folder, "coords.npy"), mmap_mode="r")
+    label_indices = np.load(os.path.join(data_folder, "labels.npy"), mmap_mode="r")
+    connections = np.load(os.path.join(data_folder, "connections.npy"))
+
+    max_stars = manifest["max_stars"]
+    max_connections = manifest["max_connections"]
+    num_samples = manifest["num_samples"]
+    print(
+        f"Loading {num_samples} samples from '{data_folder}' "
+        f"({max_stars} stars, {max_connections} connections)..."
+    )
+
+    features = np.empty(
+        (num_samples, feature_count(max_stars, max_connections, feature_mode)),
+        dtype=np.float32,
+    )
+    for constellation_index, entry in enumerate(manifest["constellations"]):
+        rows = slice(entry["offset"], entry["offset"] + entry["count"])
+        features[rows] = featurize_coords(
+            coords[rows, : entry["n_stars"]],
+            connections[constellation_index, : entry["n_connections"]],
+            max_stars,
+            max_connections,
+            dtype=np.float32,
+            mode=feature_mode,
+        )
+
+    names = np.array([entry["name"] for entry in manifest["constellations"]])
+    labels = names[label_indices]
+
+    if return_dimensions:
+        return features, labels, max_stars, max_connections
+    return features, labels
+
+
+def load_training_data(
+    data_folder="augmented_data", return_dimensions=False, feature_mode="raw"
+):
+    """
+    Loads augmented data in whichever format data_folder holds, as recorded in its
+    manifest.json: a binary dataset or JSON files.
+    """
+    manifest = read_dataset_manifest(data_folder)
+    if manifest is not None and manifest.get("format") == "npy":
+        return load_augmented_dataset(data_folder, return_dimensions, feature_mode)
+    return load_augmented_data(data_folder, return_dimensions, feature_mode)
+
+
+def generate_augmented_features(
+    data,
+    augmentations_per_constellation=500,
+    seed=None,
+    workers=1,
+    chunk_size=AUGMENTATION_CHUNK_SIZE,
+    feature_mode="raw",
+    cache_dir=None,
+):
+    """
+    Generates training features straight from the constellation templates, in memory.
+
+    Augmentations are produced chunk by chunk by augmentation.generate_augmentation_chunks
+    and featurized right away, so nothing is written to disk and only a few chunks
+    exist at a time. Chunks can be fed to an incremental learner or collected with
+    load_generated_data.
+
+    Args:
+        data (list): The original constellation dataset (constellations.json).
+        augmentations_per_constellation (int): Number of augmented samples per constellation.
+        seed (int): Seed of the run; the same seed yields the same samples as augmentation.py.
+        workers (int): Number of worker processes generating augmentations.
+        chunk_size (int): Number of augmentations per chunk.
+        feature_mode (str): Feature layout, see featurizer.FEATURE_MODES.
+        cache_dir (str): Directory of cached augmentation chunks shared with
+            augmentation.py, or None. Only the chunks of templates that changed since
+            they were cached are generated.
+
+    Yields:
+        tuple: (features, labels, offset) with features a float32 array of shape
+               (n, feature_count(max_stars, max_connections, feature_mode)), labels
+               an array of n names and offset the chunk's first row in the full,
+               constellation-ordered dataset. Chunks can arrive in any order.
+    """
+    data = clean_templates(data)
+    max_stars = max(len(constellation["stars"]) for constellation in data)
+    max_connections = max(len(constellation["connections"]) for constellation in data)
+    connections = [connection_positions(constellation) for constellation in data]
+
+    for constellation_index, chunk_index, coords in generate_augmentation_chunks(
+        data,
+        augmentations_per_constellation,
+        seed,
+        workers,
+        chunk_size,
+        cache_dir=cache_dir,
+    ):
+        features = featurize_coords(
+            coords,
+            connections[constellation_index],
+            max_stars,
+            max_connections,
+            dtype=np.float32,
+            mode=feature_mode,
+        )
+        offset = (
+            constellation_index * augmentations_per_constellation
+            + chunk_index * chunk_size
+        )
+        yield features, np.full(len(coords), data[constellation_index]["name"]), offset
+
+
+def load_generated_data(
+    data,
+    augmentations_per_constellation=500,
+    seed=None,
+    workers=1,
+    return_dimensions=False,
+    feature_mode="raw",
+    cache_dir=None,
+):
+    """
+    Collects generate_augmented_features into one preallocated feature matrix, producing
+    the same output as load_training_data without an augmented_data folder.
+
+    Returns feature matrix and label array, followed by max stars and max connections
+    when return_dimensions is True.
+    """
+    data = clean_templates(data)
+    max_stars = max(len(constellation["stars"]) for constellation in data)
+    max_connections = max(len(constellation["connections"]) for constellation in data)
+    num_samples = augmentations_per_constellation * len(data)
+    print(
+        f"Generating {num_samples} samples in memory "
+        f"({max_stars} stars, {max_connections} connections)..."
+    )
+
+    features = np.empty(
+        (num_samples, feature_count(max_stars, max_connections, feature_mode)),
+        dtype=np.float32,
+    )
+    labels = np.empty(num_samples, dtype=object)
+
+    # Chunks are placed by offset, so the row order (and with it the train/test split)
+    # does not depend on the number of workers or on which chunks came from the cache
+    for chunk_features, chunk_labels, offset in generate_augmented_features(
+        data,
+        augmentations_per_constellation,
+        seed=seed,
+        workers=workers,
+        feature_mode=feature_mode,
+        cache_dir=cache_dir,
+    ):
+        features[offset : offset + len(chunk_features)] = chunk_features
+        labels[offset : offset + len(chunk_labels)] = chunk_labels
+
+    labels = labels.astype(str)
+
+    if return_dimensions:
+        return features, labels, max_stars, max_connections
+    return features, labels
+
+
+def flatten_forest(model):
+    """
+    Flattens a trained RandomForestClassifier into contiguous NumPy arrays that can be
+    evaluated by forest_engine.FlatForest without scikit-learn.
+
+    The nodes of all trees are concatenated and child pointers are rewritten as global
+    offsets. Leaves point to themselves and carry a row in a shared table of normalized
+    class probabilities, which is what sklearn averages across trees in predict().
+
+    Args:
+        model (RandomForestClassifier): Trained forest.
+
+    Returns:
+        dict: The flattened arrays, keyed by forest_engine.FlatForest.ARRAY_NAMES.
+    """
+    features = []
+    thresholds = []
+    children = []
+    leaf_indices = []
+    leaf_values = []
+    roots = []
+
+    node_offset = 0
+    leaf_offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        node_ids = np.arange(tree.node_count)
+        is_leaf = tree.children_left == -1
+
+        # Leaves loop back onto themselves so traversal can run a fixed number of steps
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+        children.append(
+            np.stack(
+                [
+                    np.where(is_leaf, node_ids, tree.children_left),
+                    np.where(is_leaf, node_ids, tree.children_right),
+                ],
+                axis=1,
+            )
+            + node_offset
+        )
+
+        leaf_index = np.full(tree.node_count, -1)
+        leaf_index[is_leaf] = np.arange(is_leaf.sum()) + leaf_offset
+        leaf_indices.append(leaf_index)
+
+        # Normalize leaf values into class probabilities, as DecisionTreeClassifier.predict_proba does
+        value = tree.value[is_leaf, 0, :]
+        normalizer = value.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0.0] = 1.0
+        leaf_values.append(value / normalizer)
+
+        roots.append(node_offset)
+        node_offset += tree.node_count
+        leaf_offset += is_leaf.sum()
+
+    # Inputs are compared as float32, so round every threshold down to the nearest float32.
+    # For any float32 x, x <= t exactly when x <= round_down(t), which keeps splits identical
+    # while avoiding a float64 promotion on every comparison.
+    threshold = np.concatenate(thresholds)
+    threshold32 = threshold.astype(np.float32)
+    rounded_up = threshold32.astype(np.float64) > threshold
+    threshold32[rounded_up] = np.nextafter(threshold32[rounded_up], np.float32(-np.inf))
+
+    # Index arrays are stored as intp so the engine can use memory-mapped copies as-is
+    return {
+        "feature": np.concatenate(features).astype(np.intp),
+        "threshold": threshold32,
+        "children": np.concatenate(children).astype(np.intp),
+        "leaf_index": np.concatenate(leaf_indices).astype(np.intp),
+        "leaf_value": np.concatenate(leaf_values).astype(np.float64),
+        "roots": np.array(roots, dtype=np.intp),
+        "classes": np.asarray(model.classes_, dtype=np.intp),
+    }
+
+
+def export_model_artifact(
+    model,
+    label_encoder,
+    max_stars,
+    max_connections,
+    output_dir="model",
+    feature_mode="raw",
+    keep_versions=3,
+):
+    """
+    Writes the trained model as a pickle-free artifact directory that the server can
+    memory-map (see forest_engine.load_model_artifact).
+
+    Each version holds one .npy file per flattened forest array plus a manifest.json
+    with the format version, a content hash identifying the model version, the class
+    names from the label encoder and the input dimensions and feature mode the model
+    was trained on.
+
+    Versions are written to their own output_dir/<version>/ directory, which is
+    complete before the output_dir/CURRENT pointer file is atomically switched to it.
+    Servers loading or watching output_dir therefore see either the old version or the
+    new one, never a mix of their files, and the files of older versions they still
+    memory-map are left untouched.
+
+    Args:
+        model (RandomForestClassifier): Trained forest.
+        label_encoder (LabelEncoder): Encoder used to produce the training labels.
+        max_stars (int): Number of stars the star-coordinate features are padded to.
+        max_connections (int): Number of connections the length features are padded to.
+        output_dir (str): Directory to write the artifact to.
+        feature_mode (str): Feature layout the model was trained on, see
+            featurizer.FEATURE_MODES. The server featurizes requests the same way.
+        keep_versions (int): Number of most recent version directories kept, including
+            the new one. Older ones are deleted.
+
+    Returns:
+        dict: The written manifest.
+    """
+    arrays = flatten_forest(model)
+    digest = hashlib.sha256()
+    for name in FlatForest.ARRAY_NAMES:
+        digest.update(arrays[name].tobytes())
+
+    manifest = {
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        "version": digest.hexdigest()[:12],
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "classes": label_encoder.classes_.tolist(),
+        "max_stars": max_stars,
+        "max_connections": max_connections,
+        "feature_mode": feature_mode,
+        "n_features": int(model.n_features_in_),
+        "n_estimators": len(model.estimators_),
+        "max_depth": max(estimator.tree_.max_depth for estimator in model.estimators_),
+    }
+    version_dir = os.path.join(output_dir, manifest["version"])
+    if not os.path.exists(os.path.join(version_dir, "manifest.json")):
+        # Built under a temporary name, so a version directory is always complete
+        tmp_dir = os.path.join(output_dir, f".{manifest['version']}.tmp-{os.getpid()}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for name in FlatForest.ARRAY_NAMES:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), arrays[name])
+        with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+        shutil.rmtree(version_dir, ignore_errors=True)
+        os.replace(tmp_dir, version_dir)
+    else:
+        # Re-exporting an existing version makes it the newest one again
+        os.utime(version_dir)
+
+    pointer_path = os.path.join(output_dir, ARTIFACT_POINTER_FILE)
+    with open(f"{pointer_path}.tmp", "w") as f:
+        f.write(manifest["version"])
+    os.replace(f"{pointer_path}.tmp", pointer_path)
+    _prune_artifact_versions(output_dir, manifest["version"], keep_versions)
+
+    print(
+        f"Model artifact {manifest['version']} exported to {version_dir} "
+        f"({len(arrays['feature'])} nodes, {len(arrays['leaf_value'])} leaves)"
+    )
+    return manifest
+
+
+def _prune_artifact_versions(output_dir, current_version, keep_versions):
+    # Oldest first by modification time; the current version is never deleted
+    versions = sorted(
+        (
+            entry
+            for entry in os.scandir(output_dir)
+            if entry.is_dir()
+            and entry.name != current_version
+            and os.path.exists(os.path.join(entry.path, "manifest.json"))
+        ),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in versions[: max(len(versions) - (keep_versions - 1), 0)]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def _median_seconds(fn, repeats):
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return float(np.median(durations))
+
+
+def sweep_forest_configurations(
+    features,
+    labels,
+    n_estimators_grid=(10, 25, 50, 100),
+    max_depth_grid=(8, 12, 16, None),
+    max_features_grid=("sqrt", "log2", 0.5),
+    latency_repeats=200,
+):
+    """
+    Trains one forest per combination of tree count, max depth and feature subset
+    size, and measures what each would cost to serve.
+
+    Uses the same stratified 80/20 split as train_constellation_model. Size and
+    latency are measured on the flattened arrays served by forest_engine.FlatForest,
+    not on the sklearn model.
+
+    Args:
+        features (np.ndarray): Feature matrix.
+        labels (np.ndarray): Array of constellation names.
+        n_estimators_grid (tuple): Tree counts to try.
+        max_depth_grid (tuple): Max depths to try; None grows trees until leaves are pure.
+        max_features_grid (tuple): max_features values to try ("sqrt", "log2", a
+            fraction or a count).
+        latency_repeats (int): Single-row predictions timed per configuration.
+
+    Returns:
+        list: One dict per configuration with its "params", test "accuracy",
+              artifact "size_bytes", median "latency_ms" of a single-row prediction
+              and batch "throughput" in rows per second on the test split.
+    """
+    encoded_labels = LabelEncoder().fit_transform(labels)
+    X_train, X_test, y_train, y_test = train_test_split(
+        features,
+        encoded_labels,
+        test_size=0.2,
+        random_state=42,
+        stratify=encoded_labels,
+    )
+    single_row = X_test[:1]
+
+    results = []
+    grid = list(itertools.product(n_estimators_grid, max_depth_grid, max_features_grid))
+    for idx, (n_estimators, max_depth, max_features) in enumerate(grid, start=1):
+        params = {
+            "n_estimators": n_estimators,
+            "max_depth": max_depth,
+            "max_features": max_features,
+        }
+        model = RandomForestClassifier(**params, random_state=42, n_jobs=-1)
+        model.fit(X_train, y_train)
+
+        arrays = flatten_forest(model)
+        forest = FlatForest(
+            **arrays,
+            max_depth=max(estimator.tree_.max_depth for estimator in model.estimators_),
+        )
+        accuracy = accuracy_score(y_test, forest.predict(X_test))
+        latency = _median_seconds(lambda: forest.predict(single_row), latency_repeats)
+        batch_seconds = _median_seconds(lambda: forest.predict(X_test), 3)
+
+        result = {
+            "params": params,
+            "accuracy": float(accuracy),
+            "size_bytes": int(sum(array.nbytes for array in arrays.values())),
+            "latency_ms": latency * 1000.0,
+            "throughput": len(X_test) / batch_seconds,
+        }
+        results.append(result)
+        print(
+            f"[{idx}/{len(grid)}] {params}: accuracy {result['accuracy']:.4f}, "
+            f"{result['size_bytes'] / 1e6:.2f} MB, {result['latency_ms']:.3f} ms/row, "
+            f"{result['throughput']:.0f} rows/s"
+        )
+
+    return results
+
+
+def pareto_front(results):
+    """
+    Returns the sweep results no other result beats on accuracy, size and latency at
+    once, ordered from smallest to largest model.
+    """
+
+    def dominates(a, b):
+        no_worse = (
+            a["accuracy"] >= b["accuracy"]
+            and a["size_bytes"] <= b["size_bytes"]
+            and a["latency_ms"] <= b["latency_ms"]
+        )
+        better = (
+            a["accuracy"] > b["accuracy"]
+            or a["size_bytes"] < b["size_bytes"]
+            or a["latency_ms"] < b["latency_ms"]
+        )
+        return no_worse and better
+
+    front = [r for r in results if not any(dominates(other, r) for other in results)]
+    return sorted(front, key=lambda r: (r["size_bytes"], r["latency_ms"]))
+
+
+def select_configuration(results, max_latency_ms=None, max_size_mb=None):
+    """
+    Picks the most accurate Pareto-optimal configuration within the budget. Among
+    equally accurate configurations the smallest, then fastest, one wins.
+
+    Args:
+        results (list): Output of sweep_forest_configurations.
+        max_latency_ms (float): Single-row latency budget, or None for no limit.
+        max_size_mb (float): Artifact size budget in megabytes, or None for no limit.
+
+    Returns:
+        dict: The selected result, or None if no configuration fits the budget.
+    """
+    candidates = [
+        r
+        for r in pareto_front(results)
+        if (max_latency_ms is None or r["latency_ms"] <= max_latency_ms)
+        and (max_size_mb is None or r["size_bytes"] <= max_size_mb * 1e6)
+    ]
+    if not candidates:
+        return None
+    return min(
+        candidates, key=lambda r: (-r["accuracy"], r["size_bytes"], r["latency_ms"])
+    )
+
+
+def _parse_grid(value, convert):
+    # Comma separated grid values; "none" stands for None (e.g. unbounded depth)
+    return tuple(
+        None if item.strip().lower() == "none" else convert(item.strip())
+        for item in value.split(",")
+    )
+
+
+def _parse_max_features(value):
+    if value in ("sqrt", "log2"):
+        return value
+    return float(value) if "." in value else int(value)
 
 
 def train_constellation_model(
@@ -144,6 +775,11 @@ def train_constellation_model(
     labels,
     model_save_path="constellation_model.pkl",
     encoder_save_path="label_encoder.pkl",
+    artifact_dir="model",
+    max_stars=None,
+    max_connections=None,
+    feature_mode="raw",
+    model_params=None,
 ):
     """
     Trains a Random Forest model on constellation features and labels.
@@ -161,7 +797,8 @@ def train_constellation_model(
         - It requires little preprocessing and handles mixed or correlated features effectively.
         - It provides good baseline performance with minimal hyperparameter tuning.
 
-    Saves the trained model and label encoder to disk.
+    Saves the trained model and label encoder to disk, along with the pickle-free
+    model artifact served by the backend (see export_model_artifact).
     Prints training statistics and accuracy.
 
     Args:
@@ -169,6 +806,13 @@ def train_constellation_model(
         labels (np.ndarray): Array of constellation names.
         model_save_path (str): Path to save the trained model.
         encoder_save_path (str): Path to save the label encoder.
+        artifact_dir (str): Directory to write the serving artifact to.
+        max_stars (int): Star padding used for the features. Required to export the artifact.
+        max_connections (int): Connection padding used for the features. Required to export the artifact.
+        feature_mode (str): Feature layout of features, recorded in the artifact.
+        model_params (dict): RandomForestClassifier parameters overriding the
+            defaults (100 trees of unbounded depth), e.g. a configuration picked by
+            sweep_forest_configurations.
 
     Returns:
         model: Trained RandomForestClassifier.
@@ -196,8 +840,10 @@ def train_constellation_model(
     print(f"Number of unique constellations: {len(label_encoder.classes_)}")
 
     # Initialize and train Random Forest classifier
-    model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
-    print("\nTraining RandomForestClassifier...")
+    params = {"n_estimators": 100, "random_state": 42, "n_jobs": -1}
+    params.update(model_params or {})
+    model = RandomForestClassifier(**params)
+    print(f"\nTraining RandomForestClassifier {model_params or ''}...")
 
     model.fit(X_train, y_train)
     print("Training complete.")
@@ -220,28 +866,354 @@ def train_constellation_model(
         with open(encoder_save_path, "wb") as f:
             pickle.dump(label_encoder, f)
         print(f"Label Encoder saved successfully to {encoder_save_path}")
+        if max_stars is not None and max_connections is not None:
+            export_model_artifact(
+                model,
+                label_encoder,
+                max_stars,
+                max_connections,
+                artifact_dir,
+                feature_mode=feature_mode,
+            )
     except Exception as e:
         print(f"Error saving model or encoder: {e}")
 
     return model, label_encoder, X_test, y_test, y_pred
 
 
+def retrain_from_drawing_log(
+    log_dir,
+    templates,
+    model_path="constellation_model.pkl",
+    encoder_path="label_encoder.pkl",
+    artifact_dir="model",
+    new_trees=10,
+    max_trees=None,
+    min_confidence=0.9,
+    replay_per_constellation=200,
+    seed=None,
+    cache_dir=None,
+    drawing_limits=None,
+):
+    """
+    Updates the trained forest with the drawings logged by the server since the last
+    retraining, without refitting it on the full dataset.
+
+    Only records appended to the drawing log since the previous run are read (the
+    consumed offsets are kept in the log directory). Drawings predicted with at least
+    min_confidence are labelled with their prediction and mixed with a small replay
+    set of fresh augmentations of every template, which keeps every class present and
+    anchors the new trees to the canonical shapes. new_trees trees are then grown on
+    that mix with warm_start and added to the existing ones, so the cost depends on
+    the new rows and not on the size of the log or of the original training data.
+    With max_trees, the oldest trees are dropped once the forest grows beyond it.
+
+    Every selected logged drawing is trained on, since its records are marked as
+    consumed. The accuracy reported before and after is measured on a held-out part of
+    the replay set.
+
+    The updated model is saved and exported like train_constellation_model does, so
+    servers watching the artifact directory pick it up.
+
+    Args:
+        log_dir (str): Directory written by drawing_log.DrawingLog.
+        templates (list): The original constellation dataset (constellations.json).
+        model_path (str): Pickled RandomForestClassifier to update.
+        encoder_path (str): Pickled LabelEncoder of the model.
+        artifact_dir (str): Artifact directory of the model; its manifest provides the
+            input dimensions and feature mode, and the updated artifact replaces it.
+        new_trees (int): Number of trees to add.
+        max_trees (int): Maximum forest size, or None for no limit.
+        min_confidence (float): Lowest predicted probability of a logged drawing used
+            for training.
+        replay_per_constellation (int): Augmentations per template mixed in.
+        seed (int): Seed of the replay augmentations.
+        cache_dir (str): Directory of cached augmentation chunks, or None.
+        drawing_limits (tuple): (max_stars, max_connections) the server accepts for
+            models of a fixed-size feature mode, see model_registry.ModelBundle. None
+            keeps every logged drawing of such models, since the server accepted it.
+            Other modes are limited to the manifest's input dimensions.
+
+    Returns:
+        RandomForestClassifier: The updated model, or None if nothing new was logged.
+    """
+    if replay_per_constellation < 1:
+        raise ValueError("replay_per_constellation must be at least 1")
+
+    with open(os.path.join(resolve_artifact_dir(artifact_dir), "manifest.json"), "r") as f:
+        manifest = json.load(f)
+    max_stars = manifest["max_stars"]
+    max_connections = manifest["max_connections"]
+    feature_mode = manifest.get("feature_mode", "raw")
+
+    with open(model_path, "rb") as f:
+        model = pickle.load(f)
+    with open(encoder_path, "rb") as f:
+        label_encoder = pickle.load(f)
+
+    # Fixed-size features do not depend on the manifest's dimensions, and the server
+    # accepts larger drawings for them than the model was trained on
+    if feature_mode in FIXED_SIZE_MODES:
+        star_limit, connection_limit = drawing_limits or (float("inf"), float("inf"))
+    else:
+        star_limit, connection_limit = max_stars, max_connections
+
+    records, offsets = read_drawing_log(log_dir, read_consumed_offsets(log_dir))
+    known_labels = set(label_encoder.classes_)
+    drawings = []
+    labels = []
+    for (star_coords, connection_indices), label, confidence, _ in records:
+        if (
+            confidence >= min_confidence
+            and label in known_labels
+            and len(star_coords) <= star_limit
+            and len(connection_indices) <= connection_limit
+        ):
+            drawings.append((star_coords, connection_indices))
+            labels.append(label)
+    print(
+        f"Read {len(records)} new logged drawings from '{log_dir}', "
+        f"{len(drawings)} with confidence >= {min_confidence}."
+    )
+    if not drawings:
+        write_consumed_offsets(log_dir, offsets)
+        return None
+
+    log_features = featurize_drawings(
+        drawings, max_stars, max_connections, dtype=np.float32, mode=feature_mode
+    )
+    replay_features, replay_labels, replay_stars, replay_connections = (
+        load_generated_data(
+            templates,
+            replay_per_constellation,
+            seed=seed,
+            return_dimensions=True,
+            feature_mode=feature_mode,
+            cache_dir=cache_dir,
+        )
+    )
+    if (replay_stars, replay_connections) != (max_stars, max_connections):
+        replay_features = repad_features(
+            replay_features,
+            (replay_stars, replay_connections),
+            (max_stars, max_connections),
+            feature_mode,
+        )
+    known_replay = np.isin(replay_labels, label_encoder.classes_)
+
+    # Logged drawings are consumed by this run, so all of them go into training and
+    # only the replay set, regenerated on every run, is split for evaluation
+    replay_train, X_test, replay_train_labels, y_test = train_test_split(
+        replay_features[known_replay],
+        label_encoder.transform(replay_labels[known_replay]),
+        test_size=0.2,
+        random_state=42,
+    )
+    X_train = np.vstack([log_features, replay_train])
+    y_train = np.concatenate([label_encoder.transform(labels), replay_train_labels])
+    before = accuracy_score(y_test, model.predict(X_test))
+
+    # Grow new_trees more trees on the new rows; the existing trees are kept as-is
+    num_trees = len(model.estimators_)
+    model.set_params(warm_start=True, n_estimators=num_trees + new_trees)
+    print(f"\nAdding {new_trees} trees to the {num_trees}-tree forest...")
+    model.fit(X_train, y_train)
+    if max_trees is not None and len(model.estimators_) > max_trees:
+        model.estimators_ = model.estimators_[-max_trees:]
+        model.n_estimators = max_trees
+
+    after = accuracy_score(y_test, model.predict(X_test))
+    print(
+        f"Held-out accuracy on replay drawings: {before:.4f} -> {after:.4f} "
+        f"({len(model.estimators_)} trees)"
+    )
+
+    with open(model_path, "wb") as f:
+        pickle.dump(model, f)
+    export_model_artifact(
+        model,
+        label_encoder,
+        max_stars,
+        max_connections,
+        artifact_dir,
+        feature_mode=feature_mode,
+    )
+    # Only marked as consumed once the updated model is safely written
+    write_consumed_offsets(log_dir, offsets)
+    return model
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the constellation classifier.")
+    parser.add_argument(
+        "--data-folder",
+        default="augmented_data",
+        help="Folder containing the augmented dataset",
+    )
+    parser.add_argument(
+        "--on-the-fly",
+        action="store_true",
+        help="Generate augmentations in memory from --templates instead of reading --data-folder",
+    )
+    parser.add_argument("--templates", default="constellations.json")
+    parser.add_argument(
+        "--augmentations",
+        type=int,
+        default=500,
+        help="Augmentations per constellation (with --on-the-fly)",
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--features",
+        choices=FEATURE_MODES,
+        default="raw",
+        help=(
+            "Feature layout: padded coordinates (raw), an order-independent encoding "
+            "(invariant), or a fixed-size order-independent encoding that accepts "
+            "drawings of any size (histogram)"
+        ),
+    )
+    parser.add_argument(
+        "--sweep",
+        action="store_true",
+        help="Sweep forest sizes and train the best configuration within the budget",
+    )
+    parser.add_argument("--sweep-trees", default="10,25,50,100", help="Tree counts to sweep")
+    parser.add_argument(
+        "--sweep-depths", default="8,12,16,none", help="Max depths to sweep (none = unbounded)"
+    )
+    parser.add_argument(
+        "--sweep-features",
+        default="sqrt,log2,0.5",
+        help="max_features values to sweep (sqrt, log2, a fraction or a count)",
+    )
+    parser.add_argument(
+        "--max-latency-ms", type=float, default=None, help="Single-row latency budget"
+    )
+    parser.add_argument(
+        "--max-model-mb", type=float, default=None, help="Model artifact size budget"
+    )
+    parser.add_argument(
+        "--sweep-output", default=None, help="Write all sweep results to this JSON file"
+    )
+    parser.add_argument(
+        "--retrain-from-log",
+        metavar="LOG_DIR",
+        default=None,
+        help="Add trees to the trained model using the drawings logged by the server",
+    )
+    parser.add_argument(
+        "--new-trees", type=int, default=10, help="Trees added by --retrain-from-log"
+    )
+    parser.add_argument(
+        "--max-trees",
+        type=int,
+        default=None,
+        help="Drop the oldest trees beyond this forest size (with --retrain-from-log)",
+    )
+    parser.add_argument(
+        "--min-confidence",
+        type=float,
+        default=0.9,
+        help="Lowest prediction probability of logged drawings used for retraining",
+    )
+    parser.add_argument(
+        "--replay-augmentations",
+        type=int,
+        default=200,
+        help="Augmentations per constellation mixed into --retrain-from-log",
+    )
+    parser.add_argument(
+        "--augmentation-cache",
+        default=None,
+        help=(
+            "Directory of cached augmentation chunks (see augmentation.py --cache-dir) "
+            "used by --on-the-fly and --retrain-from-log when --seed is given"
+        ),
+    )
+    args = parser.parse_args()
 
     # Main entry point for training the constellation classifier
-    data_folder = "augmented_data"  # Folder containing JSON data files
+    data_folder = args.data_folder  # Folder containing the augmented dataset
 
-    if not os.path.exists(data_folder):
+    if args.retrain_from_log:
+        with open(args.templates, "r") as f:
+            templates = json.load(f)
+        retrain_from_drawing_log(
+            args.retrain_from_log,
+            templates,
+            new_trees=args.new_trees,
+            max_trees=args.max_trees,
+            min_confidence=args.min_confidence,
+            replay_per_constellation=args.replay_augmentations,
+            seed=args.seed,
+            cache_dir=args.augmentation_cache,
+        )
+        features = np.array([])
+    elif args.on_the_fly:
+        with open(args.templates, "r") as f:
+            templates = json.load(f)
+        features, labels, max_stars, max_connections = load_generated_data(
+            templates,
+            args.augmentations,
+            seed=args.seed,
+            workers=args.workers,
+            return_dimensions=True,
+            feature_mode=args.features,
+            cache_dir=args.augmentation_cache,
+        )
+    elif not os.path.exists(data_folder):
         print(
-            f"Data folder '{data_folder}' does not exist. Please add JSON data and rerun."
+            f"Data folder '{data_folder}' does not exist. Please run augmentation.py "
+            "or pass --on-the-fly and rerun."
         )
+        features = np.array([])
     else:
         # Load features and labels from data
-        features, labels = load_augmented_data(data_folder)
-        if features.size > 0:
-            # Train model if data is available
-            trained_model, encoder, X_test, y_test, y_pred = train_constellation_model(
-                features, labels
+        features, labels, max_stars, max_connections = load_training_data(
+            data_folder, return_dimensions=True, feature_mode=args.features
+        )
+
+    model_params = None
+    if features.size > 0 and args.sweep:
+        sweep_results = sweep_forest_configurations(
+            features,
+            labels,
+            n_estimators_grid=_parse_grid(args.sweep_trees, int),
+            max_depth_grid=_parse_grid(args.sweep_depths, int),
+            max_features_grid=_parse_grid(args.sweep_features, _parse_max_features),
+        )
+        print("\nPareto front (accuracy / size / single-row latency):")
+        for result in pareto_front(sweep_results):
+            print(
+                f"  {result['params']}: {result['accuracy']:.4f}, "
+                f"{result['size_bytes'] / 1e6:.2f} MB, {result['latency_ms']:.3f} ms"
             )
+        if args.sweep_output:
+            with open(args.sweep_output, "w") as f:
+                json.dump(sweep_results, f, indent=2)
+
+        selected = select_configuration(
+            sweep_results, args.max_latency_ms, args.max_model_mb
+        )
+        if selected is None:
+            print("No configuration fits the latency/size budget; nothing was trained.")
         else:
-            print("No valid data found in the folder. Please check your JSON files.")
+            model_params = selected["params"]
+            print(f"\nSelected configuration: {model_params}")
+
+    if features.size > 0 and (model_params is not None or not args.sweep):
+        # Train model if data is available
+        trained_model, encoder, X_test, y_test, y_pred = train_constellation_model(
+            features,
+            labels,
+            max_stars=max_stars,
+            max_connections=max_connections,
+            feature_mode=args.features,
+            model_params=model_params,
+        )
+    elif not args.retrain_from_log and features.size == 0 and (
+        args.on_the_fly or os.path.exists(data_folder)
+    ):
+        print("No valid data found. Please check your augmented data.")